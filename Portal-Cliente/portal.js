@@ -7,7 +7,8 @@ document.addEventListener('DOMContentLoaded', async () => {
     }
 
     // Entorno Local de Alta Disponibilidad
-    const BACKEND_API = 'https://web-production-2584d.up.railway.app/api/portal/user-data';
+    const PORTAL_API = 'https://web-production-2584d.up.railway.app/api/portal';
+    const BACKEND_API = `${PORTAL_API}/user-data`;
     
     const ui = {
         nameDisplay: document.getElementById('user-display-name'),
@@ -64,30 +65,43 @@ document.addEventListener('DOMContentLoaded', async () => {
     });
 
     // 5. Fetch Data
-    try {
-        ui.nameDisplay.textContent = 'Cargando...';
-        const res = await fetch(`${BACKEND_API}?dni=${encodeURIComponent(userDNI)}`);
+    // Por secciones: el perfil sale del índice del backend y cada pestaña se
+    // muestra apenas llega su parte (vista resumida; el historial con "Ver más")
+    const paginas = {};
+    const clienteAPI = `${PORTAL_API}/${encodeURIComponent(userDNI)}`;
+
+    async function pedir(url) {
+        const res = await fetch(url);
         const result = await res.json();
-        
         if (!res.ok || !result.valid) {
             throw new Error(result.message || 'Error cargando datos');
         }
+        return result;
+    }
+
+    function errorSeccion(paneId, err) {
+        console.error("Portal Error:", err);
+        const pane = document.getElementById(paneId);
+        pane.innerHTML = '';
+        pane.appendChild(emptyState(`⚠️ ${err.message}`));
+    }
+
+    try {
+        ui.nameDisplay.textContent = 'Cargando...';
+        const { data: perfil } = await pedir(`${clienteAPI}/perfil`);
 
-        const data = result.data;
-        
-        if (data.perfil && data.perfil.nombres) {
-            ui.nameDisplay.textContent = `${data.perfil.nombres} ${data.perfil.apellido || ''}`.trim();
+        if (perfil && perfil.nombres) {
+            ui.nameDisplay.textContent = `${perfil.nombres} ${perfil.apellido || ''}`.trim();
         } else {
             ui.nameDisplay.textContent = 'Mi Cuenta';
         }
 
-        // Renderizar todas las secciones
-        renderPerfil(data.perfil);
-        renderPolizas(data.polizas);
-        renderGestiones(data.gestiones, data.polizas);
-        renderAccidentes(data.accidentes);
-        renderRoboOc(data.robo_oc);
-        renderRoboIncendio(data.robo_incendio);
+        renderPerfil(perfil);
+        ['tab-polizas', 'tab-gestiones', 'tab-accidentes', 'tab-robo_oc', 'tab-robo_incendio'].forEach(id => {
+            const pane = document.getElementById(id);
+            pane.innerHTML = '';
+            pane.appendChild(emptyState('Cargando...'));
+        });
 
         ui.loading.classList.add('hidden');
         ui.contentArea.classList.remove('hidden');
@@ -99,12 +113,84 @@ document.addEventListener('DOMContentLoaded', async () => {
                 <p>${err.message}</p>
                 <button onclick="window.location.reload()" class="action-btn">Reintentar</button>
             </div>`;
+        return;
     }
 
+    const polizasCargadas = pedir(`${clienteAPI}/polizas?view=summary`).then(result => result.data);
+    polizasCargadas.then(renderPolizas, err => errorSeccion('tab-polizas', err));
+
+    // Las gestiones completan patente/compañía/producto con la póliza vinculada
+    Promise.all([pedir(`${clienteAPI}/gestiones?view=summary`), polizasCargadas.catch(() => [])])
+        .then(([result, polizas]) => {
+            paginas.gestiones = result.pagina;
+            renderGestiones(result.data, polizas);
+        })
+        .catch(err => errorSeccion('tab-gestiones', err));
+
+    pedir(`${clienteAPI}/denuncias?view=summary`)
+        .then(({ data }) => {
+            Object.assign(paginas, data.paginas || {});
+            renderAccidentes(data.accidentes);
+            renderRoboOc(data.robo_oc);
+            renderRoboIncendio(data.robo_incendio);
+        })
+        .catch(err => ['tab-accidentes', 'tab-robo_oc', 'tab-robo_incendio'].forEach(id => errorSeccion(id, err)));
+
     // ========================
     // Utilidades
     // ========================
 
+    // Detalle completo de un registro (la vista resumida no trae los textos largos)
+    const detalles = {};
+    async function detalleRegistro(seccion, rec) {
+        const id = rec.RECORD_ID;
+        if (!id) return rec;
+        if (!detalles[id]) {
+            try {
+                const res = await fetch(`${BACKEND_API}/${seccion}/${encodeURIComponent(id)}?dni=${encodeURIComponent(userDNI)}`);
+                const result = await res.json();
+                if (!res.ok || !result.valid) throw new Error(result.message || 'Error cargando detalle');
+                detalles[id] = result.data;
+            } catch (err) {
+                console.error("Portal Detail Error:", err);
+                return rec;
+            }
+        }
+        return detalles[id];
+    }
+
+    // Total de la sección (la lista cargada puede ser solo la primera página)
+    function totalSeccion(seccion, lista) {
+        const pagina = paginas[seccion];
+        return pagina ? pagina.total : lista.length;
+    }
+
+    // Botón "Ver más": pide la página siguiente y vuelve a renderizar la lista completa
+    function agregarVerMas(pane, seccion, lista, render) {
+        const pagina = paginas[seccion];
+        if (!pagina || !pagina.next_cursor) return;
+        const btn = document.createElement('button');
+        btn.className = 'action-btn';
+        btn.style.cssText = 'margin-top:12px;';
+        btn.textContent = `Ver más (${lista.length} de ${pagina.total})`;
+        btn.addEventListener('click', async () => {
+            btn.disabled = true;
+            btn.textContent = 'Cargando...';
+            try {
+                const res = await fetch(`${BACKEND_API}/${seccion}?dni=${encodeURIComponent(userDNI)}&view=summary&cursor=${encodeURIComponent(pagina.next_cursor)}`);
+                const result = await res.json();
+                if (!res.ok || !result.valid) throw new Error(result.message || 'Error cargando datos');
+                paginas[seccion] = result.pagina;
+                render(lista.concat(result.data));
+            } catch (err) {
+                console.error("Portal Page Error:", err);
+                btn.disabled = false;
+                btn.textContent = 'Reintentar';
+            }
+        });
+        pane.appendChild(btn);
+    }
+
     function formatDate(str) {
         if (!str) return '-';
         try {
@@ -355,7 +441,8 @@ document.addEventListener('DOMContentLoaded', async () => {
 
         const hdr = document.createElement('p');
         hdr.style.cssText = 'color:var(--white-70);font-size:.9rem;margin:0 0 10px;';
-        hdr.textContent = `📁 ${gestiones.length} gestión${gestiones.length !== 1 ? 'es' : ''}`;
+        const total = totalSeccion('gestiones', gestiones);
+        hdr.textContent = `📁 ${total} gestión${total !== 1 ? 'es' : ''}`;
         pane.appendChild(hdr);
 
         gestiones.forEach(g => {
@@ -457,6 +544,7 @@ document.addEventListener('DOMContentLoaded', async () => {
 
             pane.appendChild(row);
         });
+        agregarVerMas(pane, 'gestiones', gestiones, lista => renderGestiones(lista, allPolizas));
     }
 
     // ========================
@@ -476,7 +564,8 @@ document.addEventListener('DOMContentLoaded', async () => {
 
         const hdr = document.createElement('p');
         hdr.style.cssText = 'color:var(--white-70);font-size:.9rem;margin:0 0 10px;';
-        hdr.textContent = `🚗 ${accidentes.length} denuncia${accidentes.length !== 1 ? 's' : ''} de accidente`;
+        const total = totalSeccion('accidentes', accidentes);
+        hdr.textContent = `🚗 ${total} denuncia${total !== 1 ? 's' : ''} de accidente`;
         pane.appendChild(hdr);
 
         let accIdx = 0;
@@ -486,7 +575,7 @@ document.addEventListener('DOMContentLoaded', async () => {
             const culpa     = strVal(a['CULPABILIDAD']);
             const tratam    = strVal(a['TRATAMIENTO']) || strVal(a['Tratamiento']);
             const resoluc   = strVal(a['TIPO DE RESOLUCION']) || strVal(a['Elegir Resolucion ']);
-            const patente   = strVal(a['1) PATENTE DE SU VEHICULO']);
+            const patente   = strVal(a['1) PATENTE DE SU VEHICULO']) || strVal(a['PATENTE DEL VEHICULO']);
             const marca     = strVal(a['MARCA DEL VEHICULO Compilación (de N° POLIZA)']) || strVal(a['MARCA DEL VEHICULO']);
             const modelo    = strVal(a['MODELO DEL VEHICULO']) || strVal(a['MODELO DEL  VEHICULO']);
             const vehiculo  = [marca, modelo].filter(Boolean).join(' ');
@@ -494,7 +583,6 @@ document.addEventListener('DOMContentLoaded', async () => {
             const fecha     = strVal(a['FECHA DE CREACION']);
             const atendido  = resolvedAtendido(a);
             const poliza    = strVal(a['N° DE POLIZA']);
-            const iaText    = cleanIAText(a['CULPABILIDAD IA']);
 
             // Colores específicos
             const tipoCls  = tipo && tipo.toUpperCase().includes('CON LESIONES') ? 'badge-red' : 'badge-blue';
@@ -522,7 +610,9 @@ document.addEventListener('DOMContentLoaded', async () => {
                 </div>
             `;
 
-            row.addEventListener('click', () => {
+            row.addEventListener('click', async () => {
+                // El análisis de IA viene solo en el detalle completo del registro
+                const iaText = cleanIAText((await detalleRegistro('accidentes', a))['CULPABILIDAD IA']);
                 const title = `🚨 Accidente ${numSiniestro || ''}`;
                 const body = `
                     <div class="modal-detail-row">
@@ -572,6 +662,7 @@ document.addEventListener('DOMContentLoaded', async () => {
 
             pane.appendChild(row);
         });
+        agregarVerMas(pane, 'accidentes', accidentes, renderAccidentes);
     }
 
     // ========================
@@ -593,7 +684,8 @@ document.addEventListener('DOMContentLoaded', async () => {
 
         const hdr = document.createElement('p');
         hdr.style.cssText = 'color:var(--white-70);font-size:.9rem;margin:0 0 10px;';
-        hdr.textContent = `🛡️ ${robos.length} denuncia${robos.length !== 1 ? 's' : ''} de robo OC`;
+        const total = totalSeccion('robo_oc', robos);
+        hdr.textContent = `🛡️ ${total} denuncia${total !== 1 ? 's' : ''} de robo OC`;
         pane.appendChild(hdr);
 
         robos.forEach(r => {
@@ -684,6 +776,7 @@ document.addEventListener('DOMContentLoaded', async () => {
 
             pane.appendChild(row);
         });
+        agregarVerMas(pane, 'robo_oc', robos, renderRoboOc);
     }
 
     // ========================
@@ -704,7 +797,8 @@ document.addEventListener('DOMContentLoaded', async () => {
 
         const hdr = document.createElement('p');
         hdr.style.cssText = 'color:var(--white-70);font-size:.9rem;margin:0 0 10px;';
-        hdr.textContent = `🔥 ${robos.length} denuncia${robos.length !== 1 ? 's' : ''} de robo/incendio`;
+        const total = totalSeccion('robo_incendio', robos);
+        hdr.textContent = `🔥 ${total} denuncia${total !== 1 ? 's' : ''} de robo/incendio`;
         pane.appendChild(hdr);
 
         robos.forEach(r => {
@@ -790,5 +884,6 @@ document.addEventListener('DOMContentLoaded', async () => {
 
             pane.appendChild(row);
         });
+        agregarVerMas(pane, 'robo_incendio', robos, renderRoboIncendio);
     }
 });
@@ -0,0 +1,144 @@
+import asyncio
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+IMGBB_URL = os.getenv("IMGBB_URL", "https://api.imgbb.com/1/upload")
+# Subidas simultáneas de UNA denuncia / de todo el proceso
+IMGBB_MAX_PER_REQUEST = int(os.getenv("IMGBB_MAX_PER_REQUEST", "4"))
+IMGBB_MAX_CONCURRENCY = int(os.getenv("IMGBB_MAX_CONCURRENCY", "12"))
+IMGBB_TIMEOUT = float(os.getenv("IMGBB_TIMEOUT", "60"))
+
+
+def _tamano(file_obj) -> Optional[int]:
+    try:
+        file_obj.seek(0, os.SEEK_END)
+        size = file_obj.tell()
+        file_obj.seek(0)
+        return size
+    except Exception:
+        return None
+
+
+class ImgbbUploader:
+    """
+    Subida de adjuntos a ImgBB.
+
+    - Un solo cliente httpx con pool de conexiones para todo el proceso.
+    - Las subidas de una denuncia corren en paralelo, con un tope por request
+      (IMGBB_MAX_PER_REQUEST) y otro global (IMGBB_MAX_CONCURRENCY).
+    - El multipart se arma desde el archivo temporal del UploadFile (streaming):
+      los bytes no se cargan enteros en memoria (salvo que haya optimizador, que
+      necesita decodificar la imagen).
+    """
+
+    def __init__(
+        self,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        optimizador=None,
+        api_key: Optional[str] = None,
+    ):
+        self.transport = transport
+        # Se lee al instanciar (después de load_dotenv en main), como AIRTABLE_*
+        self.api_key = api_key or os.getenv("IMGBB_API_KEY")
+        if not self.api_key:
+            print("WARNING: IMGBB_API_KEY not set")
+        # OptimizadorImagenes opcional: achica las fotos antes de subirlas
+        self.optimizador = optimizador
+        self._client: Optional[httpx.AsyncClient] = None
+        self._global_limit = asyncio.Semaphore(IMGBB_MAX_CONCURRENCY)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=IMGBB_TIMEOUT,
+                limits=httpx.Limits(max_connections=IMGBB_MAX_CONCURRENCY),
+                transport=self.transport,
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _subir(self, columna: str, up_file, request_limit: asyncio.Semaphore) -> Dict[str, Any]:
+        filename = getattr(up_file, "filename", None) or "imagen.jpg"
+        detalle: Dict[str, Any] = {"columna": columna, "archivo": filename, "ok": False}
+
+        async with request_limit:
+            file_obj = up_file.file
+            detalle["bytes"] = _tamano(file_obj)
+            optimizada = None
+            if self.optimizador is not None:
+                try:
+                    optimizada = await self.optimizador.optimizar(up_file)
+                except Exception as e:
+                    print(f"⚠️ Optimización omitida para {filename}: {e}")
+                if optimizada:
+                    file_obj = optimizada["file"]
+                    detalle["bytes_original"] = optimizada["bytes_original"]
+                    detalle["bytes"] = optimizada["bytes"]
+                    detalle["bytes_ahorrados"] = optimizada["bytes_original"] - optimizada["bytes"]
+                    detalle["ms_optimizacion"] = optimizada["ms"]
+
+            async with self._global_limit:
+                detalle.update(await self._post(filename, columna, file_obj))
+
+        return detalle
+
+    async def _post(self, filename: str, columna: str, file_obj) -> Dict[str, Any]:
+        detalle: Dict[str, Any] = {"ok": False}
+        if not self.api_key:
+            detalle["error"] = "ImgBB config missing"
+            print(f"   ❌ ImgBB sin IMGBB_API_KEY: {filename} no se sube")
+            return detalle
+        started = time.perf_counter()
+        try:
+            print(f"🚀 Subiendo a ImgBB: {filename} -> {columna}")
+
+            files = {"image": (filename, file_obj, "image/jpeg")}
+            resp = await self.client.post(IMGBB_URL, files=files, data={"key": self.api_key})
+
+            if resp.status_code == 200:
+                result = resp.json()
+                if result.get("success"):
+                    detalle["url"] = result["data"]["url"]
+                    detalle["ok"] = True
+                    print(f"   ✅ ImgBB OK: {filename} -> {detalle['url']}")
+                else:
+                    detalle["error"] = "ImgBB rechazó la imagen"
+                    print(f"   ❌ ImgBB error: {result}")
+            else:
+                detalle["error"] = f"HTTP {resp.status_code}"
+                print(f"   ❌ ImgBB HTTP error: {resp.status_code} - {resp.text}")
+        except Exception as e:
+            detalle["error"] = str(e) or type(e).__name__
+            print(f"   ❌ Excepción subiendo {filename}: {e}")
+        detalle["ms"] = round(1000 * (time.perf_counter() - started), 1)
+        return detalle
+
+    async def subir_todos(
+        self, archivos: Dict[str, List[Any]]
+    ) -> Tuple[Dict[str, List[str]], List[Dict[str, Any]]]:
+        """
+        archivos: { columna_airtable: [UploadFile, ...] }
+        Retorna ({columna: [urls en el orden original]}, [detalle por archivo]).
+        """
+        request_limit = asyncio.Semaphore(IMGBB_MAX_PER_REQUEST)
+        detalles = await asyncio.gather(
+            *(
+                self._subir(columna, up_file, request_limit)
+                for columna, uploads in archivos.items()
+                for up_file in uploads
+            )
+        )
+
+        urls: Dict[str, List[str]] = {columna: [] for columna in archivos}
+        for detalle in detalles:
+            if detalle["ok"]:
+                urls[detalle["columna"]].append(detalle["url"])
+        return urls, list(detalles)
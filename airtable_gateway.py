@@ -0,0 +1,180 @@
+import os
+import threading
+from typing import Dict, Optional
+
+import httpx
+from pyairtable import Table
+from requests import Session
+from requests.adapters import HTTPAdapter
+
+try:
+    from .airtable_repository import AirtableRepository
+    from .airtable_scheduler import AirtableScheduler
+except ImportError:
+    from airtable_repository import AirtableRepository
+    from airtable_scheduler import AirtableScheduler
+
+# Configuración del pool (por worker de uvicorn)
+POOL_SIZE = int(os.getenv("AIRTABLE_POOL_SIZE", "20"))
+CONNECT_TIMEOUT = float(os.getenv("AIRTABLE_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("AIRTABLE_READ_TIMEOUT", "30"))
+# Requests simultáneos máximos contra la base (Airtable admite ~5 req/s por base)
+MAX_CONCURRENCY = int(os.getenv("AIRTABLE_MAX_CONCURRENCY", "5"))
+# Permite apuntar a un Airtable falso local (ej: http://127.0.0.1:8765)
+ENDPOINT_URL = os.getenv("AIRTABLE_ENDPOINT_URL", "https://api.airtable.com")
+
+
+class AirtableGateway:
+    """
+    Punto único de acceso a Airtable para todo el proceso.
+
+    Mantiene UNA sesión HTTP keep-alive (pool de conexiones) por worker y
+    entrega handles de tabla reutilizables, indexados por las claves de
+    TABLE_MAPPING. Así evitamos abrir una sesión y un handshake TLS nuevos
+    contra api.airtable.com en cada request.
+
+    - table(key): handle síncrono de pyairtable (scripts / código legado).
+    - repo(key): AirtableRepository asíncrono sobre httpx.AsyncClient, el
+      que deben usar los endpoints `async def` para no bloquear el event loop.
+
+    Variables de entorno:
+    - AIRTABLE_POOL_SIZE: conexiones keep-alive máximas del pool (default 20)
+    - AIRTABLE_CONNECT_TIMEOUT: timeout de conexión en segundos (default 5)
+    - AIRTABLE_READ_TIMEOUT: timeout de lectura en segundos (default 30)
+    - AIRTABLE_MAX_CONCURRENCY: requests async simultáneos contra la base (default 5)
+    - AIRTABLE_ENDPOINT_URL: URL base de la API (default https://api.airtable.com)
+
+    La admisión (rate limit por base, prioridades y reintentos ante 429) la
+    resuelve un AirtableScheduler único por worker (ver airtable_scheduler.py).
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        base_id: Optional[str],
+        table_mapping: Dict[str, str],
+        endpoint_url: str = ENDPOINT_URL,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.api_key = api_key
+        self.base_id = base_id
+        self.table_mapping = table_mapping
+        self.endpoint_url = endpoint_url.rstrip("/")
+        self.pool_size = POOL_SIZE
+        self.timeout = (CONNECT_TIMEOUT, READ_TIMEOUT)
+        # transport: permite inyectar un Airtable falso en proceso (httpx.ASGITransport)
+        self.transport = transport
+
+        self._session: Optional[Session] = None
+        self._tables: Dict[str, Table] = {}
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._repos: Dict[str, AirtableRepository] = {}
+        self._scheduler: Optional[AirtableScheduler] = None
+        self._lock = threading.Lock()
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key and self.base_id)
+
+    def resolve_table_name(self, table_name_key: str) -> str:
+        return self.table_mapping.get(table_name_key, table_name_key)
+
+    def _build_session(self) -> Session:
+        # La sesión se crea de forma perezosa: cada worker (post-fork) arma su propio pool
+        session = Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({"Authorization": f"Bearer {self.api_key}"})
+        return session
+
+    @property
+    def session(self) -> Session:
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = self._build_session()
+        return self._session
+
+    def table(self, table_name_key: str) -> Optional[Table]:
+        """
+        Retorna el handle (cacheado) de la tabla indicada, compartiendo el pool HTTP.
+        Retorna None si faltan credenciales de Airtable.
+        """
+        if not self.configured:
+            return None
+
+        table = self._tables.get(table_name_key)
+        if table is not None:
+            return table
+
+        session = self.session
+        with self._lock:
+            table = self._tables.get(table_name_key)
+            if table is None:
+                table = Table(
+                    self.api_key,
+                    self.base_id,
+                    self.resolve_table_name(table_name_key),
+                    timeout=self.timeout,
+                    endpoint_url=self.endpoint_url,
+                )
+                # Reemplazamos la sesión propia de pyairtable por el pool compartido
+                table.session = session
+                self._tables[table_name_key] = table
+        return table
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                base_url=self.endpoint_url,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size,
+                ),
+                timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+                transport=self.transport,
+            )
+        return self._async_client
+
+    @property
+    def scheduler(self) -> AirtableScheduler:
+        # Uno por worker: el rate limit de Airtable es por base, no por tabla
+        if self._scheduler is None:
+            self._scheduler = AirtableScheduler(max_concurrency=MAX_CONCURRENCY)
+        return self._scheduler
+
+    def repo(self, table_name_key: str) -> Optional[AirtableRepository]:
+        """
+        Retorna el repositorio asíncrono (cacheado) de la tabla indicada.
+        Retorna None si faltan credenciales de Airtable.
+        """
+        if not self.configured:
+            return None
+
+        repo = self._repos.get(table_name_key)
+        if repo is None:
+            repo = AirtableRepository(
+                self.async_client,
+                self.base_id,
+                self.resolve_table_name(table_name_key),
+                scheduler=self.scheduler,
+            )
+            self._repos[table_name_key] = repo
+        return repo
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+            self._tables.clear()
+
+    async def aclose(self):
+        self.close()
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+        self._repos.clear()
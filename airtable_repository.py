@@ -0,0 +1,209 @@
+import asyncio
+import re
+from typing import Any, Dict, List, Optional, Set
+from urllib.parse import quote
+
+import httpx
+
+try:
+    from .airtable_scheduler import AirtableScheduler
+except ImportError:
+    from airtable_scheduler import AirtableScheduler
+
+# Límites de la API de Airtable
+MAX_IDS_PER_FORMULA = 50  # RECORD_ID() por fórmula OR(...) (evita fórmulas gigantes)
+MAX_RECORDS_PER_WRITE = 10  # registros por create/update en lote
+
+
+class AirtableError(Exception):
+    """Error devuelto por la API de Airtable (status HTTP + mensaje de Airtable)."""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"{status_code}: {message}")
+        self.status_code = status_code
+        self.message = message
+
+
+_RE_CAMPO_DESCONOCIDO = re.compile(r'Unknown field name: "(.*?)"')
+
+
+def _campo_desconocido(error: AirtableError) -> Optional[str]:
+    """Nombre del campo si Airtable rechazó un `fields=` que no existe en la tabla."""
+    if error.status_code != 422 or "UNKNOWN_FIELD_NAME" not in error.message:
+        return None
+    match = _RE_CAMPO_DESCONOCIDO.search(error.message)
+    return match.group(1) if match else None
+
+
+def _sort_to_json(sort: List[str]) -> List[Dict[str, str]]:
+    # Misma convención que pyairtable: "CAMPO" asc, "-CAMPO" desc
+    result = []
+    for field in sort:
+        if field.startswith("-"):
+            result.append({"field": field[1:], "direction": "desc"})
+        else:
+            result.append({"field": field, "direction": "asc"})
+    return result
+
+
+def record_ids_formula(record_ids: List[str]) -> str:
+    conditions = ",".join([f"RECORD_ID()='{rid}'" for rid in record_ids])
+    return f"OR({conditions})"
+
+
+class AirtableRepository:
+    """
+    Acceso asíncrono (httpx.AsyncClient) a UNA tabla de Airtable.
+
+    No bloquea el event loop de uvicorn: todas las operaciones son awaitables.
+    El cliente HTTP se inyecta (lo provee AirtableGateway), por lo que se
+    puede apuntar a un servidor Airtable falso local cambiando la URL base
+    (ver ejecucion/fake_airtable_server.py).
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        base_id: str,
+        table_name: str,
+        scheduler: Optional[AirtableScheduler] = None,
+    ):
+        self.client = client
+        self.base_id = base_id
+        self.table_name = table_name
+        self.table_url = f"/v0/{base_id}/{quote(table_name, safe='')}"
+        # Planificador GLOBAL (rate limit + prioridad + concurrencia), compartido entre tablas
+        self.scheduler = scheduler or AirtableScheduler()
+        # Campos de proyecciones que esta tabla no tiene (se omiten en los próximos pedidos)
+        self.unknown_fields: Set[str] = set()
+
+    async def _request(self, method: str, url: str, **kwargs) -> Dict[str, Any]:
+        attempt = 0
+        while True:
+            async with self.scheduler.slot():
+                response = await self.client.request(method, url, **kwargs)
+            if response.status_code != 429 or attempt >= self.scheduler.max_retries:
+                break
+            delay = self.scheduler.backoff(attempt, response.headers.get("Retry-After"))
+            print(f"⏳ Airtable 429 en {self.table_name}: reintento {attempt + 1} en {delay:.1f}s")
+            attempt += 1
+
+        if response.status_code >= 400:
+            try:
+                payload = response.json()
+                error = payload.get("error", payload)
+            except ValueError:
+                error = response.text
+            raise AirtableError(response.status_code, str(error))
+        return response.json()
+
+    async def iterate(
+        self,
+        formula: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+        sort: Optional[List[str]] = None,
+        max_records: Optional[int] = None,
+        page_size: Optional[int] = None,
+        view: Optional[str] = None,
+    ):
+        """Generador asíncrono de páginas de registros (paginación automática por offset)."""
+        body: Dict[str, Any] = {}
+        if formula:
+            body["filterByFormula"] = formula
+        if fields is not None:
+            body["fields"] = [f for f in fields if f not in self.unknown_fields]
+        if sort:
+            body["sort"] = _sort_to_json(sort)
+        if max_records:
+            body["maxRecords"] = max_records
+        if page_size:
+            body["pageSize"] = page_size
+        if view:
+            body["view"] = view
+
+        # POST listRecords: admite fórmulas largas sin límite de URL
+        url = f"{self.table_url}/listRecords"
+        while True:
+            try:
+                data = await self._request("POST", url, json=body)
+            except AirtableError as e:
+                # Una proyección que nombra un campo inexistente no debe romper la lectura
+                campo = _campo_desconocido(e)
+                if campo is None or campo not in body.get("fields", []):
+                    raise
+                print(f"⚠️ {self.table_name}: el campo '{campo}' no existe, se quita de la proyección")
+                self.unknown_fields.add(campo)
+                body["fields"].remove(campo)
+                continue
+            yield data.get("records", [])
+            offset = data.get("offset")
+            if not offset:
+                break
+            body["offset"] = offset
+
+    async def list(self, **options) -> List[Dict[str, Any]]:
+        """Equivalente async de Table.all(): retorna todos los registros (todas las páginas)."""
+        records = []
+        async for page in self.iterate(**options):
+            records.extend(page)
+        return records
+
+    async def first(self, **options) -> Optional[Dict[str, Any]]:
+        options.update(max_records=1, page_size=1)
+        async for page in self.iterate(**options):
+            for record in page:
+                return record
+        return None
+
+    async def get(self, record_id: str) -> Dict[str, Any]:
+        return await self._request("GET", f"{self.table_url}/{record_id}")
+
+    async def get_many(
+        self, record_ids: List[str], fields: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Trae varios registros por ID usando OR(RECORD_ID()=...) en bloques de 50.
+        Los bloques se piden en paralelo (acotados por el scheduler global).
+        El orden del resultado sigue el de record_ids; los IDs inexistentes se omiten.
+        """
+        ids = [rid for rid in dict.fromkeys(record_ids or []) if rid]
+        if not ids:
+            return []
+        chunks = [
+            ids[i : i + MAX_IDS_PER_FORMULA]
+            for i in range(0, len(ids), MAX_IDS_PER_FORMULA)
+        ]
+        pages = await asyncio.gather(
+            *[self.list(formula=record_ids_formula(chunk), fields=fields) for chunk in chunks]
+        )
+        by_id = {record["id"]: record for page in pages for record in page}
+        return [by_id[rid] for rid in ids if rid in by_id]
+
+    async def create(self, fields: Dict[str, Any], typecast: bool = False) -> Dict[str, Any]:
+        return await self._request(
+            "POST", self.table_url, json={"fields": fields, "typecast": typecast}
+        )
+
+    async def create_many(
+        self, records_fields: List[Dict[str, Any]], typecast: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Crea varios registros en lotes de 10 (un request por lote). Retorna los creados, en orden."""
+        created: List[Dict[str, Any]] = []
+        for i in range(0, len(records_fields), MAX_RECORDS_PER_WRITE):
+            chunk = records_fields[i : i + MAX_RECORDS_PER_WRITE]
+            data = await self._request(
+                "POST",
+                self.table_url,
+                json={"records": [{"fields": fields} for fields in chunk], "typecast": typecast},
+            )
+            created.extend(data.get("records", []))
+        return created
+
+    async def update(
+        self, record_id: str, fields: Dict[str, Any], typecast: bool = False
+    ) -> Dict[str, Any]:
+        return await self._request(
+            "PATCH",
+            f"{self.table_url}/{record_id}",
+            json={"fields": fields, "typecast": typecast},
+        )
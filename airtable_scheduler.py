@@ -0,0 +1,188 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import random
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, List, Optional
+
+# Admisión: Airtable permite ~5 requests/segundo por base
+RATE_LIMIT = float(os.getenv("AIRTABLE_RATE_LIMIT", "5"))
+BURST = float(os.getenv("AIRTABLE_BURST", "5"))
+# Reintentos ante 429 (con Retry-After o backoff exponencial + jitter)
+MAX_RETRIES = int(os.getenv("AIRTABLE_MAX_RETRIES", "4"))
+BACKOFF_BASE = float(os.getenv("AIRTABLE_BACKOFF_BASE", "1"))
+BACKOFF_MAX = float(os.getenv("AIRTABLE_BACKOFF_MAX", "30"))
+
+# Clases de prioridad (menor = se atiende antes)
+INTERACTIVE = 0  # validaciones, login, portal: hay un usuario esperando
+AGENT = 1  # herramientas del agente de chat (n8n): ceden el paso al portal
+BACKGROUND = 2  # refrescos de índices y caches
+
+PRIORITY_NAMES = {INTERACTIVE: "interactive", AGENT: "agent", BACKGROUND: "background"}
+
+# Prioridad del contexto actual: los loops de fondo la bajan con `prioridad(BACKGROUND)`
+current_priority: contextvars.ContextVar = contextvars.ContextVar(
+    "airtable_priority", default=INTERACTIVE
+)
+
+
+@contextmanager
+def prioridad(priority: int):
+    token = current_priority.set(priority)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+class AirtableScheduler:
+    """
+    Planificador central de TODO el tráfico async hacia Airtable.
+
+    - Token bucket (RATE_LIMIT req/s, ráfaga BURST) compartido por todas las tablas.
+    - Cola con prioridad: cuando no hay tokens, los requests interactivos pasan
+      antes que los refrescos de fondo (orden FIFO dentro de cada clase).
+    - Tope de requests en vuelo (max_concurrency).
+    - Ante un 429 se pausa la admisión global durante Retry-After (o backoff
+      exponencial con jitter) y el request se reintenta: bajo carga los
+      requests esperan en cola en lugar de fallar.
+    """
+
+    def __init__(
+        self,
+        rate: float = RATE_LIMIT,
+        burst: float = BURST,
+        max_concurrency: int = 5,
+        max_retries: int = MAX_RETRIES,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self._concurrency = asyncio.Semaphore(max_concurrency)
+
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters: List = []  # heap de (prioridad, secuencia, future)
+        self._seq = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+        self.admitted = 0
+        self.throttled = 0
+        self.retries = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    # ------------------------------------------------------------------
+    # Token bucket
+    # ------------------------------------------------------------------
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _try_take(self) -> bool:
+        if time.monotonic() < self._paused_until:
+            return False
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    async def _dispatch(self):
+        # Entrega tokens a los waiters en orden de prioridad mientras haya cola
+        while self._waiters:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            if not self._try_take():
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                continue
+            while self._waiters:
+                _, _, future = heapq.heappop(self._waiters)
+                if not future.done():
+                    future.set_result(None)
+                    break
+            else:
+                # Todos los waiters restantes fueron cancelados: devolver el token
+                self._tokens += 1
+        self._dispatcher = None
+
+    async def _acquire_token(self, priority: int):
+        started = time.monotonic()
+        if not self._waiters and self._try_take():
+            self._record_wait(0.0)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+        await future
+        self._record_wait(time.monotonic() - started)
+
+    def _record_wait(self, waited: float):
+        self.admitted += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+
+    @asynccontextmanager
+    async def slot(self, priority: Optional[int] = None):
+        """Admisión de UN request HTTP: token del bucket + lugar en vuelo."""
+        if priority is None:
+            priority = current_priority.get()
+        await self._acquire_token(priority)
+        async with self._concurrency:
+            yield
+
+    # ------------------------------------------------------------------
+    # 429 / backoff
+    # ------------------------------------------------------------------
+
+    def backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """
+        Registra un 429 y pausa la admisión global. Retorna la demora aplicada.
+        Usa Retry-After si viene; si no, backoff exponencial con jitter completo.
+        """
+        self.throttled += 1
+        self.retries += 1
+        delay = None
+        if retry_after:
+            try:
+                delay = float(retry_after)
+            except ValueError:
+                delay = None
+        if delay is None:
+            delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+        else:
+            # Jitter para que los reintentos no vuelvan todos en el mismo instante
+            delay += random.uniform(0, BACKOFF_BASE)
+        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        return delay
+
+    # ------------------------------------------------------------------
+    # Métricas
+    # ------------------------------------------------------------------
+
+    def metrics(self) -> Dict:
+        depth = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, future in self._waiters:
+            if not future.done():
+                name = PRIORITY_NAMES.get(priority, str(priority))
+                depth[name] = depth.get(name, 0) + 1
+        paused_for = max(0.0, self._paused_until - time.monotonic())
+        return {
+            "queue_depth": depth,
+            "admitted": self.admitted,
+            "throttled_429": self.throttled,
+            "retries": self.retries,
+            "avg_wait_ms": round(1000 * self.total_wait / self.admitted, 1) if self.admitted else 0,
+            "max_wait_ms": round(1000 * self.max_wait, 1),
+            "paused_for_s": round(paused_for, 2),
+        }
@@ -0,0 +1,67 @@
+import os
+import sqlite3
+
+# Volumen persistente montado por Railway (si el servicio tiene uno)
+VOLUMEN_RAILWAY = os.getenv("RAILWAY_VOLUME_MOUNT_PATH", "")
+# Directorio de datos locales persistentes (cola de denuncias, escrituras diferidas, etc.)
+DATA_DIR = (
+    os.getenv("DATA_DIR")
+    or VOLUMEN_RAILWAY
+    or os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+)
+# Declarar DATA_DIR persistente a mano (otro proveedor con disco/volumen propio)
+DATA_DIR_PERSISTENTE = os.getenv("DATA_DIR_PERSISTENTE", "").lower() in ("1", "true", "si", "yes")
+
+
+def ruta(*partes: str) -> str:
+    """Ruta dentro de DATA_DIR (crea los directorios intermedios)."""
+    path = os.path.join(DATA_DIR, *partes)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def verificar_persistencia():
+    """
+    Falla si DATA_DIR no sobrevive a un redeploy.
+
+    La cola de denuncias y las escrituras diferidas responden 'aceptado' apenas
+    guardan en DATA_DIR: en el filesystem efímero de Railway eso se pierde en el
+    próximo deploy. En Railway DATA_DIR tiene que estar dentro del volumen
+    (RAILWAY_VOLUME_MOUNT_PATH); fuera de Railway se asume disco local, salvo
+    que se indique lo contrario con DATA_DIR_PERSISTENTE.
+    """
+    if DATA_DIR_PERSISTENTE:
+        return
+    en_railway = any(
+        os.getenv(var) for var in ("RAILWAY_ENVIRONMENT", "RAILWAY_ENVIRONMENT_NAME", "RAILWAY_PROJECT_ID")
+    )
+    if VOLUMEN_RAILWAY:
+        volumen = os.path.realpath(VOLUMEN_RAILWAY)
+        data_dir = os.path.realpath(DATA_DIR)
+        if os.path.commonpath([volumen, data_dir]) != volumen:
+            raise RuntimeError(
+                f"DATA_DIR ({DATA_DIR}) está fuera del volumen persistente ({VOLUMEN_RAILWAY}): "
+                "las denuncias aceptadas se perderían en el próximo deploy"
+            )
+    elif en_railway:
+        raise RuntimeError(
+            "El servicio no tiene un volumen persistente montado: agregar un volumen en Railway "
+            "(DATA_DIR toma su ruta) o definir DATA_DIR_PERSISTENTE=1 si el disco ya es persistente"
+        )
+
+
+def conectar(db_path: str) -> sqlite3.Connection:
+    """
+    Conexión SQLite lista para usar desde varios workers/procesos a la vez.
+
+    - WAL: lectores no bloquean al escritor.
+    - isolation_level=None: autocommit; las transacciones se abren explícitamente
+      con BEGIN IMMEDIATE cuando hace falta atomicidad entre procesos.
+    - timeout: espera el lock en vez de fallar con 'database is locked'.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
@@ -0,0 +1,137 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+try:
+    from .airtable_scheduler import BACKGROUND, prioridad
+except ImportError:
+    from airtable_scheduler import BACKGROUND, prioridad
+
+# Registro de todas las caches del proceso (para exponer métricas)
+CACHES: List["RefreshingCache"] = []
+
+
+class CacheEntry:
+    __slots__ = ("value", "loaded_at")
+
+    def __init__(self, value: Any):
+        self.value = value
+        self.loaded_at = time.monotonic()
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.loaded_at
+
+
+class RefreshingCache:
+    """
+    Cache asíncrona en memoria con TTL y refresco en segundo plano.
+
+    - Dentro del TTL: se sirve el valor cacheado (hit).
+    - Vencido el TTL pero dentro de stale_ttl: se sirve el valor viejo y se
+      dispara UN refresco en segundo plano (stale-while-revalidate).
+    - Sin valor (o demasiado viejo): se carga en línea (miss). Un lock por
+      clave garantiza que solo un request llama al loader; el resto espera.
+    - Si un refresco de fondo falla se conserva el valor anterior.
+
+    loader(key) es una corrutina que retorna el valor a cachear.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        loader: Callable[[Hashable], Awaitable[Any]],
+        ttl: float,
+        stale_ttl: Optional[float] = None,
+    ):
+        self.name = name
+        self.loader = loader
+        self.ttl = ttl
+        # stale_ttl=None: el valor viejo se sirve indefinidamente mientras se refresca
+        self.stale_ttl = stale_ttl
+
+        self._entries: Dict[Hashable, CacheEntry] = {}
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+        self._refreshing: Dict[Hashable, asyncio.Task] = {}
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.errors = 0
+        CACHES.append(self)
+
+    def _lock(self, key: Hashable) -> asyncio.Lock:
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        return lock
+
+    def entry(self, key: Hashable = None) -> Optional[CacheEntry]:
+        return self._entries.get(key)
+
+    async def _load(self, key: Hashable) -> CacheEntry:
+        try:
+            value = await self.loader(key)
+        except Exception:
+            self.errors += 1
+            raise
+        entry = self._entries[key] = CacheEntry(value)
+        return entry
+
+    async def _refresh_in_background(self, key: Hashable):
+        try:
+            async with self._lock(key):
+                with prioridad(BACKGROUND):
+                    await self._load(key)
+        except Exception as e:
+            print(f"⚠️ Cache {self.name}: error refrescando {key!r}, se mantiene el valor anterior: {e}")
+        finally:
+            self._refreshing.pop(key, None)
+
+    async def get_entry(self, key: Hashable = None) -> CacheEntry:
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.age < self.ttl:
+                self.hits += 1
+                return entry
+            if self.stale_ttl is None or entry.age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                if key not in self._refreshing:
+                    self._refreshing[key] = asyncio.get_running_loop().create_task(
+                        self._refresh_in_background(key)
+                    )
+                return entry
+
+        async with self._lock(key):
+            # Otro request pudo haberlo cargado mientras esperábamos
+            entry = self._entries.get(key)
+            if entry is not None and entry.age < self.ttl:
+                self.hits += 1
+                return entry
+            self.misses += 1
+            return await self._load(key)
+
+    async def get(self, key: Hashable = None) -> Any:
+        return (await self.get_entry(key)).value
+
+    def set(self, key: Hashable, value: Any):
+        self._entries[key] = CacheEntry(value)
+
+    def invalidate(self, key: Hashable = None, all_keys: bool = False):
+        if all_keys:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "errors": self.errors,
+        }
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    return {c.name: c.stats() for c in CACHES}
@@ -0,0 +1,164 @@
+import asyncio
+import os
+import time
+from typing import Any, Callable, Dict, Optional
+
+try:
+    from .airtable_scheduler import BACKGROUND, prioridad
+    from .proyecciones import campos, proyeccion
+except ImportError:
+    from airtable_scheduler import BACKGROUND, prioridad
+    from proyecciones import campos, proyeccion
+
+# Cada cuánto se recalcula el agregado completo contra Airtable (segundos)
+RECONCILIAR_INTERVAL = float(os.getenv("RATING_RECONCILIAR_INTERVAL", "900"))
+
+# Calificaciones que cuentan para el promedio
+FORMULA_VISIBLES = "AND({VISIBLE}=TRUE(), {ESTRELLAS}>0)"
+
+ESTRELLAS_POSIBLES = (5, 4, 3, 2, 1)
+
+proyeccion("rating", "CALIFICACIONES", ["ESTRELLAS"])
+
+
+class AgregadoCalificaciones:
+    """
+    Promedio de CALIFICACIONES mantenido en memoria: cantidad, suma e histograma
+    por estrellas.
+
+    - registrar() lo actualiza en el momento cuando save_rating crea un registro.
+    - Un loop de fondo lo recalcula completo cada RECONCILIAR_INTERVAL segundos
+      (cambios hechos a mano en Airtable: ocultar, borrar, editar estrellas).
+    - Las lecturas son O(1); solo la primera espera la carga inicial.
+    """
+
+    def __init__(self, repo_provider: Callable[[str], Any]):
+        # repo_provider(table_key) -> AirtableRepository (o None si no hay config)
+        self.repo_provider = repo_provider
+
+        self.cantidad = 0
+        self.suma = 0
+        self.histograma: Dict[int, int] = {}
+        self._cargado = False
+        self._reconciliado_at: float = 0.0  # time.monotonic()
+
+        # Altas registradas mientras corre una reconciliación (record_id → estrellas):
+        # si el listado de Airtable no las incluyó, se vuelven a sumar al terminar
+        self._durante: Optional[Dict[str, int]] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+        self.reconciliaciones = 0
+        self.desvios = 0  # reconciliaciones que encontraron diferencias
+        self.errors = 0
+
+    def _sumar(self, estrellas: int):
+        self.cantidad += 1
+        self.suma += estrellas
+        self.histograma[estrellas] = self.histograma.get(estrellas, 0) + 1
+
+    def registrar(self, record_id: str, estrellas: Any):
+        """Nueva calificación visible ya creada en Airtable."""
+        try:
+            estrellas = int(estrellas)
+        except (TypeError, ValueError):
+            return
+        if estrellas <= 0:
+            return
+        if self._durante is not None:
+            self._durante[record_id] = estrellas
+        if self._cargado:
+            self._sumar(estrellas)
+
+    async def reconciliar(self):
+        """Recalcula el agregado completo desde Airtable (una sola a la vez)."""
+        async with self._lock:
+            table_calif = self.repo_provider("CALIFICACIONES")
+            if not table_calif:
+                raise RuntimeError("Airtable config missing")
+
+            self._durante = {}
+            try:
+                records = await table_calif.list(formula=FORMULA_VISIBLES, fields=campos("rating"))
+                durante = self._durante
+            except Exception:
+                self.errors += 1
+                raise
+            finally:
+                self._durante = None
+
+            anterior = (self.cantidad, self.suma)
+            self.cantidad, self.suma, self.histograma = 0, 0, {}
+            for r in records:
+                self._sumar(r["fields"].get("ESTRELLAS", 0))
+            ids = {r["id"] for r in records}
+            for record_id, estrellas in durante.items():
+                if record_id not in ids:
+                    self._sumar(estrellas)
+
+            if self._cargado and anterior != (self.cantidad, self.suma):
+                self.desvios += 1
+                print(f"⭐ Agregado de calificaciones corregido: {anterior} → {(self.cantidad, self.suma)}")
+            self._cargado = True
+            self._reconciliado_at = time.monotonic()
+            self.reconciliaciones += 1
+
+    async def _asegurar_carga(self):
+        if not self._cargado:
+            await self.reconciliar()
+
+    async def resumen(self) -> Dict[str, Any]:
+        await self._asegurar_carga()
+        if self.cantidad == 0:
+            return {"rating": 0, "total": 0}
+        return {"rating": round(self.suma / self.cantidad, 1), "total": self.cantidad}
+
+    async def distribucion(self) -> Dict[str, Any]:
+        resumen = await self.resumen()
+        total = self.cantidad
+        resumen["distribucion"] = [
+            {
+                "estrellas": estrellas,
+                "cantidad": self.histograma.get(estrellas, 0),
+                "porcentaje": round(100 * self.histograma.get(estrellas, 0) / total, 1) if total else 0,
+            }
+            for estrellas in ESTRELLAS_POSIBLES
+        ]
+        return resumen
+
+    # ------------------------------------------------------------------
+    # Loop de fondo
+    # ------------------------------------------------------------------
+
+    async def _run(self):
+        while True:
+            try:
+                with prioridad(BACKGROUND):
+                    await self.reconciliar()
+            except Exception as e:
+                print(f"⚠️ Error reconciliando calificaciones: {e}")
+            await asyncio.sleep(RECONCILIAR_INTERVAL)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "cargado": self._cargado,
+            "total": self.cantidad,
+            "suma": self.suma,
+            "age_seconds": round(time.monotonic() - self._reconciliado_at, 1) if self._cargado else None,
+            "reconciliaciones": self.reconciliaciones,
+            "desvios": self.desvios,
+            "errors": self.errors,
+        }
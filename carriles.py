@@ -0,0 +1,129 @@
+import asyncio
+import functools
+import os
+import time
+from typing import Any, Dict, Optional
+
+from fastapi import HTTPException
+
+try:
+    from .airtable_scheduler import prioridad
+except ImportError:
+    from airtable_scheduler import prioridad
+
+# Carril de las herramientas del agente de chat (/chat/*)
+CHAT_MAX_CONCURRENCIA = int(os.getenv("CHAT_MAX_CONCURRENCIA", "8"))
+CHAT_MAX_COLA = int(os.getenv("CHAT_MAX_COLA", "50"))
+CHAT_ESPERA_MAX = float(os.getenv("CHAT_ESPERA_MAX", "10"))
+
+
+class Carril:
+    """
+    Carril de ejecución acotado para un grupo de endpoints async.
+
+    - Como mucho max_concurrencia requests del carril corren a la vez; el resto
+      espera en cola (FIFO del semáforo) hasta espera_max segundos.
+    - Con la cola llena (max_cola) o vencida la espera se responde 503 con
+      Retry-After: una ráfaga del agente no acapara el proceso ni la cuota de
+      Airtable del portal.
+    - Lo que corre dentro del carril pide Airtable con la prioridad indicada.
+    """
+
+    def __init__(
+        self,
+        nombre: str,
+        max_concurrencia: int,
+        max_cola: int,
+        espera_max: float,
+        prioridad_airtable: Optional[int] = None,
+    ):
+        self.nombre = nombre
+        self.max_concurrencia = max_concurrencia
+        self.max_cola = max_cola
+        self.espera_max = espera_max
+        self.prioridad_airtable = prioridad_airtable
+        self._semaforo: Optional[asyncio.Semaphore] = None
+
+        self.en_curso = 0
+        self.en_cola = 0
+        self.max_cola_vista = 0
+        self.atendidos = 0
+        self.rechazados = 0
+        self.total_espera = 0.0
+        self.max_espera = 0.0
+
+    @property
+    def semaforo(self) -> asyncio.Semaphore:
+        if self._semaforo is None:
+            self._semaforo = asyncio.Semaphore(self.max_concurrencia)
+        return self._semaforo
+
+    def _rechazar(self, motivo: str):
+        self.rechazados += 1
+        print(f"🚦 Carril {self.nombre}: request rechazado ({motivo})")
+        raise HTTPException(
+            status_code=503,
+            detail=f"Servicio de {self.nombre} saturado, reintentar en unos segundos",
+            headers={"Retry-After": "2"},
+        )
+
+    async def _entrar(self):
+        if not self.semaforo.locked():
+            # Hay lugar: entra sin pasar por la cola
+            await self.semaforo.acquire()
+            self.en_curso += 1
+            return
+        if self.en_cola >= self.max_cola:
+            self._rechazar("cola llena")
+        started = time.monotonic()
+        self.en_cola += 1
+        self.max_cola_vista = max(self.max_cola_vista, self.en_cola)
+        # asyncio.timeout en vez de wait_for: en 3.11 un timeout que coincide con
+        # la adquisición puede perder el permiso y achicar el carril para siempre
+        adquirido = False
+        try:
+            async with asyncio.timeout(self.espera_max):
+                await self.semaforo.acquire()
+                adquirido = True
+        except TimeoutError:
+            pass
+        finally:
+            self.en_cola -= 1
+        if not adquirido:
+            self._rechazar("espera vencida")
+        espera = time.monotonic() - started
+        self.total_espera += espera
+        self.max_espera = max(self.max_espera, espera)
+        self.en_curso += 1
+
+    def _salir(self):
+        self.en_curso -= 1
+        self.atendidos += 1
+        self.semaforo.release()
+
+    def limitar(self, func):
+        """Decorador para endpoints `async def` (conserva la firma para FastAPI)."""
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            await self._entrar()
+            try:
+                if self.prioridad_airtable is None:
+                    return await func(*args, **kwargs)
+                with prioridad(self.prioridad_airtable):
+                    return await func(*args, **kwargs)
+            finally:
+                self._salir()
+
+        return wrapper
+
+    def metricas(self) -> Dict[str, Any]:
+        return {
+            "en_curso": self.en_curso,
+            "en_cola": self.en_cola,
+            "max_cola_vista": self.max_cola_vista,
+            "atendidos": self.atendidos,
+            "rechazados_503": self.rechazados,
+            "avg_espera_ms": round(1000 * self.total_espera / self.atendidos, 1) if self.atendidos else 0,
+            "max_espera_ms": round(1000 * self.max_espera, 1),
+        }
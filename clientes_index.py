@@ -0,0 +1,223 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    from .airtable_scheduler import BACKGROUND, prioridad
+except ImportError:
+    from airtable_scheduler import BACKGROUND, prioridad
+
+# Ventana máxima de desactualización tolerada al servir desde memoria (segundos)
+MAX_STALENESS = float(os.getenv("CLIENTES_INDEX_MAX_STALENESS", "60"))
+# Cada cuánto el loop de fondo trae los cambios incrementales (segundos)
+REFRESH_INTERVAL = float(os.getenv("CLIENTES_INDEX_REFRESH_INTERVAL", "30"))
+# Recarga completa periódica: detecta bajas/borrados que el incremental no ve
+FULL_RELOAD_INTERVAL = float(os.getenv("CLIENTES_INDEX_FULL_RELOAD", "3600"))
+# Solapamiento entre ventanas incrementales (tolerancia a desfasaje de relojes)
+OVERLAP = timedelta(seconds=10)
+# Link de POLIZAS a CLIENTES (barrido de pólizas modificadas)
+CAMPO_CLIENTES_POLIZA = "CLIENTES"
+
+
+def normalizar_dni(dni: Any) -> str:
+    """DNI → solo dígitos. En Airtable DNI es NUMBER (puede llegar como int o float)."""
+    if isinstance(dni, float) and dni.is_integer():
+        dni = int(dni)
+    return "".join(filter(str.isdigit, str(dni or "")))
+
+
+def _iso(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+class ClientIndex:
+    """
+    Índice en memoria DNI → registro de CLIENTES.
+
+    - Se carga completo una vez (load) y luego se actualiza de forma incremental
+      trayendo solo los registros con LAST_MODIFIED_TIME() posterior al último refresh.
+    - Las búsquedas se sirven desde memoria mientras el índice tenga menos de
+      MAX_STALENESS segundos; si está más viejo, la búsqueda espera un refresh
+      incremental (uno solo a la vez, los demás requests lo comparten).
+    - LAST_MODIFIED_TIME() no cambia cuando cambian lookups/rollups/fórmulas
+      (p.ej. "ETIQUETA_POLIZA Compilación (de POLIZAS)"): por eso cada refresh
+      incremental también barre POLIZAS por LAST_MODIFIED_TIME() y vuelve a traer
+      los clientes vinculados a las pólizas modificadas (póliza nueva, ANULADA...).
+      Lo que cambia sin editar ningún registro de CLIENTES ni de POLIZAS (fórmulas
+      que dependen de la fecha, como "VENCE EN ...", o lookups de otras tablas)
+      recién se ve en la recarga completa, cada FULL_RELOAD_INTERVAL.
+    - Un DNI ausente en un índice fresco es respuesta definitiva (no se consulta Airtable).
+    - Si Airtable falla después de la carga inicial, se sigue sirviendo lo último conocido.
+
+    Los registros retornados son compartidos: tratarlos como solo-lectura.
+    """
+
+    def __init__(
+        self,
+        repo_provider: Callable[[], Any],
+        fields: Optional[List[str]] = None,
+        polizas_provider: Optional[Callable[[], Any]] = None,
+    ):
+        # repo_provider() -> AirtableRepository de CLIENTES (o None si no hay config)
+        # polizas_provider() -> AirtableRepository de POLIZAS (barrido de vinculados)
+        self.repo_provider = repo_provider
+        self.fields = fields
+        self.polizas_provider = polizas_provider
+
+        self._by_dni: Dict[str, Dict[str, Any]] = {}
+        self._dni_by_id: Dict[str, str] = {}
+        self._synced_at: float = 0.0  # time.monotonic() del último sync exitoso
+        self._last_full_load: float = 0.0
+        self._cursor: Optional[datetime] = None  # hora UTC de inicio del último sync
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+        self.stats = {"hits": 0, "misses": 0, "refreshes": 0, "full_loads": 0, "errors": 0}
+
+    # ------------------------------------------------------------------
+    # Estado
+    # ------------------------------------------------------------------
+
+    @property
+    def loaded(self) -> bool:
+        return self._synced_at > 0
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self._synced_at if self.loaded else float("inf")
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "clientes": len(self._by_dni),
+            "loaded": self.loaded,
+            "age_seconds": round(self.age, 1) if self.loaded else None,
+            **self.stats,
+        }
+
+    # ------------------------------------------------------------------
+    # Mantenimiento del índice
+    # ------------------------------------------------------------------
+
+    def upsert(self, record: Dict[str, Any]):
+        """Inserta/actualiza un registro (también usado como write-through tras un update)."""
+        record_id = record.get("id")
+        fields = record.get("fields", {})
+        if self.fields is not None:
+            # El índice guarda solo la proyección (ej. la respuesta completa de un update)
+            fields = {k: fields[k] for k in self.fields if k in fields}
+            record = {**record, "fields": fields}
+        dni = normalizar_dni(fields.get("DNI"))
+
+        old_dni = self._dni_by_id.get(record_id)
+        if old_dni and old_dni != dni and self._by_dni.get(old_dni, {}).get("id") == record_id:
+            del self._by_dni[old_dni]
+
+        if dni:
+            self._by_dni[dni] = record
+            self._dni_by_id[record_id] = dni
+
+    async def _sync(self, full: bool):
+        repo = self.repo_provider()
+        if not repo:
+            raise RuntimeError("Airtable config missing")
+
+        started = datetime.now(timezone.utc)
+        if full or self._cursor is None:
+            records = await repo.list(fields=self.fields)
+            self._by_dni, self._dni_by_id = {}, {}
+            self._last_full_load = time.monotonic()
+            self.stats["full_loads"] += 1
+        else:
+            since = _iso(self._cursor - OVERLAP)
+            records = await repo.list(
+                formula=f"IS_AFTER(LAST_MODIFIED_TIME(), '{since}')", fields=self.fields
+            )
+            records += await self._clientes_de_polizas_modificadas(
+                repo, since, {r["id"] for r in records}
+            )
+            self.stats["refreshes"] += 1
+
+        for record in records:
+            self.upsert(record)
+
+        self._cursor = started
+        self._synced_at = time.monotonic()
+        if full or records:
+            print(f"📇 Índice CLIENTES: {len(records)} registros sincronizados ({'completo' if full else 'incremental'})")
+
+    async def _clientes_de_polizas_modificadas(self, repo, since: str, ya_traidos) -> List[Dict[str, Any]]:
+        """Clientes vinculados a pólizas modificadas desde `since` (su compilación pudo cambiar)."""
+        repo_polizas = self.polizas_provider() if self.polizas_provider else None
+        if not repo_polizas:
+            return []
+        polizas = await repo_polizas.list(
+            formula=f"IS_AFTER(LAST_MODIFIED_TIME(), '{since}')", fields=[CAMPO_CLIENTES_POLIZA]
+        )
+        ids = [
+            record_id
+            for poliza in polizas
+            for record_id in poliza.get("fields", {}).get(CAMPO_CLIENTES_POLIZA, [])
+            if record_id not in ya_traidos
+        ]
+        return await repo.get_many(ids, fields=self.fields) if ids else []
+
+    async def refresh(self, force_full: bool = False):
+        """Sincroniza con Airtable (un solo sync concurrente; los demás esperan el mismo)."""
+        requested_at = time.monotonic()
+        async with self._lock:
+            # Otro request ya sincronizó mientras esperábamos el lock
+            if not force_full and self._synced_at >= requested_at:
+                return
+            full = (
+                force_full
+                or not self.loaded
+                or time.monotonic() - self._last_full_load >= FULL_RELOAD_INTERVAL
+            )
+            try:
+                await self._sync(full)
+            except Exception:
+                self.stats["errors"] += 1
+                raise
+
+    async def get(self, dni: Any) -> Optional[Dict[str, Any]]:
+        """Registro de CLIENTES ({id, createdTime, fields}) para el DNI, o None."""
+        if self.age > MAX_STALENESS:
+            try:
+                await self.refresh()
+            except Exception as e:
+                if not self.loaded:
+                    raise
+                print(f"⚠️ Índice CLIENTES desactualizado ({self.age:.0f}s), sirviendo última versión: {e}")
+
+        record = self._by_dni.get(normalizar_dni(dni))
+        self.stats["hits" if record else "misses"] += 1
+        return record
+
+    # ------------------------------------------------------------------
+    # Loop de fondo
+    # ------------------------------------------------------------------
+
+    async def _run(self):
+        while True:
+            try:
+                # El refresco periódico cede el paso a los requests interactivos
+                with prioridad(BACKGROUND):
+                    await self.refresh()
+            except Exception as e:
+                print(f"⚠️ Error refrescando índice CLIENTES: {e}")
+            await asyncio.sleep(REFRESH_INTERVAL)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
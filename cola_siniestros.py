@@ -0,0 +1,456 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import shutil
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+try:
+    from .almacen_local import conectar, ruta
+except ImportError:
+    from almacen_local import conectar, ruta
+
+COLA_DB = os.getenv("SINIESTROS_QUEUE_DB") or ruta("siniestros.db")
+COLA_DIR = os.getenv("SINIESTROS_QUEUE_DIR") or ruta("adjuntos", "")
+WORKERS = int(os.getenv("SINIESTROS_WORKERS", "2"))
+MAX_INTENTOS = int(os.getenv("SINIESTROS_MAX_INTENTOS", "6"))
+# Backoff entre reintentos: BASE * 2^intento (con jitter), hasta MAX segundos
+BACKOFF_BASE = float(os.getenv("SINIESTROS_BACKOFF_BASE", "5"))
+BACKOFF_MAX = float(os.getenv("SINIESTROS_BACKOFF_MAX", "600"))
+# Un trabajo 'procesando' sin renovar su lease vuelve a la cola (worker caído)
+LEASE = float(os.getenv("SINIESTROS_LEASE", "300"))
+# Mientras se procesa, el lease se renueva cada LATIDO segundos (subidas lentas)
+LATIDO = float(os.getenv("SINIESTROS_LATIDO", str(LEASE / 3)))
+POLL_INTERVAL = float(os.getenv("SINIESTROS_POLL_INTERVAL", "2"))
+# Días que se conservan los trabajos terminados (para consultar el estado)
+RETENCION_DIAS = float(os.getenv("SINIESTROS_RETENCION_DIAS", "7"))
+# Ventana en la que un reenvío con la misma clave devuelve la denuncia original
+IDEMPOTENCIA_HORAS = float(os.getenv("SINIESTROS_IDEMPOTENCIA_HORAS", "24"))
+
+PENDIENTE = "pendiente"
+PROCESANDO = "procesando"
+COMPLETADO = "completado"
+ERROR = "error"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS trabajos (
+    ticket TEXT PRIMARY KEY,
+    estado TEXT NOT NULL,
+    etapa TEXT,
+    intentos INTEGER NOT NULL DEFAULT 0,
+    payload TEXT NOT NULL,
+    progreso TEXT,
+    resultado TEXT,
+    error TEXT,
+    creado REAL NOT NULL,
+    actualizado REAL NOT NULL,
+    disponible_desde REAL NOT NULL,
+    lease_hasta REAL
+);
+CREATE INDEX IF NOT EXISTS trabajos_estado ON trabajos (estado, disponible_desde);
+CREATE TABLE IF NOT EXISTS idempotencia (
+    clave TEXT PRIMARY KEY,
+    ticket TEXT NOT NULL,
+    creado REAL NOT NULL
+);
+"""
+
+
+def huella_denuncia(campos: Dict[str, Any], archivos: List[Tuple[str, Any]]) -> str:
+    """
+    Clave de idempotencia derivada del contenido: mismos campos y mismos
+    adjuntos (por hash, leídos en bloques desde el temporal) → misma clave.
+    archivos: [(nombre_campo, UploadFile), ...]
+    """
+    h = hashlib.sha256(json.dumps(campos, sort_keys=True, default=str).encode("utf-8"))
+    for campo, archivo in sorted(archivos, key=lambda x: (x[0], x[1].filename or "")):
+        contenido = hashlib.sha256()
+        archivo.file.seek(0)
+        for bloque in iter(lambda: archivo.file.read(1024 * 1024), b""):
+            contenido.update(bloque)
+        archivo.file.seek(0)
+        h.update(f"|{campo}|{archivo.filename}|{contenido.hexdigest()}".encode("utf-8"))
+    return h.hexdigest()
+
+
+class ErrorDefinitivo(Exception):
+    """Error que no se arregla reintentando (ej. columna mal configurada)."""
+
+
+class ArchivoEnCola:
+    """Adjunto persistido en disco, con la interfaz que usa ImgbbUploader (filename/file/content_type)."""
+
+    def __init__(self, path: str, filename: str, content_type: str = ""):
+        self.path = path
+        self.filename = filename
+        self.content_type = content_type
+        self.file = open(path, "rb")
+
+    def close(self):
+        self.file.close()
+
+
+class Trabajo:
+    def __init__(self, cola: "ColaSiniestros", row):
+        self.cola = cola
+        self.ticket: str = row["ticket"]
+        self.intentos: int = row["intentos"]
+        self.payload: Dict[str, Any] = json.loads(row["payload"])
+        self.progreso: Dict[str, Any] = json.loads(row["progreso"] or "{}")
+
+    def abrir_archivos(self) -> Dict[str, List[ArchivoEnCola]]:
+        """Adjuntos guardados al encolar: { columna_airtable: [ArchivoEnCola] } (cerrarlos al terminar)."""
+        return {
+            columna: [ArchivoEnCola(a["path"], a["filename"], a["content_type"]) for a in guardados]
+            for columna, guardados in self.payload.get("archivos", {}).items()
+        }
+
+    async def guardar_progreso(self, etapa: str, **cambios):
+        """Persiste la etapa y lo ya hecho (un reintento no repite lo guardado). Renueva el lease."""
+        self.progreso.update(cambios)
+        await self.cola._ejecutar(
+            "UPDATE trabajos SET etapa=?, progreso=?, actualizado=?, lease_hasta=? WHERE ticket=? AND intentos=?",
+            (etapa, json.dumps(self.progreso), time.time(), time.time() + LEASE, self.ticket, self.intentos),
+        )
+
+
+class ColaSiniestros:
+    """
+    Cola durable (SQLite) de denuncias de siniestro.
+
+    El endpoint guarda la denuncia y sus adjuntos en disco (encolar) y responde
+    con un ticket; los workers la procesan en segundo plano con reintentos y
+    backoff. Varios procesos uvicorn pueden compartir la misma base: la toma de
+    un trabajo es atómica (BEGIN IMMEDIATE) y un lease vencido lo devuelve a la cola.
+
+    procesador(trabajo) es una corrutina que retorna el resultado final (dict);
+    si lanza ErrorDefinitivo el trabajo termina en 'error', cualquier otra
+    excepción se reintenta hasta MAX_INTENTOS.
+    """
+
+    def __init__(
+        self,
+        procesador: Callable[[Trabajo], Awaitable[Dict[str, Any]]],
+        db_path: str = COLA_DB,
+        dir_archivos: str = COLA_DIR,
+        workers: int = WORKERS,
+    ):
+        self.procesador = procesador
+        self.db_path = db_path
+        self.dir_archivos = dir_archivos
+        self.workers = workers
+        self._tasks: List[asyncio.Task] = []
+        self._nuevo: Optional[asyncio.Event] = None
+
+        conn = conectar(self.db_path)
+        try:
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+
+    # ------------------------------------------------------------------
+    # SQLite (cada operación abre su conexión y corre en un thread)
+    # ------------------------------------------------------------------
+
+    def _ejecutar_sync(self, sql: str, params=()):
+        conn = conectar(self.db_path)
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    async def _ejecutar(self, sql: str, params=()):
+        return await asyncio.to_thread(self._ejecutar_sync, sql, params)
+
+    def _renovar_sync(self, ticket: str, intentos: int) -> bool:
+        # intentos sube en cada toma: si otro worker lo retomó, no coincide (no se pisa su lease)
+        conn = conectar(self.db_path)
+        try:
+            cursor = conn.execute(
+                "UPDATE trabajos SET lease_hasta=? WHERE ticket=? AND estado=? AND intentos=?",
+                (time.time() + LEASE, ticket, PROCESANDO, intentos),
+            )
+            return cursor.rowcount > 0
+        finally:
+            conn.close()
+
+    def _tomar_sync(self):
+        conn = conectar(self.db_path)
+        try:
+            now = time.time()
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                """SELECT * FROM trabajos
+                   WHERE (estado=? AND disponible_desde<=?) OR (estado=? AND lease_hasta<?)
+                   ORDER BY creado LIMIT 1""",
+                (PENDIENTE, now, PROCESANDO, now),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                """UPDATE trabajos SET estado=?, intentos=intentos+1, actualizado=?, lease_hasta=?
+                   WHERE ticket=?""",
+                (PROCESANDO, now, now + LEASE, row["ticket"]),
+            )
+            row = conn.execute("SELECT * FROM trabajos WHERE ticket=?", (row["ticket"],)).fetchone()
+            conn.execute("COMMIT")
+            return row
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+
+    def _guardar_archivo_sync(self, ticket: str, indice: int, archivo) -> Dict[str, Any]:
+        directorio = os.path.join(self.dir_archivos, ticket)
+        os.makedirs(directorio, exist_ok=True)
+        path = os.path.join(directorio, str(indice))
+        archivo.file.seek(0)
+        with open(path, "wb") as out:
+            shutil.copyfileobj(archivo.file, out, 1024 * 1024)
+        return {
+            "path": path,
+            "filename": archivo.filename,
+            "content_type": getattr(archivo, "content_type", "") or "",
+        }
+
+    def _ticket_por_clave(self, conn, clave: str) -> Optional[str]:
+        # Un envío que terminó en error no bloquea el reenvío: se toma como nuevo
+        row = conn.execute(
+            """SELECT i.ticket FROM idempotencia i JOIN trabajos t ON t.ticket = i.ticket
+               WHERE i.clave=? AND i.creado>=? AND t.estado!=?""",
+            (clave, time.time() - IDEMPOTENCIA_HORAS * 3600, ERROR),
+        ).fetchone()
+        return row["ticket"] if row else None
+
+    def _buscar_clave_sync(self, clave: str) -> Optional[str]:
+        conn = conectar(self.db_path)
+        try:
+            return self._ticket_por_clave(conn, clave)
+        finally:
+            conn.close()
+
+    async def buscar_clave(self, clave: str) -> Optional[str]:
+        """Ticket de una denuncia ya recibida con esta clave de idempotencia (o None)."""
+        return await asyncio.to_thread(self._buscar_clave_sync, clave)
+
+    def _insertar_sync(self, ticket: str, payload: str, clave: Optional[str]) -> Optional[str]:
+        conn = conectar(self.db_path)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            if clave:
+                existente = self._ticket_por_clave(conn, clave)
+                if existente:
+                    conn.execute("ROLLBACK")
+                    return existente
+            now = time.time()
+            conn.execute(
+                """INSERT INTO trabajos (ticket, estado, etapa, payload, creado, actualizado, disponible_desde)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (ticket, PENDIENTE, "recibido", payload, now, now, now),
+            )
+            if clave:
+                conn.execute(
+                    "INSERT OR REPLACE INTO idempotencia (clave, ticket, creado) VALUES (?, ?, ?)",
+                    (clave, ticket, now),
+                )
+            conn.execute("COMMIT")
+            return None
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    async def encolar(
+        self,
+        payload: Dict[str, Any],
+        archivos: Dict[str, List[Any]],
+        clave: Optional[str] = None,
+    ) -> Tuple[str, bool]:
+        """
+        Persiste la denuncia (payload JSON + adjuntos copiados a disco).
+        archivos: { columna_airtable: [UploadFile, ...] }
+        Retorna (ticket, nuevo). Si ya hay una denuncia con la misma clave de
+        idempotencia retorna su ticket con nuevo=False (chequeo atómico).
+        """
+        ticket = uuid.uuid4().hex
+        guardados: Dict[str, List[Dict[str, Any]]] = {}
+        indice = 0
+        for columna, uploads in archivos.items():
+            for up_file in uploads:
+                guardado = await asyncio.to_thread(self._guardar_archivo_sync, ticket, indice, up_file)
+                guardados.setdefault(columna, []).append(guardado)
+                indice += 1
+
+        existente = await asyncio.to_thread(
+            self._insertar_sync, ticket, json.dumps({**payload, "archivos": guardados}), clave
+        )
+        if existente:
+            await asyncio.to_thread(self._borrar_archivos, ticket)
+            return existente, False
+
+        if self._nuevo is not None:
+            self._nuevo.set()
+        return ticket, True
+
+    async def estado(self, ticket: str) -> Optional[Dict[str, Any]]:
+        rows = await self._ejecutar("SELECT * FROM trabajos WHERE ticket=?", (ticket,))
+        if not rows:
+            return None
+        row = rows[0]
+        return {
+            "ticket": row["ticket"],
+            "estado": row["estado"],
+            "etapa": row["etapa"],
+            "intentos": row["intentos"],
+            "creado": row["creado"],
+            "actualizado": row["actualizado"],
+            "proximo_intento": row["disponible_desde"] if row["estado"] == PENDIENTE else None,
+            "resultado": json.loads(row["resultado"]) if row["resultado"] else None,
+            "error": row["error"],
+        }
+
+    async def metricas(self) -> Dict[str, int]:
+        rows = await self._ejecutar("SELECT estado, COUNT(*) AS n FROM trabajos GROUP BY estado")
+        return {row["estado"]: row["n"] for row in rows}
+
+    # ------------------------------------------------------------------
+    # Workers
+    # ------------------------------------------------------------------
+
+    def _borrar_archivos(self, ticket: str):
+        shutil.rmtree(os.path.join(self.dir_archivos, ticket), ignore_errors=True)
+
+    def _terminar_sync(self, trabajo: Trabajo, estado: str, resultado, error: Optional[str]) -> bool:
+        # Mismo cerco que _renovar_sync: un worker que perdió el lease no cierra la fila del nuevo dueño
+        conn = conectar(self.db_path)
+        try:
+            cursor = conn.execute(
+                "UPDATE trabajos SET estado=?, etapa=?, resultado=?, error=?, actualizado=?, lease_hasta=NULL "
+                "WHERE ticket=? AND intentos=?",
+                (
+                    estado,
+                    estado,
+                    json.dumps(resultado) if resultado is not None else None,
+                    error,
+                    time.time(),
+                    trabajo.ticket,
+                    trabajo.intentos,
+                ),
+            )
+            return cursor.rowcount > 0
+        finally:
+            conn.close()
+
+    async def _terminar(self, trabajo: Trabajo, estado: str, resultado=None, error: Optional[str] = None):
+        if not await asyncio.to_thread(self._terminar_sync, trabajo, estado, resultado, error):
+            print(f"⚠️ Denuncia {trabajo.ticket}: la retomó otro worker, no se marca {estado} ni se borran sus adjuntos")
+            return
+        await asyncio.to_thread(self._borrar_archivos, trabajo.ticket)
+
+    async def _latido(self, trabajo: Trabajo, tarea: asyncio.Task):
+        """Renueva el lease mientras corre el procesador; si se perdió, lo cancela."""
+        while True:
+            await asyncio.sleep(LATIDO)
+            try:
+                vigente = await asyncio.to_thread(self._renovar_sync, trabajo.ticket, trabajo.intentos)
+            except Exception as e:
+                print(f"⚠️ Denuncia {trabajo.ticket}: no se pudo renovar el lease: {e}")
+                continue
+            if not vigente:
+                print(f"⚠️ Denuncia {trabajo.ticket}: lease perdido (la retomó otro worker), se abandona")
+                tarea.cancel()
+                return
+
+    async def _procesar(self, trabajo: Trabajo):
+        tarea = asyncio.ensure_future(self.procesador(trabajo))
+        latido = asyncio.ensure_future(self._latido(trabajo, tarea))
+        try:
+            resultado = await tarea
+        except asyncio.CancelledError:
+            if not tarea.cancelled() or not latido.done():
+                raise
+            # Lease perdido: el trabajo es de otro worker, no se toca su fila
+            return
+        except ErrorDefinitivo as e:
+            print(f"❌ Denuncia {trabajo.ticket}: error definitivo: {e}")
+            await self._terminar(trabajo, ERROR, error=str(e))
+            return
+        except Exception as e:
+            if trabajo.intentos >= MAX_INTENTOS:
+                print(f"❌ Denuncia {trabajo.ticket}: sin más reintentos ({trabajo.intentos}): {e}")
+                await self._terminar(trabajo, ERROR, error=str(e))
+                return
+            demora = random.uniform(0.5, 1) * min(BACKOFF_MAX, BACKOFF_BASE * (2 ** trabajo.intentos))
+            print(f"⚠️ Denuncia {trabajo.ticket}: intento {trabajo.intentos} falló ({e}); reintento en {demora:.0f}s")
+            await self._ejecutar(
+                "UPDATE trabajos SET estado=?, error=?, actualizado=?, disponible_desde=?, lease_hasta=NULL WHERE ticket=? AND intentos=?",
+                (PENDIENTE, str(e), time.time(), time.time() + demora, trabajo.ticket, trabajo.intentos),
+            )
+            return
+        finally:
+            latido.cancel()
+        await self._terminar(trabajo, COMPLETADO, resultado=resultado)
+
+    async def _worker(self):
+        while True:
+            try:
+                row = await asyncio.to_thread(self._tomar_sync)
+                if row is None:
+                    self._nuevo.clear()
+                    try:
+                        await asyncio.wait_for(self._nuevo.wait(), POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._procesar(Trabajo(self, row))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Error en worker de la cola de denuncias: {e}")
+                await asyncio.sleep(POLL_INTERVAL)
+
+    async def _purgar(self):
+        while True:
+            try:
+                limite = time.time() - RETENCION_DIAS * 86400
+                await self._ejecutar(
+                    "DELETE FROM trabajos WHERE estado IN (?, ?) AND actualizado<?",
+                    (COMPLETADO, ERROR, limite),
+                )
+                await self._ejecutar(
+                    "DELETE FROM idempotencia WHERE creado<?",
+                    (time.time() - IDEMPOTENCIA_HORAS * 3600,),
+                )
+            except Exception as e:
+                print(f"⚠️ Error purgando la cola de denuncias: {e}")
+            await asyncio.sleep(3600)
+
+    def start(self):
+        if self._tasks:
+            return
+        self._nuevo = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(loop.create_task(self._purgar()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
@@ -0,0 +1,177 @@
+"""
+Micro-benchmark del parser de ETIQUETA_POLIZA.
+
+Compara la implementación anterior (regex compiladas en cada llamada, un
+split + N pasadas por bloque) contra polizas.parsear_etiqueta (regex
+precompiladas, una pasada, resultado memorizado) sobre un corpus de etiquetas
+reales, y verifica que ambas produzcan exactamente el mismo resultado.
+
+Uso:
+    python ejecucion/bench_parse_poliza.py [repeticiones]
+"""
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from polizas import parse_poliza_block, parsear_etiqueta  # noqa: E402
+
+CORPUS = [
+    "✅ ⏳ VENCE 30D | 🚗 AUTO | N° POL: 33333333 | 🏷️ PDL384 | 🅰️ A | ❤️ VIDA: SI | 🆘 AUX",
+    "✅ ⏳ VENCE 30D | 🚗 AUTO | N° POL: 33333333 | 🏷️ PDL384 | 🛡️ A | ❤️ VIDA: SI | 🆘 AUX ✅ 🔴 ANULADA | 🚗 CAMIONETA | N° POL: 777742 | 🏷️ POL432",
+    "✅ ⏳ VENCE 30D | 🚗 AUTO | N° POL: 33333333 | 🏷️ PDL384 | 🅰️ A | ❤️ VIDA: SI | 🆘 AUX ✅ VENCE 30D | ANULADA | 🚗 CAMIONETA | N° POL: 777742 | 🏷️ POL432",
+    "✅ VENCE 30D | 🚗 AUTO | N° POL: 33333333 | 🏷️ PDL384 | 🅰️ A | ❤️ VIDA: SI | 🔧 AUX | ❌ ANULADA | 🚗 CAMIONETA | N° POL: 777742 | 🏷️ POL432",
+    "✅VENCE 30D|🚗AUTO|N° POL:33333333|🏷️PDL384|❌ANULADA|🚗CAMIONETA|N° POL:777742|🏷️POL432",
+    "✅  🟣 SIN VIGENCIA   |   🚗 AUTO   |   N° POL: 3455666   |   🏷️ 234RTY   |   🛡️ B4   |   🆘 AUX 300",
+    "✅ 🆘 AUX INFINITY ⏰ VENCE 7D | 🚗 TAXI | N° POL: 78546 | 🏷️ KHU789 | ❤️ VIDA",
+    "🟢 ALTA | 🚗 AUTO | N° POL: 1234567 | 🏷️ AB123CD | 🛡️ B4 | ❤️ VIDA: SI | 🆘 AUX",
+    "🟢 VIGENTE | 🏍️ MOTO | N° POL: 99887 | 🏷️ A123BCD",
+    "⭕ SIN POLIZAS",
+    "",
+]
+
+
+def parse_poliza_block_legacy(bloque_texto: str) -> list:
+    """Copia textual de la implementación anterior de main.parse_poliza_block."""
+    if not bloque_texto:
+        return []
+
+    parts = [p.strip() for p in bloque_texto.split("|")]
+    bloques_reconstruidos = []
+    current_bloque = []
+
+    emojis_inicio = ["✅", "❌", "⏳", "⚠️", "🟢", "🔴", "🟣", "⭕"]
+    keywords_inicio = [
+        "VIGENTE",
+        "VENCE",
+        "ANULADA",
+        "BAJA",
+        "ACTIVA",
+        "SIN VIGENCIA",
+        "SIN POLIZAS",
+        "TRAMITES",
+    ]
+
+    for part in parts:
+        part_upper = part.upper()
+        tiene_emoji = any(e in part for e in emojis_inicio)
+        tiene_keyword = any(k in part_upper for k in keywords_inicio)
+        es_inicio = tiene_emoji and tiene_keyword
+        if not current_bloque:
+            current_bloque.append(part)
+        elif es_inicio:
+            bloques_reconstruidos.append(" | ".join(current_bloque))
+            current_bloque = [part]
+        else:
+            current_bloque.append(part)
+
+    if current_bloque:
+        bloques_reconstruidos.append(" | ".join(current_bloque))
+
+    parsed_policies = []
+    for bloque in bloques_reconstruidos:
+        p_info = {
+            "numero": "",
+            "patente": "",
+            "tipo_vehiculo": "",
+            "categoria": "",
+            "vida": False,
+            "auxilio": False,
+            "estado": "",
+            "descripcion_completa": bloque,
+        }
+
+        match = re.search(r"N[°][ ]*POL[:]?[ ]*([0-9]+)", bloque, re.IGNORECASE)
+        if not match:
+            match = re.search(r"([0-9]{5,})", bloque)
+        if match:
+            p_info["numero"] = match.group(1)
+
+        match = re.search(
+            r"🏷️?[ ]*([A-Z]{2,3}[0-9]{3}[A-Z]{0,2}|[A-Z0-9]{6,9})", bloque, re.IGNORECASE
+        )
+        match_explicit = re.search(r"🏷️[ ]*([A-Z0-9]+)", bloque, re.IGNORECASE)
+        if match_explicit:
+            p_info["patente"] = match_explicit.group(1).upper()
+        elif match:
+            posible_patente = match.group(1).upper()
+            if len(posible_patente) >= 6 and not posible_patente.startswith("POL"):
+                p_info["patente"] = posible_patente
+
+        match = re.search(r"[🚗🚙🚛🏍️][ ]+([A-ZÁ-Ú]+)", bloque)
+        if match:
+            tipo = match.group(1).strip()
+            if len(tipo) > 2 and tipo not in ["POL"]:
+                p_info["tipo_vehiculo"] = tipo
+
+        if not p_info["tipo_vehiculo"]:
+            for tipo_clave in [
+                "AUTOMOVIL",
+                "AUTO",
+                "CAMIONETA",
+                "MOTO",
+                "CAMION",
+                "UTILITARIO",
+                "PICK UP",
+                "PICKUP",
+            ]:
+                if tipo_clave in bloque.upper():
+                    p_info["tipo_vehiculo"] = tipo_clave
+                    break
+
+        bloque_upper = bloque.upper()
+        if "ANULADA" in bloque_upper:
+            p_info["estado"] = "ANULADA"
+        elif "VIGENTE" in bloque_upper:
+            p_info["estado"] = "VIGENTE"
+        elif "SIN VIGENCIA" in bloque_upper:
+            p_info["estado"] = "SIN VIGENCIA"
+
+        match_vence = re.search(r"(VENCE[ ]*[0-9]+[D]?)", bloque_upper)
+        if match_vence:
+            p_info["estado"] = match_vence.group(1)
+
+        if "VIDA: SI" in bloque_upper or "❤️ VIDA" in bloque or "VIDA" in bloque_upper:
+            p_info["vida"] = True
+        if "AUX" in bloque_upper or "🆘" in bloque or "🔧" in bloque:
+            p_info["auxilio"] = True
+
+        parsed_policies.append(p_info)
+
+    return parsed_policies
+
+
+def _sin_cache():
+    parsear_etiqueta.cache_clear()
+    for texto in CORPUS:
+        parse_poliza_block(texto)
+
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    for texto in CORPUS:
+        esperado = parse_poliza_block_legacy(texto)
+        obtenido = parse_poliza_block(texto)
+        if esperado != obtenido:
+            print(f"❌ Diferencia para {texto!r}:\n  legacy: {esperado}\n  nuevo:  {obtenido}")
+            sys.exit(1)
+    print(f"✅ Mismo resultado en las {len(CORPUS)} etiquetas del corpus")
+
+    casos = {
+        "legacy": lambda: [parse_poliza_block_legacy(t) for t in CORPUS],
+        "nuevo (sin cache)": _sin_cache,
+        "nuevo (memorizado)": lambda: [parse_poliza_block(t) for t in CORPUS],
+    }
+    base = None
+    for nombre, fn in casos.items():
+        segundos = min(timeit.repeat(fn, number=repeticiones, repeat=3))
+        por_etiqueta = 1e6 * segundos / (repeticiones * len(CORPUS))
+        base = base or por_etiqueta
+        print(f"{nombre:<20} {por_etiqueta:8.2f} µs/etiqueta  (x{base / por_etiqueta:.1f})")
+
+
+if __name__ == "__main__":
+    main()
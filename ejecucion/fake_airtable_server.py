@@ -0,0 +1,289 @@
+"""
+Airtable FALSO en memoria para probar el backend sin tocar la base real.
+
+Implementa el subconjunto de la API REST v0 que usa el backend:
+- GET/POST  /v0/{base}/{tabla}              (listar / crear)
+- POST      /v0/{base}/{tabla}/listRecords  (listar con body JSON)
+- GET/PATCH /v0/{base}/{tabla}/{record_id}  (leer / actualizar)
+
+Soporta paginación (offset/pageSize), maxRecords, fields, sort y un
+subconjunto de fórmulas (AND, OR, NOT, RECORD_ID, TRUE, FALSE, SEARCH,
+IS_AFTER, LAST_MODIFIED_TIME, operadores & = != > < >= <=).
+
+Uso:
+    FAKE_AIRTABLE_SEED=seed.json uvicorn ejecucion.fake_airtable_server:app --port 8765
+    AIRTABLE_ENDPOINT_URL=http://127.0.0.1:8765 AIRTABLE_API_KEY=x AIRTABLE_BASE_ID=appFAKE \\
+        uvicorn main:app
+
+Formato de seed.json: { "CLIENTES": [ {"DNI": 123, ...}, {"id": "rec...", "fields": {...}} ], ... }
+También se puede usar en proceso: AirtableGateway(..., transport=httpx.ASGITransport(app=app)).
+"""
+
+import itertools
+import json
+import os
+import re
+from datetime import datetime, timezone
+
+from fastapi import Body, FastAPI, HTTPException, Request
+
+app = FastAPI()
+
+# { nombre_tabla: { record_id: {"id", "createdTime", "fields", "_modified"} } }
+DB = {}
+_ids = itertools.count(1)
+
+
+def _now_iso():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+def insert(table, fields, record_id=None):
+    record_id = record_id or f"rec{next(_ids):014d}"
+    now = _now_iso()
+    DB.setdefault(table, {})[record_id] = {
+        "id": record_id,
+        "createdTime": now,
+        "fields": dict(fields),
+        "_modified": now,
+    }
+    return DB[table][record_id]
+
+
+def seed(data):
+    for table, records in data.items():
+        for rec in records:
+            if "fields" in rec:
+                insert(table, rec["fields"], rec.get("id"))
+            else:
+                insert(table, rec)
+
+
+if os.getenv("FAKE_AIRTABLE_SEED"):
+    with open(os.getenv("FAKE_AIRTABLE_SEED"), encoding="utf-8") as fh:
+        seed(json.load(fh))
+
+
+# ==============================================================================
+# MINI EVALUADOR DE FÓRMULAS
+# ==============================================================================
+
+TOKEN_RE = re.compile(
+    r"\s*(?:(?P<num>\d+(?:\.\d+)?)|(?P<str>'[^']*'|\"[^\"]*\")|(?P<field>\{[^}]*\})"
+    r"|(?P<name>[A-Z_]+)|(?P<op>!=|>=|<=|[=<>&(),]))"
+)
+
+
+def _tokenize(formula):
+    pos, tokens = 0, []
+    formula = formula.strip()
+    while pos < len(formula):
+        m = TOKEN_RE.match(formula, pos)
+        if not m or m.end() == pos:
+            raise ValueError(f"Fórmula no soportada: {formula[pos:]}")
+        pos = m.end()
+        kind = m.lastgroup
+        tokens.append((kind, m.group(kind)))
+    return tokens
+
+
+def _as_text(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, list):
+        return ", ".join(_as_text(v) for v in value)
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _compare(op, a, b):
+    if isinstance(a, list):
+        a = _as_text(a)
+    if isinstance(a, (int, float)) and isinstance(b, str) and b:
+        b = float(b)
+    if isinstance(b, (int, float)) and isinstance(a, str) and a:
+        a = float(a)
+    if a is None or a == "":
+        a = "" if isinstance(b, str) else 0
+    if op == "=":
+        return a == b
+    if op == "!=":
+        return a != b
+    if op == ">":
+        return a > b
+    if op == "<":
+        return a < b
+    if op == ">=":
+        return a >= b
+    return a <= b
+
+
+class _Parser:
+    def __init__(self, tokens, record):
+        self.tokens = tokens
+        self.i = 0
+        self.record = record
+
+    def peek(self):
+        return self.tokens[self.i] if self.i < len(self.tokens) else (None, None)
+
+    def take(self, value=None):
+        tok = self.peek()
+        if value is not None and tok[1] != value:
+            raise ValueError(f"Se esperaba {value}, llegó {tok[1]}")
+        self.i += 1
+        return tok
+
+    def expr(self):
+        left = self.concat()
+        kind, val = self.peek()
+        if val in ("=", "!=", ">", "<", ">=", "<="):
+            self.take()
+            return _compare(val, left, self.concat())
+        return left
+
+    def concat(self):
+        value = self.atom()
+        while self.peek()[1] == "&":
+            self.take()
+            value = _as_text(value) + _as_text(self.atom())
+        return value
+
+    def args(self):
+        self.take("(")
+        result = []
+        if self.peek()[1] != ")":
+            result.append(self.expr())
+            while self.peek()[1] == ",":
+                self.take()
+                result.append(self.expr())
+        self.take(")")
+        return result
+
+    def atom(self):
+        kind, val = self.take()
+        if kind == "num":
+            return float(val) if "." in val else int(val)
+        if kind == "str":
+            return val[1:-1]
+        if kind == "field":
+            return self.record["fields"].get(val[1:-1])
+        if val == "(":
+            value = self.expr()
+            self.take(")")
+            return value
+        if kind == "name":
+            args = self.args()
+            if val == "AND":
+                return all(args)
+            if val == "OR":
+                return any(args)
+            if val == "NOT":
+                return not args[0]
+            if val == "TRUE":
+                return True
+            if val == "FALSE":
+                return False
+            if val == "RECORD_ID":
+                return self.record["id"]
+            if val == "LAST_MODIFIED_TIME":
+                return self.record["_modified"]
+            if val == "SEARCH":
+                return _as_text(args[1]).find(_as_text(args[0])) + 1
+            if val == "IS_AFTER":
+                return _as_text(args[0]) > _as_text(args[1])
+        raise ValueError(f"Token no soportado: {val}")
+
+
+def matches(record, formula):
+    if not formula:
+        return True
+    return bool(_Parser(_tokenize(formula), record).expr())
+
+
+# ==============================================================================
+# API
+# ==============================================================================
+
+
+def _public(record, fields=None):
+    data = {k: v for k, v in record["fields"].items() if not fields or k in fields}
+    return {"id": record["id"], "createdTime": record["createdTime"], "fields": data}
+
+
+def _list(table, options):
+    records = list(DB.get(table, {}).values())
+    try:
+        records = [r for r in records if matches(r, options.get("filterByFormula"))]
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail={"error": str(e)})
+
+    for sort in reversed(options.get("sort") or []):
+        records.sort(
+            key=lambda r: _as_text(r["fields"].get(sort["field"])),
+            reverse=sort.get("direction") == "desc",
+        )
+
+    if options.get("maxRecords"):
+        records = records[: int(options["maxRecords"])]
+
+    offset = int(options.get("offset") or 0)
+    page_size = min(int(options.get("pageSize") or 100), 100)
+    page = records[offset : offset + page_size]
+    result = {"records": [_public(r, options.get("fields")) for r in page]}
+    if offset + page_size < len(records):
+        result["offset"] = str(offset + page_size)
+    return result
+
+
+@app.post("/v0/{base_id}/{table}/listRecords")
+async def list_records_post(base_id: str, table: str, body: dict = Body(default={})):
+    return _list(table, body)
+
+
+@app.get("/v0/{base_id}/{table}")
+async def list_records_get(base_id: str, table: str, request: Request):
+    params = request.query_params
+    sort = []
+    for i in itertools.count():
+        field = params.get(f"sort[{i}][field]")
+        if not field:
+            break
+        sort.append({"field": field, "direction": params.get(f"sort[{i}][direction]", "asc")})
+    options = {
+        "filterByFormula": params.get("filterByFormula"),
+        "fields": params.getlist("fields[]"),
+        "maxRecords": params.get("maxRecords"),
+        "pageSize": params.get("pageSize"),
+        "offset": params.get("offset"),
+        "sort": sort,
+    }
+    return _list(table, options)
+
+
+@app.get("/v0/{base_id}/{table}/{record_id}")
+async def get_record(base_id: str, table: str, record_id: str):
+    record = DB.get(table, {}).get(record_id)
+    if not record:
+        raise HTTPException(status_code=404, detail={"error": "NOT_FOUND"})
+    return _public(record)
+
+
+@app.post("/v0/{base_id}/{table}")
+async def create_records(base_id: str, table: str, body: dict = Body(...)):
+    if "records" in body:
+        return {"records": [_public(insert(table, r.get("fields", {}))) for r in body["records"]]}
+    return _public(insert(table, body.get("fields", {})))
+
+
+@app.patch("/v0/{base_id}/{table}/{record_id}")
+async def update_record(base_id: str, table: str, record_id: str, body: dict = Body(...)):
+    record = DB.get(table, {}).get(record_id)
+    if not record:
+        raise HTTPException(status_code=404, detail={"error": "NOT_FOUND"})
+    record["fields"].update(body.get("fields", {}))
+    record["_modified"] = _now_iso()
+    return _public(record)
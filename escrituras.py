@@ -0,0 +1,337 @@
+import asyncio
+import json
+import os
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    from .almacen_local import conectar, ruta
+    from .airtable_repository import MAX_RECORDS_PER_WRITE, AirtableError
+except ImportError:
+    from almacen_local import conectar, ruta
+    from airtable_repository import MAX_RECORDS_PER_WRITE, AirtableError
+
+ESCRITURAS_DB = os.getenv("ESCRITURAS_DB") or ruta("escrituras.db")
+# Un lote sale cuando junta MAX_RECORDS_PER_WRITE registros o cuando el más viejo espera FLUSH_MS
+FLUSH_MS = float(os.getenv("ESCRITURAS_FLUSH_MS", "500"))
+MAX_INTENTOS = int(os.getenv("ESCRITURAS_MAX_INTENTOS", "8"))
+BACKOFF_BASE = float(os.getenv("ESCRITURAS_BACKOFF_BASE", "2"))
+BACKOFF_MAX = float(os.getenv("ESCRITURAS_BACKOFF_MAX", "300"))
+# Un lote tomado sin confirmar en este tiempo vuelve a estar disponible (proceso caído)
+LEASE = float(os.getenv("ESCRITURAS_LEASE", "60"))
+POLL_INTERVAL = float(os.getenv("ESCRITURAS_POLL_INTERVAL", "2"))
+# Días que se conservan las escrituras enviadas/fallidas (para resolver su id local)
+RETENCION_DIAS = float(os.getenv("ESCRITURAS_RETENCION_DIAS", "7"))
+
+PENDIENTE = "pendiente"
+ENVIADO = "enviado"
+ERROR = "error"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS escrituras (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tabla TEXT NOT NULL,
+    fields TEXT NOT NULL,
+    estado TEXT NOT NULL,
+    intentos INTEGER NOT NULL DEFAULT 0,
+    individual INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    creado REAL NOT NULL,
+    actualizado REAL NOT NULL,
+    disponible_desde REAL NOT NULL,
+    lease_hasta REAL,
+    record_id TEXT
+);
+CREATE INDEX IF NOT EXISTS escrituras_estado ON escrituras (estado, tabla, disponible_desde);
+"""
+
+
+class EscriturasDiferidas:
+    """
+    Buffer write-behind para altas "fire-and-forget" en Airtable (calificaciones,
+    turnos y escalaciones del chat).
+
+    encolar() guarda el registro en un journal SQLite y vuelve enseguida; una
+    tarea de fondo lo envía agrupado por tabla, hasta 10 registros por create,
+    cuando el lote se llena o su registro más viejo cumple FLUSH_MS. Los errores
+    transitorios se reintentan con backoff; si Airtable rechaza un lote (4xx) sus
+    registros se reenvían de a uno para aislar el inválido, que queda en 'error'.
+
+    El journal sobrevive a reinicios y puede compartirse entre procesos uvicorn
+    (toma atómica con BEGIN IMMEDIATE + lease). Entrega al-menos-una-vez: si el
+    proceso muere justo después del create, ese lote puede reenviarse.
+
+    Las filas enviadas quedan en 'enviado' con el record_id de Airtable durante
+    RETENCION_DIAS: estado(id) resuelve el id local que devolvió encolar().
+    """
+
+    def __init__(self, repo_provider: Callable[[str], Any], db_path: str = ESCRITURAS_DB):
+        # repo_provider(table_key) -> AirtableRepository (o None si no hay config)
+        self.repo_provider = repo_provider
+        self.db_path = db_path
+        self._callbacks: Dict[str, List[Callable[[Dict[str, Any]], Any]]] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._nuevo: Optional[asyncio.Event] = None
+
+        self.lotes = 0
+        self.enviados = 0
+        self.reintentos = 0
+
+        conn = conectar(self.db_path)
+        try:
+            conn.executescript(_SCHEMA)
+            # Journals creados antes de guardar el record_id
+            columnas = {row["name"] for row in conn.execute("PRAGMA table_info(escrituras)")}
+            if "record_id" not in columnas:
+                conn.execute("ALTER TABLE escrituras ADD COLUMN record_id TEXT")
+        finally:
+            conn.close()
+
+    # ------------------------------------------------------------------
+    # SQLite (cada operación abre su conexión y corre en un thread)
+    # ------------------------------------------------------------------
+
+    def _ejecutar_sync(self, sql: str, params=()):
+        conn = conectar(self.db_path)
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    async def _ejecutar(self, sql: str, params=()):
+        return await asyncio.to_thread(self._ejecutar_sync, sql, params)
+
+    def _tomar_lote_sync(self) -> Tuple[Optional[str], List[Any], float]:
+        """
+        Toma el próximo lote listo para enviar: (tabla, filas, 0).
+        Si ninguno está listo retorna (None, [], segundos hasta el próximo).
+        """
+        conn = conectar(self.db_path)
+        try:
+            now = time.time()
+            conn.execute("BEGIN IMMEDIATE")
+            tablas = conn.execute(
+                """SELECT tabla, COUNT(*) AS n, MIN(creado) AS mas_viejo, MAX(individual) AS individual
+                   FROM escrituras
+                   WHERE estado=? AND disponible_desde<=? AND (lease_hasta IS NULL OR lease_hasta<?)
+                   GROUP BY tabla""",
+                (PENDIENTE, now, now),
+            ).fetchall()
+
+            espera = POLL_INTERVAL
+            elegida = None
+            for t in tablas:
+                vence = t["mas_viejo"] + FLUSH_MS / 1000
+                if t["n"] >= MAX_RECORDS_PER_WRITE or t["individual"] or vence <= now:
+                    elegida = t
+                    break
+                espera = min(espera, vence - now)
+
+            if elegida is None:
+                conn.execute("COMMIT")
+                return None, [], max(espera, 0.01)
+
+            # Registros marcados 'individual' (de un lote rechazado) salen de a uno
+            limite = 1 if elegida["individual"] else MAX_RECORDS_PER_WRITE
+            rows = conn.execute(
+                """SELECT * FROM escrituras
+                   WHERE tabla=? AND estado=? AND disponible_desde<=? AND (lease_hasta IS NULL OR lease_hasta<?)
+                   ORDER BY individual DESC, id LIMIT ?""",
+                (elegida["tabla"], PENDIENTE, now, now, limite),
+            ).fetchall()
+            ids = [row["id"] for row in rows]
+            conn.execute(
+                f"""UPDATE escrituras SET intentos=intentos+1, actualizado=?, lease_hasta=?
+                    WHERE id IN ({",".join("?" * len(ids))})""",
+                (now, now + LEASE, *ids),
+            )
+            conn.execute("COMMIT")
+            return elegida["tabla"], rows, 0
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+
+    def al_crear(self, tabla: str, callback: Callable[[Dict[str, Any]], Any]):
+        """callback(registro_creado) se llama cuando un alta de `tabla` llega a Airtable."""
+        self._callbacks.setdefault(tabla, []).append(callback)
+
+    def _insertar_sync(self, tabla: str, fields: str) -> int:
+        conn = conectar(self.db_path)
+        try:
+            now = time.time()
+            cursor = conn.execute(
+                """INSERT INTO escrituras (tabla, fields, estado, creado, actualizado, disponible_desde)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (tabla, fields, PENDIENTE, now, now, now),
+            )
+            return cursor.lastrowid
+        finally:
+            conn.close()
+
+    async def encolar(self, tabla: str, fields: Dict[str, Any]) -> int:
+        """Guarda el alta en el journal y retorna su id local (el envío es diferido)."""
+        escritura_id = await asyncio.to_thread(self._insertar_sync, tabla, json.dumps(fields))
+        if self._nuevo is not None:
+            self._nuevo.set()
+        return escritura_id
+
+    async def estado(self, escritura_id: int) -> Optional[Dict[str, Any]]:
+        """Estado de un alta encolada: pendiente | enviado (con recordId) | error."""
+        rows = await self._ejecutar("SELECT * FROM escrituras WHERE id=?", (escritura_id,))
+        if not rows:
+            return None
+        row = rows[0]
+        return {
+            "escrituraId": row["id"],
+            "tabla": row["tabla"],
+            "estado": row["estado"],
+            "recordId": row["record_id"],
+            "intentos": row["intentos"],
+            "creado": row["creado"],
+            "actualizado": row["actualizado"],
+            "error": row["error"] if row["estado"] != ENVIADO else None,
+        }
+
+    async def metricas(self) -> Dict[str, Any]:
+        rows = await self._ejecutar("SELECT estado, COUNT(*) AS n FROM escrituras GROUP BY estado")
+        metricas: Dict[str, Any] = {row["estado"]: row["n"] for row in rows}
+        metricas.update(lotes=self.lotes, enviados=self.enviados, reintentos=self.reintentos)
+        return metricas
+
+    # ------------------------------------------------------------------
+    # Envío
+    # ------------------------------------------------------------------
+
+    async def _reintentar(self, rows: List[Any], error: str):
+        now = time.time()
+        for row in rows:
+            if row["intentos"] + 1 >= MAX_INTENTOS:
+                print(f"❌ Escritura {row['id']} ({row['tabla']}): sin más reintentos: {error}")
+                await self._ejecutar(
+                    "UPDATE escrituras SET estado=?, error=?, actualizado=?, lease_hasta=NULL WHERE id=?",
+                    (ERROR, error, now, row["id"]),
+                )
+                continue
+            demora = random.uniform(0.5, 1) * min(BACKOFF_MAX, BACKOFF_BASE * (2 ** row["intentos"]))
+            self.reintentos += 1
+            await self._ejecutar(
+                "UPDATE escrituras SET error=?, actualizado=?, disponible_desde=?, lease_hasta=NULL WHERE id=?",
+                (error, now, now + demora, row["id"]),
+            )
+
+    def _marcar_enviados_sync(self, pares: List[Tuple[str, int]]):
+        conn = conectar(self.db_path)
+        try:
+            now = time.time()
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "UPDATE escrituras SET estado=?, record_id=?, actualizado=?, lease_hasta=NULL WHERE id=?",
+                [(ENVIADO, record_id, now, escritura_id) for record_id, escritura_id in pares],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    async def _enviar(self, tabla: str, rows: List[Any]):
+        ids = [row["id"] for row in rows]
+        marcas = ",".join("?" * len(ids))
+        repo = self.repo_provider(tabla)
+        if not repo:
+            await self._reintentar(rows, "Airtable config missing")
+            return
+
+        try:
+            creados = await repo.create_many([json.loads(row["fields"]) for row in rows])
+        except AirtableError as e:
+            if 400 <= e.status_code < 500 and e.status_code != 429:
+                if len(rows) > 1:
+                    # Un registro inválido rechaza el lote entero: reenviar de a uno
+                    print(f"⚠️ Lote de {len(rows)} en {tabla} rechazado ({e}); se reenvía de a uno")
+                    await self._ejecutar(
+                        f"""UPDATE escrituras SET individual=1, intentos=intentos-1, lease_hasta=NULL
+                            WHERE id IN ({marcas})""",
+                        ids,
+                    )
+                else:
+                    print(f"❌ Escritura {ids[0]} ({tabla}) rechazada por Airtable: {e}")
+                    await self._ejecutar(
+                        "UPDATE escrituras SET estado=?, error=?, actualizado=?, lease_hasta=NULL WHERE id=?",
+                        (ERROR, str(e), time.time(), ids[0]),
+                    )
+                return
+            await self._reintentar(rows, str(e))
+            return
+        except Exception as e:
+            await self._reintentar(rows, str(e) or type(e).__name__)
+            return
+
+        # create_many retorna los creados en el mismo orden que se enviaron
+        await asyncio.to_thread(
+            self._marcar_enviados_sync, [(record.get("id"), i) for record, i in zip(creados, ids)]
+        )
+        self.lotes += 1
+        self.enviados += len(creados)
+        for record in creados:
+            for callback in self._callbacks.get(tabla, []):
+                try:
+                    callback(record)
+                except Exception as e:
+                    print(f"⚠️ Error en callback de alta en {tabla}: {e}")
+
+    async def _flusher(self):
+        while True:
+            try:
+                self._nuevo.clear()
+                tabla, rows, espera = await asyncio.to_thread(self._tomar_lote_sync)
+                if tabla is None:
+                    try:
+                        await asyncio.wait_for(self._nuevo.wait(), espera)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._enviar(tabla, rows)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Error en el envío diferido a Airtable: {e}")
+                await asyncio.sleep(POLL_INTERVAL)
+
+    async def _purgar(self):
+        while True:
+            try:
+                await self._ejecutar(
+                    "DELETE FROM escrituras WHERE estado IN (?, ?) AND actualizado<?",
+                    (ENVIADO, ERROR, time.time() - RETENCION_DIAS * 86400),
+                )
+            except Exception as e:
+                print(f"⚠️ Error purgando escrituras diferidas: {e}")
+            await asyncio.sleep(3600)
+
+    def start(self):
+        if self._tasks:
+            return
+        self._nuevo = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._flusher()), loop.create_task(self._purgar())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
@@ -0,0 +1,203 @@
+import asyncio
+import hashlib
+import json
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    from .cache import RefreshingCache
+    from .http_cache import render_json, strong_etag
+    from .proyecciones import campos, proyeccion
+except ImportError:
+    from cache import RefreshingCache
+    from http_cache import render_json, strong_etag
+    from proyecciones import campos, proyeccion
+
+# Cada cuánto se vuelve a leer CONFIG_FORMULARIOS / CONFIG_CAMPOS (segundos, en fondo)
+CONFIG_TTL = float(os.getenv("CONFIG_FORMULARIOS_TTL", "300"))
+# max-age que se le da al navegador antes de revalidar con If-None-Match
+CONFIG_MAX_AGE = int(os.getenv("CONFIG_FORMULARIOS_MAX_AGE", "60"))
+# Un CODIGO desconocido fuerza una recarga como mucho cada tantos segundos
+CONFIG_MIN_RELOAD = float(os.getenv("CONFIG_FORMULARIOS_MIN_RELOAD", "30"))
+
+
+def _firma(forms_records: List[Dict], campos_records: List[Dict]) -> str:
+    """Hash del contenido crudo de ambas tablas: si no cambia, no se reconstruye nada."""
+    crudo = json.dumps(
+        [[(r["id"], r.get("fields", {})) for r in forms_records],
+         [(r["id"], r.get("fields", {})) for r in campos_records]],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(crudo.encode("utf-8")).hexdigest()
+
+
+def _campo_front(c: Dict[str, Any]) -> Dict[str, Any]:
+    """Campo de CONFIG_CAMPOS → estructura del frontend (sin COLUMNA AIRTABLE, que es interna)."""
+    campo = {
+        "id": c.get("ID CAMPO"),
+        "label": c.get("ETIQUETA"),
+        "type": c.get("TIPO", "text"),
+        "required": c.get("OBLIGATORIO", False),
+        # Opcionales
+        "placeholder": c.get("PLACEHOLDER", ""),
+        "options": c.get("OPCIONES", "").split(",") if c.get("OPCIONES") else [],
+    }
+    return {k: v for k, v in campo.items() if v is not None}
+
+
+proyeccion(
+    "config_formularios",
+    "CONFIG_FORMULARIOS",
+    ["CODIGO", "TABLA RELACIONADA", "VISIBILIDAD", "TITULO", "ICONO", "COLOR"],
+)
+proyeccion(
+    "config_campos",
+    "CONFIG_CAMPOS",
+    [
+        "ID CAMPO",
+        "ETIQUETA",
+        "TIPO",
+        "OBLIGATORIO",
+        "PLACEHOLDER",
+        "OPCIONES",
+        "FORMULARIO",
+        "Formulario",
+        "ORDEN",
+        "COLUMNA AIRTABLE",
+    ],
+)
+
+# Valores de TIPO en CONFIG_CAMPOS que corresponden a adjuntos
+TIPOS_ARCHIVO = {"file", "files", "image", "images", "foto", "fotos"}
+
+
+class FormularioCompilado:
+    """Definición de UN formulario lista para create_siniestro."""
+
+    __slots__ = ("codigo", "form_id", "tabla_destino", "field_map", "file_columns")
+
+    def __init__(self, codigo: str, form_id: str, tabla_destino: Optional[str]):
+        self.codigo = codigo
+        self.form_id = form_id
+        self.tabla_destino = tabla_destino
+        # id_campo_frontend → COLUMNA AIRTABLE
+        self.field_map: Dict[str, str] = {}
+        # id_campo_frontend → COLUMNA AIRTABLE, solo campos de tipo archivo
+        self.file_columns: Dict[str, str] = {}
+
+
+class SnapshotConfig:
+    """
+    Configuración de formularios ya compilada (inmutable una vez construida).
+
+    - campos_por_form: rec_id de CONFIG_FORMULARIOS → campos de CONFIG_CAMPOS
+      vinculados, ordenados por ORDEN (índice armado en una sola pasada).
+    - formularios: CODIGO → FormularioCompilado (tabla destino y mapeo de columnas),
+      incluye formularios no visibles.
+    - response / body / etag: respuesta de /api/config-formularios lista para servir.
+    """
+
+    def __init__(self, forms_records: List[Dict], campos_records: List[Dict], firma: str):
+        self.firma = firma
+        self.forms_records = forms_records
+
+        campos_por_form: Dict[str, List[Dict[str, Any]]] = {}
+        for c_rec in campos_records:
+            c = c_rec["fields"]
+            # El campo "Formulario" en CONFIG_CAMPOS es un array de IDs [RecID]
+            linked_forms = c.get("FORMULARIO") or c.get("Formulario", [])
+            for form_id in {str(fid) for fid in linked_forms}:
+                campos_por_form.setdefault(form_id, []).append(c)
+        for lista in campos_por_form.values():
+            lista.sort(key=lambda c: c.get("ORDEN", 999))
+        self.campos_por_form = campos_por_form
+
+        formularios: Dict[str, FormularioCompilado] = {}
+        response = {}
+        for f_rec in forms_records:
+            f = f_rec["fields"]
+            codigo = f.get("CODIGO")
+            if not codigo:
+                continue
+
+            if codigo not in formularios:
+                form = FormularioCompilado(codigo, f_rec["id"], f.get("TABLA RELACIONADA"))
+                for c in campos_por_form.get(f_rec["id"], []):
+                    id_campo = c.get("ID CAMPO")
+                    columna = c.get("COLUMNA AIRTABLE")
+                    if id_campo and columna:
+                        form.field_map[id_campo] = columna
+                        if str(c.get("TIPO", "")).lower() in TIPOS_ARCHIVO:
+                            form.file_columns[id_campo] = columna
+                formularios[codigo] = form
+
+            if not f.get("VISIBILIDAD", False):
+                continue
+            response[codigo] = {
+                "titulo": f.get("TITULO", "Sin Título"),
+                "icono": f.get("ICONO", "fa-file"),
+                "color": f.get("COLOR", "#333"),
+                "campos": [_campo_front(c) for c in campos_por_form.get(f_rec["id"], [])],
+            }
+        self.formularios = formularios
+        self.response = response
+        self.body = render_json(response)
+        self.etag = strong_etag(self.body)
+
+
+class ConfigFormularios:
+    """
+    Cache de CONFIG_FORMULARIOS + CONFIG_CAMPOS.
+
+    Las tablas se releen en segundo plano cada CONFIG_TTL segundos (los requests
+    siguen recibiendo el snapshot anterior mientras tanto) y el snapshot solo se
+    reconstruye si el contenido cambió: mientras tanto el ETag se mantiene y los
+    navegadores revalidan con 304.
+    """
+
+    def __init__(self, repo_provider: Callable[[str], Any]):
+        # repo_provider(table_key) -> AirtableRepository (o None si no hay config)
+        self.repo_provider = repo_provider
+        self.cache = RefreshingCache("config_formularios", self._load, ttl=CONFIG_TTL)
+        self.rebuilds = 0
+        # Último snapshot construido (sobrevive a invalidate para comparar la firma)
+        self._actual: Optional[SnapshotConfig] = None
+
+    async def _load(self, _key=None) -> SnapshotConfig:
+        t_forms = self.repo_provider("CONFIG_FORMULARIOS")
+        t_campos = self.repo_provider("CONFIG_CAMPOS")
+        if not t_forms or not t_campos:
+            raise RuntimeError("Airtable config missing")
+
+        forms_records, campos_records = await asyncio.gather(
+            t_forms.list(fields=campos("config_formularios")),
+            t_campos.list(fields=campos("config_campos")),
+        )
+        firma = _firma(forms_records, campos_records)
+
+        if self._actual is not None and self._actual.firma == firma:
+            return self._actual
+
+        snapshot = self._actual = SnapshotConfig(forms_records, campos_records, firma)
+        self.rebuilds += 1
+        print(f"🧩 Configuración de formularios compilada: {len(snapshot.response)} formularios visibles")
+        return snapshot
+
+    async def snapshot(self) -> SnapshotConfig:
+        return await self.cache.get()
+
+    async def formulario(self, codigo: str) -> Optional[FormularioCompilado]:
+        """
+        Formulario compilado por CODIGO. Si no está, puede ser uno recién creado:
+        se fuerza UNA recarga antes de darlo por inexistente.
+        """
+        form = (await self.snapshot()).formularios.get(codigo)
+        entry = self.cache.entry()
+        if form is None and entry is not None and entry.age >= CONFIG_MIN_RELOAD:
+            self.invalidate()
+            form = (await self.snapshot()).formularios.get(codigo)
+        return form
+
+    def invalidate(self):
+        self.cache.invalidate()
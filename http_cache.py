@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from fastapi import Request, Response
+
+try:
+    from .cache import RefreshingCache
+except ImportError:
+    from cache import RefreshingCache
+
+# Contenido de CMS (FAQ, Quiénes somos, Sucursales): casi estático
+CMS_CACHE_TTL = float(os.getenv("CMS_CACHE_TTL", "300"))
+CMS_MAX_AGE = int(os.getenv("CMS_MAX_AGE", "60"))
+
+
+def render_json(payload: Any) -> bytes:
+    """Mismo render que JSONResponse de Starlette (para poder hashear el body exacto)."""
+    return json.dumps(
+        payload, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def strong_etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match contra el ETag actual (comparación débil, como pide RFC 9110 para GET)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    actual = etag[2:] if etag.startswith("W/") else etag
+    for candidato in header.split(","):
+        candidato = candidato.strip()
+        if candidato.startswith("W/"):
+            candidato = candidato[2:]
+        if candidato == actual:
+            return True
+    return False
+
+
+def not_modified_since(request: Request, last_modified: Optional[str]) -> bool:
+    """If-Modified-Since (solo se consulta si el cliente no mandó If-None-Match)."""
+    header = request.headers.get("if-modified-since")
+    if not header or not last_modified or request.headers.get("if-none-match"):
+        return False
+    try:
+        return parsedate_to_datetime(header) >= parsedate_to_datetime(last_modified)
+    except (TypeError, ValueError):
+        return False
+
+
+def cached_json_response(
+    request: Request,
+    body: bytes,
+    etag: str,
+    max_age: int,
+    last_modified: Optional[str] = None,
+) -> Response:
+    """
+    Respuesta JSON ya renderizada con ETag/Cache-Control.
+    Si el navegador revalida con el mismo ETag se contesta 304 sin body.
+    """
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={max_age}, must-revalidate",
+    }
+    if last_modified:
+        headers["Last-Modified"] = last_modified
+    if etag_matches(request, etag) or not_modified_since(request, last_modified):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+class RespuestaCacheada:
+    """Payload ya renderizado + validadores HTTP."""
+
+    __slots__ = ("body", "etag", "last_modified")
+
+    def __init__(self, body: bytes, etag: str, last_modified: str):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+def cached_endpoint(
+    name: str,
+    ttl: float = CMS_CACHE_TTL,
+    max_age: int = CMS_MAX_AGE,
+    stale_ttl: Optional[float] = None,
+    key: Optional[Callable[[Request], Hashable]] = None,
+):
+    """
+    Decorador para endpoints GET de solo lectura cuyo resultado es un payload JSON.
+
+    La función decorada arma el payload (recibe la clave si se pasa `key`) y se
+    ejecuta solo cuando la RefreshingCache lo pide: TTL, stale-while-revalidate
+    y un lock por clave (un único refresco a la vez). El endpoint resultante
+    responde con ETag/Last-Modified y 304 si el navegador ya tiene la versión.
+    Last-Modified solo avanza cuando el contenido realmente cambia.
+
+        @app.get("/api/faqs")
+        @cached_endpoint("faqs")
+        async def get_faqs(): ...
+    """
+
+    def decorator(func: Callable[..., Awaitable[Any]]):
+        async def loader(clave: Hashable) -> RespuestaCacheada:
+            payload = await (func(clave) if key is not None else func())
+            body = render_json(payload)
+            etag = strong_etag(body)
+            anterior = cache.entry(clave)
+            if anterior is not None and anterior.value.etag == etag:
+                return anterior.value
+            return RespuestaCacheada(body, etag, formatdate(time.time(), usegmt=True))
+
+        cache = RefreshingCache(name, loader, ttl=ttl, stale_ttl=stale_ttl)
+
+        # Sin functools.wraps: FastAPI leería la firma de func y perdería `request`
+        async def endpoint(request: Request):
+            clave = key(request) if key is not None else None
+            respuesta = await cache.get(clave)
+            return cached_json_response(
+                request, respuesta.body, respuesta.etag, max_age, respuesta.last_modified
+            )
+
+        endpoint.__name__ = func.__name__
+        endpoint.__doc__ = func.__doc__
+        endpoint.cache = cache
+        return endpoint
+
+    return decorator
@@ -0,0 +1,143 @@
+import asyncio
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+    ImageOps = None
+
+# Etapa opcional: se desactiva con IMAGENES_OPTIMIZAR=0 (o si Pillow no está instalado)
+OPTIMIZAR = os.getenv("IMAGENES_OPTIMIZAR", "1") == "1"
+MAX_DIM = int(os.getenv("IMAGENES_MAX_DIM", "1920"))
+CALIDAD = int(os.getenv("IMAGENES_CALIDAD", "82"))
+# Por debajo de este tamaño no vale la pena recomprimir
+MIN_BYTES = int(os.getenv("IMAGENES_MIN_BYTES", "300000"))
+WORKERS = int(os.getenv("IMAGENES_WORKERS", "2"))
+
+
+def _optimizar_bytes(data: bytes, max_dim: int, calidad: int) -> Optional[bytes]:
+    """
+    Corre en un proceso del pool: decodifica, aplica la rotación EXIF, reduce al
+    lado máximo y recomprime a JPEG. None si no se pudo o si no achica el archivo.
+    """
+    try:
+        img = Image.open(io.BytesIO(data))
+        # JPEG: decodificar directo a una escala reducida (mucho más rápido)
+        img.draft("RGB", (max_dim, max_dim))
+        img = ImageOps.exif_transpose(img)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        img.thumbnail((max_dim, max_dim), Image.LANCZOS)
+
+        out = io.BytesIO()
+        img.save(out, format="JPEG", quality=calidad, optimize=True, progressive=True)
+    except Exception:
+        return None
+
+    result = out.getvalue()
+    return result if len(result) < len(data) else None
+
+
+def _optimizar_archivo(path: str, max_dim: int, calidad: int) -> Optional[bytes]:
+    """Como _optimizar_bytes, pero la lectura del archivo también ocurre en el proceso del pool."""
+    with open(path, "rb") as f:
+        data = f.read()
+    return _optimizar_bytes(data, max_dim, calidad)
+
+
+def _leer(file_obj) -> bytes:
+    file_obj.seek(0)
+    data = file_obj.read()
+    file_obj.seek(0)
+    return data
+
+
+class OptimizadorImagenes:
+    """
+    Preprocesa fotos antes de subirlas (celulares: 4-12 MB → unos cientos de KB).
+
+    El trabajo de CPU corre en un ProcessPoolExecutor para no bloquear el event
+    loop. Ante cualquier problema se sube el archivo original.
+    """
+
+    def __init__(self, max_dim: int = MAX_DIM, calidad: int = CALIDAD, workers: int = WORKERS):
+        self.max_dim = max_dim
+        self.calidad = calidad
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+        self.procesadas = 0
+        self.bytes_ahorrados = 0
+
+    @property
+    def activo(self) -> bool:
+        return OPTIMIZAR and Image is not None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    async def optimizar(self, up_file) -> Optional[Dict[str, Any]]:
+        """
+        Retorna {"file", "bytes_original", "bytes", "ms"} con el JPEG optimizado
+        (file es un BytesIO listo para subir), o None para subir el original.
+        """
+        content_type = (getattr(up_file, "content_type", "") or "").lower()
+        if not self.activo or (content_type and not content_type.startswith("image/")):
+            return None
+
+        # El tamaño sale de seek/tell: un archivo chico se descarta sin leerlo
+        file_obj = up_file.file
+        file_obj.seek(0, os.SEEK_END)
+        size = file_obj.tell()
+        file_obj.seek(0)
+        if size < MIN_BYTES:
+            return None
+
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            # Adjunto en disco (ArchivoEnCola): el proceso del pool lo lee por su ruta.
+            # Si no, la lectura va a un thread; nunca se lee en el event loop.
+            path = getattr(up_file, "path", None)
+            if path:
+                result = await loop.run_in_executor(
+                    self._executor(), _optimizar_archivo, path, self.max_dim, self.calidad
+                )
+            else:
+                data = await loop.run_in_executor(None, _leer, file_obj)
+                result = await loop.run_in_executor(
+                    self._executor(), _optimizar_bytes, data, self.max_dim, self.calidad
+                )
+        except Exception as e:
+            print(f"⚠️ No se pudo optimizar {getattr(up_file, 'filename', '')}: {e}")
+            return None
+        if result is None:
+            return None
+
+        self.procesadas += 1
+        self.bytes_ahorrados += size - len(result)
+        return {
+            "file": io.BytesIO(result),
+            "bytes_original": size,
+            "bytes": len(result),
+            "ms": round(1000 * (time.perf_counter() - started), 1),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "activo": self.activo,
+            "procesadas": self.procesadas,
+            "bytes_ahorrados": self.bytes_ahorrados,
+        }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -743,6 +743,35 @@ const WEBHOOK_VALIDACION_SINIESTRO = `${BACKEND_URL}/api/validate-siniestro`;
 // const BACKEND_CREATE_SINIESTRO = "http://localhost:8000/api/create-siniestro"; // DEV
 const BACKEND_CREATE_SINIESTRO = `${BACKEND_URL}/api/create-siniestro`; // PROD
 
+// Consulta el estado de una denuncia encolada hasta que se complete (o se agote la espera)
+async function esperarDenuncia(encolada, signal) {
+    const url = `${BACKEND_URL}${encolada.estado_url}`;
+    const limite = Date.now() + 120000; // 2 minutos
+    while (Date.now() < limite) {
+        await new Promise(resolve => setTimeout(resolve, 1500));
+        let estado = null;
+        try {
+            const resp = await fetch(url, { signal });
+            if (resp.ok) estado = await resp.json();
+        } catch (err) {
+            if (err.name === 'AbortError') throw err;
+            console.warn('⚠️ Error consultando estado de la denuncia, reintentando...', err);
+        }
+        if (estado && estado.estado === 'completado' && estado.resultado) return estado.resultado;
+        if (estado && estado.estado === 'error') {
+            throw new Error(estado.error || 'No se pudo registrar la denuncia');
+        }
+    }
+    // Sigue en proceso: la denuncia está guardada, se informa el ticket como comprobante
+    return {
+        status: 'success',
+        id: encolada.ticket,
+        message: 'Denuncia recibida. Se está registrando.',
+        archivos_subidos: 0,
+        archivos_fallidos: []
+    };
+}
+
 // Configuración de Formularios (Cargada dinámicamente)
 let FORM_CONFIG = {};
 
@@ -1177,22 +1206,36 @@ async function handleSiniestroSubmit(e) {
     const timeoutId = setTimeout(() => controller.abort(), 300000); // 300 segundos (5 minutos)
 
     try {
+        // Misma clave en los reintentos de ESTE formulario: el backend no duplica la denuncia
+        if (!form.dataset.idempotencyKey) {
+            form.dataset.idempotencyKey = (window.crypto && crypto.randomUUID)
+                ? crypto.randomUUID()
+                : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+        }
         const response = await fetch(BACKEND_CREATE_SINIESTRO, {
             method: 'POST',
             body: payload,
+            headers: { 'Idempotency-Key': form.dataset.idempotencyKey },
             signal: controller.signal
         });
         clearTimeout(timeoutId);
 
         console.log("📬 Respuesta del servidor:", response.status, response.ok);
-        const data = await response.json();
+        let data = await response.json();
         console.log("📬 Data recibida:", data);
 
         if (!response.ok) {
             throw new Error(data.detail || `Error del servidor (${response.status})`);
         }
 
+        // La denuncia quedó encolada: consultar el ticket hasta que se registre
+        if (data.status === 'queued' && data.estado_url) {
+            btn.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Registrando...';
+            data = await esperarDenuncia(data, controller.signal);
+        }
+
         console.log("✅ Siniestro creado:", data);
+        delete form.dataset.idempotencyKey;
 
         // Cerrar el modal del formulario primero
         const modalSiniestro = document.getElementById('modal-siniestro');
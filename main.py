@@ -1,6 +1,6 @@
+import asyncio
 import os
-import random
-from datetime import datetime
+import re
 from typing import List, Optional
 
 from fastapi import FastAPI, HTTPException, Body, File, UploadFile, Form, Request
@@ -8,13 +8,72 @@ import json
 
 try:
     from .drive_service import upload_file_to_drive
+    from .airtable_gateway import AirtableGateway
+    from .polizas import polizas_de_cliente, resolver_poliza_por_patente
+    from .clientes_index import ClientIndex, normalizar_dni
+    from .cache import cache_stats
+    from .formularios import ConfigFormularios, CONFIG_MAX_AGE
+    from .adjuntos import ImgbbUploader
+    from .imagenes import OptimizadorImagenes
+    from .almacen_local import verificar_persistencia
+    from .cola_siniestros import MAX_INTENTOS, ColaSiniestros, ErrorDefinitivo, huella_denuncia
+    from .testimonios import TestimoniosCache
+    from .calificaciones import AgregadoCalificaciones
+    from .escrituras import EscriturasDiferidas
+    from .proyecciones import campos, campos_tabla, proyectar, vista
+    from .carriles import Carril, CHAT_ESPERA_MAX, CHAT_MAX_COLA, CHAT_MAX_CONCURRENCIA
+    from .airtable_scheduler import AGENT
+    from .airtable_repository import AirtableError
+    from .http_cache import cached_endpoint, cached_json_response
+    from .referencias import ReferenceNames
+    from .portal_cache import SnapshotsPortal
+    from .portal import (
+        CursorInvalido,
+        DENUNCIAS,
+        PortalCliente,
+        TABLAS_PORTAL,
+        VISTA_COMPLETA,
+        VISTA_RESUMEN,
+        VISTAS,
+        perfil_portal,
+        relaciones_cliente,
+    )
 except ImportError:
     from drive_service import upload_file_to_drive
+    from airtable_gateway import AirtableGateway
+    from polizas import polizas_de_cliente, resolver_poliza_por_patente
+    from clientes_index import ClientIndex, normalizar_dni
+    from cache import cache_stats
+    from formularios import ConfigFormularios, CONFIG_MAX_AGE
+    from adjuntos import ImgbbUploader
+    from imagenes import OptimizadorImagenes
+    from almacen_local import verificar_persistencia
+    from cola_siniestros import MAX_INTENTOS, ColaSiniestros, ErrorDefinitivo, huella_denuncia
+    from testimonios import TestimoniosCache
+    from calificaciones import AgregadoCalificaciones
+    from escrituras import EscriturasDiferidas
+    from proyecciones import campos, campos_tabla, proyectar, vista
+    from carriles import Carril, CHAT_ESPERA_MAX, CHAT_MAX_COLA, CHAT_MAX_CONCURRENCIA
+    from airtable_scheduler import AGENT
+    from airtable_repository import AirtableError
+    from http_cache import cached_endpoint, cached_json_response
+    from referencias import ReferenceNames
+    from portal_cache import SnapshotsPortal
+    from portal import (
+        CursorInvalido,
+        DENUNCIAS,
+        PortalCliente,
+        TABLAS_PORTAL,
+        VISTA_COMPLETA,
+        VISTA_RESUMEN,
+        VISTAS,
+        perfil_portal,
+        relaciones_cliente,
+    )
 from fastapi.middleware.cors import CORSMiddleware
-from pyairtable import Table, Api
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
-import httpx
 
 
 load_dotenv()
@@ -135,12 +194,80 @@ TABLE_MAPPING = {
     ),
 }
 
+# Gateway único por worker: pool keep-alive compartido y handles de tabla cacheados
+airtable = AirtableGateway(API_KEY, BASE_ID, TABLE_MAPPING)
+
 
 def get_table(table_name_key):
-    if not API_KEY or not BASE_ID:
-        return None
-    table_name = TABLE_MAPPING.get(table_name_key, table_name_key)
-    return Table(API_KEY, BASE_ID, table_name)
+    return airtable.table(table_name_key)
+
+
+def get_repo(table_name_key):
+    """Repositorio async de la tabla: usar en endpoints `async def`."""
+    return airtable.repo(table_name_key)
+
+
+# Índice DNI → CLIENTES en memoria (refresco incremental en segundo plano);
+# guarda solo los campos que declaran las proyecciones de CLIENTES
+clientes = ClientIndex(
+    lambda: get_repo("CLIENTES"),
+    fields=campos_tabla("CLIENTES"),
+    polizas_provider=lambda: get_repo("POLIZAS"),
+)
+# Mapas rec_id → nombre de EMPLEADOS/OFICINAS/COMPANIA/PRODUCTOS (TTL + refresco en fondo)
+referencias = ReferenceNames(get_repo)
+# CONFIG_FORMULARIOS + CONFIG_CAMPOS compilados (se reconstruyen solo si cambian)
+config_formularios = ConfigFormularios(get_repo)
+# Pools de testimonios publicables (se refrescan en fondo; cada request solo muestrea)
+testimonios = TestimoniosCache(get_repo)
+# Secciones del portal de autogestión (registros vinculados + nombres resueltos)
+portal = PortalCliente(get_repo, referencias)
+# Snapshot por DNI de las secciones del portal (LRU; se invalida por modificación en Airtable)
+snapshots_portal = SnapshotsPortal(portal, get_repo)
+# Promedio/histograma de calificaciones (se actualiza al guardar y se reconcilia en fondo)
+rating = AgregadoCalificaciones(get_repo)
+# Altas fire-and-forget (calificaciones, chat): journal local + creates en lotes de 10
+escrituras = EscriturasDiferidas(get_repo)
+escrituras.al_crear(
+    "CALIFICACIONES", lambda record: rating.registrar(record["id"], record["fields"].get("ESTRELLAS"))
+)
+# Carril propio para las herramientas del agente de chat (n8n): concurrencia
+# acotada, cola con tope y prioridad "agent" en Airtable (el portal pasa antes)
+carril_chat = Carril(
+    "chat",
+    max_concurrencia=CHAT_MAX_CONCURRENCIA,
+    max_cola=CHAT_MAX_COLA,
+    espera_max=CHAT_ESPERA_MAX,
+    prioridad_airtable=AGENT,
+)
+# Subida de adjuntos de denuncias (cliente compartido + topes de concurrencia)
+# con reducción/recompresión previa de fotos en un pool de procesos
+optimizador_imagenes = OptimizadorImagenes()
+imgbb = ImgbbUploader(optimizador=optimizador_imagenes)
+
+
+@app.on_event("startup")
+async def start_background_tasks():
+    # Denuncias y escrituras se aceptan al guardarse en DATA_DIR: sin disco persistente no se arranca
+    verificar_persistencia()
+    if airtable.configured:
+        clientes.start()
+        cola_siniestros.start()
+        rating.start()
+        escrituras.start()
+        snapshots_portal.start()
+
+
+@app.on_event("shutdown")
+async def close_airtable_pool():
+    await cola_siniestros.stop()
+    await snapshots_portal.stop()
+    await escrituras.stop()
+    await rating.stop()
+    await clientes.stop()
+    await airtable.aclose()
+    await imgbb.aclose()
+    optimizador_imagenes.shutdown()
 
 
 # Modelos Pydantic
@@ -155,148 +282,6 @@ class RatingRequest(BaseModel):
     usar_foto: Optional[bool] = False
 
 
-# ==============================================================================
-# HELPER FUNCTIONS
-# ==============================================================================
-
-
-def parse_poliza_block(bloque_texto: str) -> list:
-    """
-    Parsea un bloque de ETIQUETA_POLIZA y extrae toda la información.
-    Soporta múltiples pólizas concatenadas separandolas por emojis de estado o palabras clave.
-    Estrategia: Dividir por '|' y reagrupar lógicamente.
-    """
-    import re
-
-    # 1. Limpieza inicial
-    if not bloque_texto:
-        return []
-
-    # 2. Tokenizar por tubería '|'
-    parts = [p.strip() for p in bloque_texto.split("|")]
-    bloques_reconstruidos = []
-    current_bloque = []
-
-    # Emojis/Keywords que marcan inicio de poliza (heurística)
-    emojis_inicio = ["✅", "❌", "⏳", "⚠️", "🟢", "🔴", "🟣", "⭕"]
-    keywords_inicio = [
-        "VIGENTE",
-        "VENCE",
-        "ANULADA",
-        "BAJA",
-        "ACTIVA",
-        "SIN VIGENCIA",
-        "SIN POLIZAS",
-        "TRAMITES",
-    ]
-
-    for part in parts:
-        part_upper = part.upper()
-        # Es inicio si tiene emoji de estado Y palabras clave de estado
-        tiene_emoji = any(e in part for e in emojis_inicio)
-        tiene_keyword = any(k in part_upper for k in keywords_inicio)
-
-        es_inicio = tiene_emoji and tiene_keyword
-
-        # Caso especial: Si es el primer fragmento, empieza bloque
-        if not current_bloque:
-            current_bloque.append(part)
-        elif es_inicio:
-            bloques_reconstruidos.append(" | ".join(current_bloque))
-            current_bloque = [part]
-        else:
-            current_bloque.append(part)
-
-    if current_bloque:
-        bloques_reconstruidos.append(" | ".join(current_bloque))
-
-    parsed_policies = []
-
-    for bloque in bloques_reconstruidos:
-        p_info = {
-            "numero": "",
-            "patente": "",
-            "tipo_vehiculo": "",
-            "categoria": "",
-            "vida": False,
-            "auxilio": False,
-            "estado": "",
-            "descripcion_completa": bloque,
-        }
-
-        # Extraer N POL — usar [0-9] en vez de d, [ ] en vez de s
-        match = re.search(r"N[°][ ]*POL[:]?[ ]*([0-9]+)", bloque, re.IGNORECASE)
-        if not match:
-            # Fallback: buscar cualquier secuencia de 5+ digitos como numero de poliza pero evitar patentes numericas largas (raro)
-            match = re.search(r"([0-9]{5,})", bloque)
-        if match:
-            p_info["numero"] = match.group(1)
-
-        # Extraer Patente con emoji
-        # Intentamos capturar lo que sigue al emoji de etiqueta
-        match = re.search(
-            r"🏷️?[ ]*([A-Z]{2,3}[0-9]{3}[A-Z]{0,2}|[A-Z0-9]{6,9})", bloque, re.IGNORECASE
-        )
-        # Refinamiento: Si hay un emoji "🏷️" explícito, tomamos lo que sigue
-        match_explicit = re.search(r"🏷️[ ]*([A-Z0-9]+)", bloque, re.IGNORECASE)
-
-        if match_explicit:
-            p_info["patente"] = match_explicit.group(1).upper()
-        elif match:
-            # Validación extra para evitar falsos positivos
-            posible_patente = match.group(1).upper()
-            # Patentes argentinas viejas (AAA123) o nuevas (AA123BB) o motos (A123BCD)
-            # Evitar capturar cosas como "VENCE" o "POL" si el regex es muy laxo
-            if len(posible_patente) >= 6 and not posible_patente.startswith("POL"):
-                p_info["patente"] = posible_patente
-
-        # Extraer Tipo de vehiculo con emoji auto/moto/camion
-        match = re.search(r"[🚗🚙🚛🏍️][ ]+([A-ZÁ-Ú]+)", bloque)
-        if match:
-            tipo = match.group(1).strip()
-            if len(tipo) > 2 and tipo not in ["POL"]:
-                p_info["tipo_vehiculo"] = tipo
-
-        # Si no encontro tipo, buscar palabras clave comunes
-        if not p_info["tipo_vehiculo"]:
-            for tipo_clave in [
-                "AUTOMOVIL",
-                "AUTO",
-                "CAMIONETA",
-                "MOTO",
-                "CAMION",
-                "UTILITARIO",
-                "PICK UP",
-                "PICKUP",
-            ]:
-                if tipo_clave in bloque.upper():
-                    p_info["tipo_vehiculo"] = tipo_clave
-                    break
-
-        # Extraer Estado
-        bloque_upper = bloque.upper()
-        if "ANULADA" in bloque_upper:
-            p_info["estado"] = "ANULADA"
-        elif "VIGENTE" in bloque_upper:
-            p_info["estado"] = "VIGENTE"
-        elif "SIN VIGENCIA" in bloque_upper:
-            p_info["estado"] = "SIN VIGENCIA"
-
-        match_vence = re.search(r"(VENCE[ ]*[0-9]+[D]?)", bloque_upper)
-        if match_vence:
-            p_info["estado"] = match_vence.group(1)
-
-        # Extras: Vida y Auxilio
-        if "VIDA: SI" in bloque_upper or "❤️ VIDA" in bloque or "VIDA" in bloque_upper:
-            p_info["vida"] = True
-        if "AUX" in bloque_upper or "🆘" in bloque or "🔧" in bloque:
-            p_info["auxilio"] = True
-
-        parsed_policies.append(p_info)
-
-    return parsed_policies
-
-
 # ==============================================================================
 # ENDPOINTS
 # ==============================================================================
@@ -312,74 +297,70 @@ def api_version():
     return {"v": "PRODUCCION-ROBUSTA-V3"}
 
 
+@app.get("/api/metrics")
+async def api_metrics():
+    """Contadores internos: cola/429 de Airtable, hit/miss de caches e índice de clientes."""
+    return {
+        "airtable": airtable.scheduler.metrics(),
+        "caches": cache_stats(),
+        "clientes_index": clientes.info(),
+        "rating": rating.info(),
+        "imagenes": optimizador_imagenes.stats(),
+        "cola_siniestros": await cola_siniestros.metricas(),
+        "escrituras_diferidas": await escrituras.metricas(),
+        "carril_chat": carril_chat.metricas(),
+        "portal_snapshots": snapshots_portal.info(),
+    }
+
+
 @app.get("/api/validar-cliente")
 async def validar_cliente(dni: str, patente: str):
     """
     Valida si un DNI tiene una póliza activa con la patente indicada.
     Replica la lógica del workflow N8N 'VALIDAR_CLIENTE_SINIESTRO'.
     """
-    table_clientes = get_table("CLIENTES")
+    table_clientes = get_repo("CLIENTES")
     if not table_clientes:
         raise HTTPException(status_code=500, detail="Airtable config missing")
 
-    # 1. Buscar Cliente por DNI
-    # Fórmula: ({DNI} & "") = "12345678"
-    formula = f'({{DNI}} & "") = "{dni}"'
+    # 1. Buscar Cliente por DNI (índice en memoria)
     try:
-        records = table_clientes.all(formula=formula, max_records=1)
+        cliente_record = await clientes.get(dni)
     except Exception as e:
         print(f"Error Airtable: {e}")
         raise HTTPException(status_code=500, detail="Error connecting to database")
 
-    if not records:
+    if not cliente_record:
         return {
             "valid": False,
             "reason": "CLIENT_NOT_FOUND",
             "message": f"No encontramos un cliente con el DNI ingresado ({dni}). Verificá que esté escrito correctamente.",
         }
 
-    cliente = records[0]["fields"]
+    cliente = vista(cliente_record["fields"], "validar_cliente")
     nombre_completo = (
         cliente.get("NOMBRE COMPLETO") or cliente.get("NOMBRES") or "Cliente"
     )
 
-    # 2. Obtener compilación de pólizas (Lookup)
-    compilacion = cliente.get("ETIQUETA_POLIZA Compilación (de POLIZAS)", [])
-
-    # Manejar si es string o lista
-    texto_polizas = ""
-    if isinstance(compilacion, list):
-        texto_polizas = " ".join([str(x) for x in compilacion])
-    else:
-        texto_polizas = str(compilacion or "")
-
-    # 3. Parsear INTELIGENTEMENTE todas las pólizas
-    polizas_encontradas = parse_poliza_block(texto_polizas)
-
+    # 2. Pólizas del cliente ya parseadas (vista cacheada por versión de la compilación)
     patente_buscada = patente.upper().strip()
-    poliza_match = None
-
-    # Buscar la póliza específica
-    for p in polizas_encontradas:
-        if p["patente"] == patente_buscada:
-            poliza_match = p
-            break
+    poliza = polizas_de_cliente(cliente).buscar(patente_buscada)
 
-    if not poliza_match:
+    if not poliza:
         return {
             "valid": False,
             "reason": "PATENTE_NOT_FOUND",
             "message": f"Hola {nombre_completo}, no encontramos el vehículo patente {patente_buscada} asociado a tu DNI.",
         }
 
-    # 4. Verificar estado (ANULADA/BAJA)
-    estado_poliza = poliza_match.get("estado", "").upper()
-    if "ANULADA" in estado_poliza or "BAJA" in estado_poliza:
+    # 3. Verificar estado (ANULADA/BAJA)
+    if poliza.inactiva:
         return {
             "valid": False,
             "reason": "POLICY_INACTIVE",
             "message": f"La póliza del vehículo {patente_buscada} figura como ANULADA o DE BAJA.",
         }
+    poliza_match = poliza.to_dict()
 
     # Limpieza de descripción (quitar emojis al inicio si existen)
     descripcion = poliza_match.get("descripcion_completa", "").strip()
@@ -387,31 +368,15 @@ async def validar_cliente(dni: str, patente: str):
         descripcion = descripcion.replace(char, "")
     descripcion = descripcion.strip()
 
-    # 5. Obtener Record ID de la Póliza (Crucial para Airtable Linked Record)
+    # 4. Obtener Record ID de la Póliza (Crucial para Airtable Linked Record)
+    # El ID no está en el string compilado: se resuelve en UNA llamada batch
     record_id_poliza = None
-    ids_polizas = cliente.get("POLIZAS", [])
-
-    if ids_polizas:
-        try:
-            table_polizas = get_table("POLIZAS")
-            if table_polizas:
-                # Iteramos las pólizas del cliente para encontrar la que coincide con la patente
-                # Esto es necesario porque el ID no está en el string compilado
-                for pid in ids_polizas:
-                    try:
-                        pol_record = table_polizas.get(pid)
-                        fields_p = pol_record["fields"]
-                        # Buscamos patente en campos clave o etiqueta
-                        str_fields = str(fields_p.values()).upper()
-
-                        if patente_buscada in str_fields:
-                            record_id_poliza = pid
-                            break
-                    except Exception as e:
-                        print(f"Error parseando póliza {pid}: {e}")
-                        continue
-        except Exception as e:
-            print(f"Error fetching poliza details: {e}")
+    try:
+        record_id_poliza = await resolver_poliza_por_patente(
+            get_repo("POLIZAS"), cliente.get("POLIZAS", []), patente_buscada
+        )
+    except Exception as e:
+        print(f"Error fetching poliza details: {e}")
 
     return {
         "valid": True,
@@ -435,331 +400,168 @@ async def validar_cliente(dni: str, patente: str):
     }
 
 
-@app.get("/api/portal/user-data")
-async def get_portal_user_data(dni: str):
-    """
-    Portal de Autogestion Endpoint. Retorna el perfil y los tickets ligados a un cliente por DNI.
-    """
-    table_clientes = get_table("CLIENTES")
-    if not table_clientes:
-        raise HTTPException(status_code=500, detail="Airtable config error")
-
-    # 1. Buscar Cliente por DNI
+async def _cliente_portal(dni: str):
+    """(dni_limpio, registro de CLIENTES, respuesta de error o None)."""
     dni_limpio = "".join(filter(str.isdigit, str(dni)))
-    formula = f'({{DNI}} & "") = "{dni_limpio}"'
     try:
-        records = table_clientes.all(formula=formula, max_records=1)
+        cliente_record = await clientes.get(dni_limpio)
     except Exception as e:
         print(f"Error buscando cliente en Portal: {e}")
-        return {"valid": False, "message": "Error buscando cliente en Portal"}
+        return dni_limpio, None, {"valid": False, "message": "Error buscando cliente en Portal"}
 
-    if not records:
-        return {"valid": False, "message": "Cliente no encontrado"}
+    if not cliente_record:
+        return dni_limpio, None, {"valid": False, "message": "Cliente no encontrado"}
+    return dni_limpio, cliente_record, None
 
-    cliente_record = records[0]
-    cliente = cliente_record["fields"]
 
-    tables = {
-        "polizas": get_table("POLIZAS"),
-        "gestiones": get_table("GESTIÓN GENERAL"),
-        "accidentes": get_table("DENUNCIA DE ACCIDENTE"),
-        "robo_oc": get_table("DENUNCIA ROBO OC"),
-        "robo_incendio": get_table("DENUNCIA ROBO / INCENDIO"),
-    }
+def _validar_vista_portal(view: str):
+    if view not in VISTAS:
+        raise HTTPException(status_code=400, detail=f"view debe ser uno de: {', '.join(VISTAS)}")
 
-    def fetch_records_by_ids(table, record_ids):
-        if not table or not record_ids:
-            return []
-        result = []
-        chunk_size = 50
-        for i in range(0, len(record_ids), chunk_size):
-            chunk = record_ids[i : i + chunk_size]
-            conditions = ",".join([f"RECORD_ID()='{rid}'" for rid in chunk])
-            formula = f"OR({conditions})"
-            try:
-                # We return only useful fields to avoid excessive payload
-                fetched = table.all(formula=formula)
-                for f in fetched:
-                    # Append the record ID directly to the fields so frontend has it easily
-                    f["fields"]["RECORD_ID"] = f["id"]
-                result.extend([f["fields"] for f in fetched])
-            except Exception as e:
-                print(f"Error fetching from {table.table_name}: {e}")
-        return result
-
-    # Fields containing the relations in Airtable for CLIENTES table
-    data = {
-        "perfil": {
-            "nombres": cliente.get("NOMBRES", ""),
-            "apellido": cliente.get("APELLIDO", ""),
-            "dni": cliente.get("DNI", dni_limpio),
-            "telefono": cliente.get("TELEFONO", ""),
-            "email": cliente.get("EMAIL", ""),
-            "fecha_alta": cliente.get("FECHA DE ALTA", ""),
-            "id_registro": cliente.get("ID_REGISTRO_CLIENTE", ""),
-            # Campos calculados de Airtable
-            "total_polizas": cliente.get("✅ CANTIDAD_POLIZAS", 0),
-            "polizas_activas": cliente.get("🟢 POLIZAS_ACTIVAS", 0),
-            "polizas_anuladas": cliente.get("🔴 POLIZAS_ANULADAS", 0),
-            "polizas_tramite": cliente.get("🟡 POLIZAS_EN_TRAMITES", 0),
-            "polizas_sin_vigencia": cliente.get("🟣 POLIZAS_SIN_VIGENCIA", 0),
-            "vence_30dias": cliente.get("📆 LA_POLIZAS VENCE EN 30 DIAS", 0),
-            "vence_7dias": cliente.get("📆 LA_POLIZAS VENCE EN 7 DIAS", 0),
-        },
-        "polizas": fetch_records_by_ids(tables["polizas"], cliente.get("POLIZAS", [])),
-        "gestiones": fetch_records_by_ids(
-            tables["gestiones"], cliente.get("GESTIÓN GENERAL", [])
-        ),
-        "accidentes": fetch_records_by_ids(
-            tables["accidentes"], cliente.get("DENUNCIA DE ACCIDENTE", [])
-        ),
-        "robo_oc": fetch_records_by_ids(
-            tables["robo_oc"],
-            cliente.get(
-                "CARGA DENUNCIA OC (  CRISTALES, CERRADURAS, BATERIA, RUEDAS ) 6", []
-            ),
-        ),
-        "robo_incendio": fetch_records_by_ids(
-            tables["robo_incendio"],
-            cliente.get("DENUNCIA ROBO TOTAL , INCENDIO  TOTAL/PARCIAL 2", []),
-        ),
-    }
-
-    # 4. RESOLUCIÓN DE LOOKUPS (Mapeo de IDs a Nombres)
-    try:
-
-        def _is_airtable_id(value):
-            return isinstance(value, str) and value.startswith("rec")
-
-        def _normalize_text(value):
-            if value is None:
-                return ""
-            if isinstance(value, list):
-                parts = []
-                for item in value:
-                    txt = _normalize_text(item)
-                    if txt:
-                        parts.append(txt)
-                return ", ".join(parts)
-            if isinstance(value, dict):
-                for key in ("name", "label", "value", "text"):
-                    txt = _normalize_text(value.get(key))
-                    if txt:
-                        return txt
-                return ""
-            return str(value).strip()
-
-        def _looks_human_text(text):
-            if not text or _is_airtable_id(text):
-                return False
-            return any(ch.isalpha() for ch in text)
-
-        def _pick_display_name(fields, preferred_keys):
-            for key in preferred_keys:
-                txt = _normalize_text(fields.get(key))
-                if _looks_human_text(txt):
-                    return txt
-
-            for _, raw in fields.items():
-                txt = _normalize_text(raw)
-                if _looks_human_text(txt):
-                    return txt
-
-            return ""
-
-        def _build_name_map(table_key, preferred_keys):
-            table = get_table(table_key)
-            name_map = {}
-
-            if not table:
-                return table, name_map
-
-            try:
-                records = table.all()
-            except Exception as e:
-                print(f"Error cargando tabla {table_key} para lookup: {e}")
-                return table, name_map
-
-            for rec in records:
-                rec_id = rec.get("id")
-                fields = rec.get("fields", {})
-                name = _pick_display_name(fields, preferred_keys)
-                if rec_id and name:
-                    name_map[rec_id] = name
-
-            return table, name_map
 
-        def _resolve_record_id(table, name_map, rec_id, preferred_keys, label):
-            if not _is_airtable_id(rec_id):
-                return rec_id
-
-            cached = name_map.get(rec_id)
-            if cached:
-                return cached
-
-            if not table:
-                return rec_id
+@app.get("/api/portal/user-data")
+async def get_portal_user_data(dni: str, view: str = VISTA_COMPLETA, limit: Optional[int] = None):
+    """
+    Portal de Autogestion Endpoint. Retorna el perfil y los tickets ligados a un cliente por DNI.
 
-            try:
-                record = table.get(rec_id)
-                name = _pick_display_name(record.get("fields", {}), preferred_keys)
-                if name:
-                    name_map[rec_id] = name
-                    return name
-            except Exception as e:
-                print(f"Lookup puntual falló en {label} para {rec_id}: {e}")
-
-            return rec_id
-
-        def _resolve_value(raw_value, table, name_map, preferred_keys, label):
-            if isinstance(raw_value, list):
-                parts = []
-                for item in raw_value:
-                    if isinstance(item, str):
-                        parts.append(
-                            _resolve_record_id(
-                                table, name_map, item, preferred_keys, label
-                            )
-                        )
-                    else:
-                        txt = _normalize_text(item)
-                        if txt:
-                            parts.append(txt)
-                return ", ".join([p for p in parts if p])
-
-            if isinstance(raw_value, str):
-                return _resolve_record_id(
-                    table, name_map, raw_value, preferred_keys, label
-                )
+    view=summary trae solo los campos que muestra el portal y la primera página
+    (PORTAL_PAGE_SIZE, o `limit`) de gestiones y denuncias, de la más nueva a la
+    más vieja; data.paginas tiene el total y el next_cursor de cada una.
+    view=full (default) trae todos los campos y, sin limit, el historial completo.
+    """
+    _validar_vista_portal(view)
+    if not get_repo("CLIENTES"):
+        raise HTTPException(status_code=500, detail="Airtable config error")
 
-            return _normalize_text(raw_value)
-
-        emp_name_keys = [
-            "NOMBRE Y APELLIDO",
-            "APELLIDO Y NOMBRE",
-            "NOMBRE COMPLETO",
-            "NOMBRE",
-            "Nombre",
-            "USUARIO",
-            "EMPLEADO",
-            "ATENDIDO X",
-        ]
-        ofic_name_keys = [
-            "NOMBRE_OFICINA_LIMPIO_WEB",
-            "OFICINAS",
-            "OFICINA",
-            "NOMBRE",
-            "Sede",
-            "SUCURSAL",
-            "AGENCIA",
-        ]
-        cia_name_keys = ["NOMBRE", "COMPAÑIA", "COMPANIA", "Compañía"]
-        prod_name_keys = ["NOMBRE PRODUCTO", "PRODUCTO", "Producto"]
-
-        table_emp, emp_map = _build_name_map("EMPLEADOS", emp_name_keys)
-        table_ofic, ofic_map = _build_name_map("OFICINAS", ofic_name_keys)
-        table_cia, cia_map = _build_name_map("COMPANIA", cia_name_keys)
-        table_prod, prod_map = _build_name_map("PRODUCTOS", prod_name_keys)
+    dni_limpio, cliente_record, error = await _cliente_portal(dni)
+    if error:
+        return error
+
+    cliente = vista(cliente_record["fields"], "portal_user_data")
+    # Visita repetida: sale del snapshot del cliente sin llamar a Airtable
+    secciones = await snapshots_portal.secciones(dni_limpio, cliente, view=view, limit=limit)
+    data = {"perfil": perfil_portal(cliente, dni_limpio), **secciones}
+    return {"valid": True, "view": view, "data": data}
+
+
+@app.get("/api/portal/user-data/{seccion}")
+async def get_portal_seccion(
+    seccion: str,
+    dni: str,
+    view: str = VISTA_RESUMEN,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+):
+    """Página siguiente de una sección (cursor = next_cursor de la respuesta anterior)."""
+    _validar_vista_portal(view)
+    if seccion not in TABLAS_PORTAL:
+        raise HTTPException(status_code=404, detail="Sección inexistente")
+
+    dni_limpio, cliente_record, error = await _cliente_portal(dni)
+    if error:
+        return error
+
+    cliente = vista(cliente_record["fields"], "portal_user_data")
+    if not cursor:
+        # Primera página: la del snapshot del cliente
+        data = await snapshots_portal.secciones(dni_limpio, cliente, view=view, limit=limit, nombres=(seccion,))
+        return {"valid": True, "view": view, "data": data[seccion], "pagina": data["paginas"].get(seccion)}
 
-        print(
-            f"DEBUG MAPS ROBUST: Emp={len(emp_map)}, Ofic={len(ofic_map)}, Cia={len(cia_map)}, Prod={len(prod_map)}"
+    try:
+        records, pagina = await portal.seccion(
+            relaciones_cliente(cliente), seccion, view=view, limit=limit, cursor=cursor
         )
+    except CursorInvalido:
+        raise HTTPException(status_code=400, detail="cursor inválido")
+    except Exception as e:
+        print(f"Error fetching from {TABLAS_PORTAL[seccion]}: {e}")
+        return {"valid": False, "message": "Error cargando la sección"}
+    await portal.resolver([records])
+    return {"valid": True, "view": view, "data": records, "pagina": pagina}
 
-        def mapper(record_list):
-            for rec in record_list:
-                # 1. Oficinas
-                ofic_key = next(
-                    (
-                        k
-                        for k in [
-                            "OFICINAS",
-                            "OFICINA",
-                            "Sede",
-                            "Oficina",
-                            "OFICINAS (from CLIENTES)",
-                            "OFICINA (from CLIENTES)",
-                        ]
-                        if k in rec
-                    ),
-                    None,
-                )
-                if ofic_key:
-                    resolved_ofic = _resolve_value(
-                        rec.get(ofic_key),
-                        table_ofic,
-                        ofic_map,
-                        ofic_name_keys,
-                        "OFICINAS",
-                    )
-                    if resolved_ofic:
-                        rec["OFICINAS"] = resolved_ofic
-                        rec["OFICINA"] = resolved_ofic
-
-                # 2. Atendido X
-                aten_key = next(
-                    (
-                        k
-                        for k in [
-                            "ATENDIDO X",
-                            "ATENDIDO X (from CLIENTES)",
-                            "Empleado",
-                            "Atendido por",
-                            "ATENDIDO POR",
-                        ]
-                        if k in rec
-                    ),
-                    None,
-                )
-                if aten_key:
-                    resolved_emp = _resolve_value(
-                        rec.get(aten_key),
-                        table_emp,
-                        emp_map,
-                        emp_name_keys,
-                        "EMPLEADOS",
-                    )
-                    if resolved_emp:
-                        rec["ATENDIDO X"] = resolved_emp
-                        rec["ATENDIDO X (from CLIENTES)"] = resolved_emp
-
-                # 3. Compañía y Producto
-                cia_key = next(
-                    (
-                        k
-                        for k in ["COMPANIA LINK", "COMPAÑIA", "COMPANIA", "Compañía"]
-                        if k in rec
-                    ),
-                    None,
-                )
-                if cia_key:
-                    rec["COMPANIA_RESOLVED"] = _resolve_value(
-                        rec.get(cia_key), table_cia, cia_map, cia_name_keys, "COMPANIA"
-                    )
 
-                prod_key = next(
-                    (k for k in ["PRODUCTO LINK", "PRODUCTO", "Producto"] if k in rec),
-                    None,
-                )
-                if prod_key:
-                    rec["PRODUCTO_RESOLVED"] = _resolve_value(
-                        rec.get(prod_key),
-                        table_prod,
-                        prod_map,
-                        prod_name_keys,
-                        "PRODUCTOS",
-                    )
+@app.get("/api/portal/user-data/{seccion}/{record_id}")
+async def get_portal_registro(seccion: str, record_id: str, dni: str):
+    """Detalle completo de un registro (se pide al abrir su modal en el portal)."""
+    if seccion not in TABLAS_PORTAL:
+        raise HTTPException(status_code=404, detail="Sección inexistente")
 
-        for cat in ["gestiones", "accidentes", "robo_oc", "robo_incendio", "polizas"]:
-            if cat in data:
-                mapper(data[cat])
+    _, cliente_record, error = await _cliente_portal(dni)
+    if error:
+        return error
 
+    cliente = vista(cliente_record["fields"], "portal_user_data")
+    try:
+        registro = await portal.detalle(relaciones_cliente(cliente), seccion, record_id)
     except Exception as e:
-        print(f"Error en resolución crítica de Lookups en backend/main.py: {e}")
-        import traceback
-
-        traceback.print_exc()
-
-    return {"valid": True, "data": data}
+        print(f"Error fetching from {TABLAS_PORTAL[seccion]}: {e}")
+        return {"valid": False, "message": "Error cargando el registro"}
+    if registro is None:
+        return {"valid": False, "message": "Registro no encontrado"}
+    return {"valid": True, "data": registro}
+
+
+# ------------------------------------------------------------------------------
+# Portal por secciones: el portal pide cada parte por separado y la muestra
+# apenas llega. Todas leen el registro del cliente del índice en memoria
+# (compartido entre requests) y las secciones del snapshot del cliente.
+# ------------------------------------------------------------------------------
+
+
+@app.get("/api/portal/{dni}/perfil")
+async def get_portal_perfil(dni: str):
+    """Perfil del cliente, servido solo desde el índice de CLIENTES (sin vinculados)."""
+    dni_limpio, cliente_record, error = await _cliente_portal(dni)
+    if error:
+        return error
+    cliente = vista(cliente_record["fields"], "portal_user_data")
+    return {"valid": True, "data": perfil_portal(cliente, dni_limpio)}
+
+
+@app.get("/api/portal/{dni}/polizas")
+async def get_portal_polizas(dni: str, view: str = VISTA_RESUMEN):
+    _validar_vista_portal(view)
+    dni_limpio, cliente_record, error = await _cliente_portal(dni)
+    if error:
+        return error
+    cliente = vista(cliente_record["fields"], "portal_user_data")
+    data = await snapshots_portal.secciones(dni_limpio, cliente, view=view, nombres=("polizas",))
+    return {"valid": True, "view": view, "data": data["polizas"]}
+
+
+@app.get("/api/portal/{dni}/gestiones")
+async def get_portal_gestiones(
+    dni: str, view: str = VISTA_RESUMEN, limit: Optional[int] = None, cursor: Optional[str] = None
+):
+    return await get_portal_seccion("gestiones", dni, view=view, limit=limit, cursor=cursor)
+
+
+@app.get("/api/portal/{dni}/denuncias")
+async def get_portal_denuncias(
+    dni: str,
+    view: str = VISTA_RESUMEN,
+    limit: Optional[int] = None,
+    tipo: Optional[str] = None,
+    cursor: Optional[str] = None,
+):
+    """
+    Primera página de accidentes, robo_oc y robo_incendio (data.paginas como en
+    user-data). Con tipo=<sección> y cursor trae la página siguiente de esa sola.
+    """
+    if tipo is not None:
+        if tipo not in DENUNCIAS:
+            raise HTTPException(status_code=400, detail=f"tipo debe ser uno de: {', '.join(DENUNCIAS)}")
+        return await get_portal_seccion(tipo, dni, view=view, limit=limit, cursor=cursor)
+    if cursor is not None:
+        raise HTTPException(status_code=400, detail="cursor requiere tipo")
+
+    _validar_vista_portal(view)
+    dni_limpio, cliente_record, error = await _cliente_portal(dni)
+    if error:
+        return error
+    cliente = vista(cliente_record["fields"], "portal_user_data")
+    data = await snapshots_portal.secciones(dni_limpio, cliente, view=view, limit=limit, nombres=DENUNCIAS)
+    return {"valid": True, "view": view, "data": data}
 
 
 class PortalRegisterRequest(BaseModel):
@@ -775,34 +577,45 @@ class PortalLoginRequest(BaseModel):
 
 @app.post("/api/portal/register")
 async def portal_register(req: PortalRegisterRequest):
-    table_clientes = get_table("CLIENTES")
+    table_clientes = get_repo("CLIENTES")
     if not table_clientes:
         raise HTTPException(status_code=500, detail="Airtable config error")
 
-    # Reutilizamos logica de validate_siniestro para validar DNI y Patente
-    # Al requerir await, llamamos directamente la funcion asyncrona validate_siniestro
-    val_res = await validate_siniestro(req.dni, req.patente)
-    if not val_res.get("valid"):
+    dni_limpio = "".join(filter(str.isdigit, str(req.dni)))
+    patente_limpia = req.patente.upper().strip().replace(" ", "")
+    if not dni_limpio or not patente_limpia:
+        return {"valid": False, "message": "Datos incompletos"}
+
+    try:
+        cliente_record = await clientes.get(dni_limpio)
+    except Exception as e:
+        print(f"Error buscando cliente: {e}")
+        return {"valid": False, "message": "Error validando cliente"}
+
+    if not cliente_record:
+        return {"valid": False, "message": "Cliente no encontrado"}
+
+    # Misma regla patente → póliza que validate_siniestro (vista compartida)
+    poliza = polizas_de_cliente(vista(cliente_record["fields"], "portal_register")).buscar(patente_limpia)
+    if not poliza:
         return {
             "valid": False,
-            "message": val_res.get(
-                "message", "Error validando patente asociada al DNI."
-            ),
+            "message": f"No encontramos el vehículo patente {patente_limpia} asociado a tu DNI.",
         }
-
-    # Si es valido, actualizamos Airtable
-    dni_limpio = "".join(filter(str.isdigit, str(req.dni)))
-    formula = f'({{DNI}} & "") = "{dni_limpio}"'
-    records = table_clientes.all(formula=formula, max_records=1)
-    if not records:
+    if poliza.inactiva:
         return {
             "valid": False,
-            "message": "Cliente no encontrado para actualizar contraseña",
+            "message": f"La póliza del vehículo {patente_limpia} figura como ANULADA o DE BAJA.",
         }
 
-    record_id = records[0]["id"]
+    # Si es valido, actualizamos Airtable
+    record_id = cliente_record["id"]
     try:
-        table_clientes.update(record_id, {"CONTRASEÑA PORTAL": req.password})
+        updated = await table_clientes.update(
+            record_id, {"CONTRASEÑA PORTAL": req.password}
+        )
+        # Write-through: el login siguiente ya ve la contraseña nueva
+        clientes.upsert(updated)
         return {"valid": True, "message": "Contraseña creada correctamente"}
     except Exception as e:
         print(f"Error actualizando contraseña: {e}")
@@ -811,23 +624,22 @@ async def portal_register(req: PortalRegisterRequest):
 
 @app.post("/api/portal/login-password")
 async def portal_login_password(req: PortalLoginRequest):
-    table_clientes = get_table("CLIENTES")
+    table_clientes = get_repo("CLIENTES")
     if not table_clientes:
         raise HTTPException(status_code=500, detail="Airtable config error")
 
     dni_limpio = "".join(filter(str.isdigit, str(req.dni)))
-    formula = f'({{DNI}} & "") = "{dni_limpio}"'
 
     try:
-        records = table_clientes.all(formula=formula, max_records=1)
+        cliente_record = await clientes.get(dni_limpio)
     except Exception as e:
         print(f"Error login Portal: {e}")
         return {"valid": False, "message": "Error conectando a la base de datos"}
 
-    if not records:
+    if not cliente_record:
         return {"valid": False, "message": "El DNI ingresado no está registrado"}
 
-    cliente = records[0]["fields"]
+    cliente = vista(cliente_record["fields"], "portal_login")
     # Comparar contraseña
     pass_guardada = cliente.get("CONTRASEÑA PORTAL")
     if not pass_guardada:
@@ -858,163 +670,21 @@ async def get_testimonios():
     - Prioridad: Últimos 3 meses.
     - Fallback: Si no completa cupo con recientes, usa antiguos.
     - Total Objetivo: 10 testimonios.
+    Los pools se arman en segundo plano (TestimoniosCache); acá solo se muestrea.
     """
-    table_calif = get_table("CALIFICACIONES")
-    if not table_calif:
+    if not get_repo("CALIFICACIONES"):
         raise HTTPException(status_code=500, detail="Airtable config missing")
 
-    # Fórmula: Visible=True, Autoriza=True, Comentario!=''
-    # Traemos TODO (sin filtro de fecha en API) para poder hacer el fallback
-    formula = "AND({VISIBLE}=TRUE(), {AUTORIZA_PUBLICAR}=TRUE(), {COMENTARIO}!='')"
-
     try:
-        records = table_calif.all(formula=formula)
+        pools = await testimonios.pools()
     except Exception as e:
         print(f"Error fetching testimonios: {e}")
         return {"testimonios": [], "total": 0, "mensaje": "Error obteniendo datos"}
 
-    if not records:
+    if not pools:
         return {"testimonios": [], "total": 0, "mensaje": "Sin testimonios disponibles"}
 
-    # Procesar registros y separar por fecha y calificación
-    now = datetime.now().astimezone()  # Aware
-    cutoff_90d = datetime.now().timestamp() - (
-        90 * 24 * 60 * 60
-    )  # Timestamp comparison logic easier
-
-    pool_recent_good = []
-    pool_recent_bad = []
-    pool_old_good = []
-    pool_old_bad = []
-
-    formatted_map = {}  # ID -> Formatted Dict
-
-    for r in records:
-        f = r["fields"]
-        stars = f.get("ESTRELLAS", 0)
-
-        # Parse Date
-        date_str = f.get("FECHA DE CREACION") or r.get("createdTime")
-        is_recent = False
-
-        # Intentar parsear fecha
-        try:
-            # ISO format from Airtable: 2023-10-25T12:00:00.000Z
-            dt = datetime.fromisoformat(date_str.replace("Z", "+00:00"))
-            is_recent = dt.timestamp() >= cutoff_90d
-
-            # Texto relativo
-            delta = datetime.now(dt.tzinfo) - dt
-            days = delta.days
-            if days == 0:
-                texto_tiempo = "Hoy"
-            elif days == 1:
-                texto_tiempo = "Ayer"
-            elif days < 7:
-                texto_tiempo = f"Hace {days} días"
-            elif days < 30:
-                texto_tiempo = f"Hace {days // 7} semanas"
-            else:
-                texto_tiempo = f"Hace {days // 30} meses"
-        except Exception as e:
-            print(f"Error calculando tiempo relativo de siniestro {date_str}: {e}")
-            texto_tiempo = "Reciente"
-            is_recent = False
-
-        # Formatear
-        nombre = f.get("NOMBRE", "Anónimo")
-
-        # Iniciales
-        partes = nombre.strip().split()
-        if partes:
-            iniciales = (
-                partes[0][0] + (partes[-1][0] if len(partes) > 1 else "")
-            ).upper()
-        else:
-            iniciales = "?"
-
-        foto_url = None
-        if f.get("USAR FOTO") and f.get("FOTO PERFIL"):
-            fotos = f.get("FOTO PERFIL")
-            if isinstance(fotos, list) and len(fotos) > 0:
-                foto_url = fotos[0].get("url")
-
-        item = {
-            "id": r["id"],
-            "nombre": nombre,
-            "iniciales": iniciales,
-            "estrellas": stars,
-            "comentario": f.get("COMENTARIO", ""),
-            "fecha": texto_tiempo,
-            "fotoUrl": foto_url,
-        }
-
-        formatted_map[r["id"]] = item
-
-        # Clasificar
-        if stars >= 3:
-            if is_recent:
-                pool_recent_good.append(item)
-            else:
-                pool_old_good.append(item)
-        else:
-            if is_recent:
-                pool_recent_bad.append(item)
-            else:
-                pool_old_bad.append(item)
-
-    # Shuffle pools
-    random.shuffle(pool_recent_good)
-    random.shuffle(pool_recent_bad)
-    random.shuffle(pool_old_good)
-    random.shuffle(pool_old_bad)
-
-    final_selection = []
-
-    # Objetivo: 7 Buenos, 3 Malos/Otros
-    target_good = 7
-    target_bad = 3
-
-    # 1. Fill Bad (30%)
-    # - Try Recent Bad
-    take_bad = pool_recent_bad[:target_bad]
-    final_selection.extend(take_bad)
-    needed_bad = target_bad - len(take_bad)
-
-    if needed_bad > 0:
-        # - Fallback to Old Bad
-        take_bad_old = pool_old_bad[:needed_bad]
-        final_selection.extend(take_bad_old)
-
-    # 2. Fill Good (70%)
-    # - Try Recent Good
-    take_good = pool_recent_good[:target_good]
-    final_selection.extend(take_good)
-    needed_good = target_good - len(take_good)
-
-    if needed_good > 0:
-        # - Fallback to Old Good
-        take_good_old = pool_old_good[:needed_good]
-        final_selection.extend(take_good_old)
-
-    # 3. Fill Remainder (if < 10 total) with ANYTHING left
-    # Collect leftovers
-    current_ids = {x["id"] for x in final_selection}
-    leftovers = []
-
-    # Helper to add leftovers
-    for pool in [pool_recent_good, pool_old_good, pool_recent_bad, pool_old_bad]:
-        for item in pool:
-            if item["id"] not in current_ids:
-                leftovers.append(item)
-
-    random.shuffle(leftovers)
-    needed_total = 10 - len(final_selection)
-    if needed_total > 0:
-        final_selection.extend(leftovers[:needed_total])
-
-    # Final Shuffle for display
-    random.shuffle(final_selection)
+    final_selection = pools.seleccionar()
 
     return {
         "testimonios": final_selection,
@@ -1026,31 +696,31 @@ async def get_testimonios():
 @app.get("/api/rating")
 async def get_average_rating():
     """
-    Calcula el promedio de calificaciones visibles.
+    Promedio de calificaciones visibles (agregado en memoria, O(1)).
     """
-    table_calif = get_table("CALIFICACIONES")
-    if not table_calif:
+    if not get_repo("CALIFICACIONES"):
         return {"rating": 5.0, "total": 0}
 
-    # Formula: VISIBLE=TRUE y ESTRELLAS > 0
-    formula = "AND({VISIBLE}=TRUE(), {ESTRELLAS}>0)"
     try:
-        records = table_calif.all(formula=formula, fields=["ESTRELLAS"])
+        return await rating.resumen()
     except Exception as e:
         print(f"Error obteniendo calificaciones: {e}")
         return {"rating": 0, "total": 0}
 
-    if not records:
-        return {"rating": 0, "total": 0}
-
-    total_stars = sum(r["fields"].get("ESTRELLAS", 0) for r in records)
-    count = len(records)
-    if count == 0:
-        return {"rating": 0, "total": 0}
 
-    average = round(total_stars / count, 1)
+@app.get("/api/rating/distribucion")
+async def get_rating_distribution():
+    """
+    Promedio + cantidad de calificaciones visibles por estrellas (5 a 1).
+    """
+    if not get_repo("CALIFICACIONES"):
+        raise HTTPException(status_code=500, detail="Airtable config missing")
 
-    return {"rating": average, "total": count}
+    try:
+        return await rating.distribucion()
+    except Exception as e:
+        print(f"Error obteniendo distribución de calificaciones: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/api/rating")
@@ -1058,8 +728,8 @@ async def save_rating(data: RatingRequest):
     """
     Guarda una nueva calificación. Vincula cliente si existe.
     """
-    table_calif = get_table("CALIFICACIONES")
-    table_clientes = get_table("CLIENTES")
+    table_calif = get_repo("CALIFICACIONES")
+    table_clientes = get_repo("CLIENTES")
 
     if not table_calif:
         raise HTTPException(status_code=500, detail="Airtable config missing")
@@ -1092,12 +762,11 @@ async def save_rating(data: RatingRequest):
 
         if table_clientes and dni_limpio:
             try:
-                # Buscar ID del cliente (Campo numérico, sin comillas)
-                formula = f"{{DNI}}={dni_limpio}"
-                c_records = table_clientes.all(formula=formula, max_records=1)
+                # Buscar ID del cliente en el índice por DNI
+                c_record = await clientes.get(dni_limpio)
 
-                if c_records:
-                    fields["CLIENTE"] = [c_records[0]["id"]]  # Link record
+                if c_record:
+                    fields["CLIENTE"] = [c_record["id"]]  # Link record
                     fields["ES_CLIENTE"] = "Sí"  # Confirmado
                     fields["DNI"] = int(
                         dni_limpio
@@ -1112,11 +781,16 @@ async def save_rating(data: RatingRequest):
                 pass
 
     try:
-        record = table_calif.create(fields)
+        # Alta diferida: se confirma al cliente apenas queda en el journal local;
+        # el agregado de /api/rating se actualiza cuando llega a Airtable
+        escritura_id = await escrituras.encolar("CALIFICACIONES", fields)
+        # recordId llega al enviarse a Airtable: se resuelve con estado_url
         return {
             "status": "success",
             "message": "Calificación registrada correctamente",
-            "recordId": record["id"],
+            "recordId": None,
+            "escrituraId": escritura_id,
+            "estado_url": f"/api/escrituras/{escritura_id}",
             "clienteVinculado": client_linked,
         }
     except Exception as e:
@@ -1136,7 +810,7 @@ async def validate_siniestro(dni: str, patente: str):
     Usa la tabla CLIENTES y el campo ETIQUETA_POLIZA Compilación (de POLIZAS).
     Retorna objeto compatible con app.js Siniestros.
     """
-    table_clientes = get_table("CLIENTES")
+    table_clientes = get_repo("CLIENTES")
 
     if not table_clientes:
         raise HTTPException(status_code=500, detail="Airtable config error")
@@ -1147,135 +821,48 @@ async def validate_siniestro(dni: str, patente: str):
     if not dni_limpio or not patente_limpia:
         return {"valid": False, "message": "Datos incompletos"}
 
-    # 1. Buscar Cliente por DNI
-    formula = f'({{DNI}} & "") = "{dni_limpio}"'
+    # 1. Buscar Cliente por DNI (índice en memoria)
     try:
-        records = table_clientes.all(formula=formula, max_records=1)
+        cliente_record = await clientes.get(dni_limpio)
     except Exception as e:
         print(f"Error buscando cliente: {e}")
         return {"valid": False, "message": "Error validando cliente"}
 
-    if not records:
+    if not cliente_record:
         return {"valid": False, "message": "Cliente no encontrado"}
 
-    cliente = records[0]["fields"]
+    cliente = vista(cliente_record["fields"], "validate_siniestro")
     nombre_completo = (
         cliente.get("NOMBRE COMPLETO") or cliente.get("NOMBRES") or "Cliente"
     )
 
-    # 2. Obtener compilación de pólizas (Lookup)
-    compilacion = cliente.get("ETIQUETA_POLIZA Compilación (de POLIZAS)", [])
-
-    # Manejar si es string o lista
-    if isinstance(compilacion, list):
-        texto_polizas = " | ".join([str(x) for x in compilacion])
-    else:
-        texto_polizas = str(compilacion or "")
-
-    # 3. Verificar si la patente está en el texto de pólizas
-    if patente_limpia not in texto_polizas.upper():
+    # 2. Buscar la póliza de la patente en la vista parseada del cliente
+    poliza = polizas_de_cliente(cliente).buscar(patente_limpia)
+    if not poliza:
         return {
             "valid": False,
             "message": f"No encontramos el vehículo patente {patente_limpia} asociado a tu DNI.",
         }
 
-    # 4. Extraer el bloque completo de la póliza que corresponde a esta patente
-    # El formato puede tener múltiples pólizas separadas por pipes.
-    # Estrategia: Dividir por '|' y agrupar. Un nuevo grupo empieza cuando detectamos un Estado (✅, ❌, ⏳, ⚠️).
-
-    parts = [p.strip() for p in texto_polizas.split("|")]
-    bloques_detectados = []
-    current_bloque = []
-
-    emojis_inicio = ["✅", "❌", "⏳", "⚠️"]
-
-    for part in parts:
-        # Verificar si este fragmento es el inicio de una nueva póliza (tiene emoji de estado)
-        es_inicio = any(e in part for e in emojis_inicio) and (
-            "VENCE" in part or "ANULADA" in part or "BAJA" in part or "ACTIVA" in part
-        )
-
-        # Caso especial: Si es el primer fragmento, siempre empieza bloque
-        if not current_bloque:
-            current_bloque.append(part)
-        elif es_inicio:
-            # Guardar el bloque anterior y empezar uno nuevo
-            bloques_detectados.append(" | ".join(current_bloque))
-            current_bloque = [part]
-        else:
-            # Continuar agregando al bloque actual
-            current_bloque.append(part)
-
-    # Agregar el último bloque procesado
-    if current_bloque:
-        bloques_detectados.append(" | ".join(current_bloque))
-
-    # Buscar cuál de estos bloques contiene la patente
-    bloque_match = None
-    for bloque in bloques_detectados:
-        # Chequeo robusto de patente: que esté la patente y (opcionalmente) el emoji
-        if patente_limpia in bloque.upper():
-            bloque_match = bloque
-            break
-
-    # Fallback si no se encontró (usar todo el texto, aunque sea arriesgado)
-    if not bloque_match:
-        bloque_match = texto_polizas
-
-    # Verificar estado (ANULADA/BAJA) SOLAMENTE en el bloque coincidente
-    if "ANULADA" in bloque_match.upper() or "BAJA" in bloque_match.upper():
+    # 3. Verificar estado (ANULADA/BAJA) SOLAMENTE en el bloque de esa póliza
+    if poliza.inactiva:
         return {
             "valid": False,
             "message": f"La póliza del vehículo {patente_limpia} figura como ANULADA o DE BAJA.",
         }
+    poliza_info = poliza.to_dict()
 
-    # 5. Parsear toda la información de la póliza usando helper
-    parsed_list = parse_poliza_block(bloque_match)
-    # parse_poliza_block retorna una LISTA — tomar el primer elemento
-    poliza_info = (
-        parsed_list[0]
-        if parsed_list
-        else {
-            "numero": "",
-            "patente": patente_limpia,
-            "tipo_vehiculo": "",
-            "categoria": "",
-            "vida": False,
-            "auxilio": False,
-            "estado": "CONSULTAR",
-            "descripcion_completa": bloque_match,
-        }
-    )
-
-    # 6. Obtener Record ID de la Póliza para pre-llenado correcto en Airtable
+    # 4. Obtener Record ID de la Póliza para pre-llenado correcto en Airtable
     # El formulario requiere el ID (rec...) para vincular, no el número de texto.
     record_id_poliza = None
-    ids_polizas = cliente.get("POLIZAS", [])
-
-    if ids_polizas:
-        try:
-            table_polizas = get_table("POLIZAS")
-            if table_polizas:
-                # Iteramos las pólizas del cliente para encontrar la que coincide con la patente
-                # Esto es más seguro que buscar en toda la tabla
-                for pid in ids_polizas:
-                    try:
-                        pol_record = table_polizas.get(pid)
-                        fields_p = pol_record["fields"]
-                        # Buscamos patente en campos clave o etiqueta
-                        # Usamos representación string de campos para asegurar match
-                        str_fields = str(fields_p.values()).upper()
-
-                        if patente_limpia in str_fields:
-                            record_id_poliza = pid
-                            break
-                    except Exception as e:
-                        print(f"Error al analizar póliza con patente_limpia: {e}")
-                        continue
-        except Exception as e:
-            print(f"Error fetching poliza details: {e}")
+    try:
+        record_id_poliza = await resolver_poliza_por_patente(
+            get_repo("POLIZAS"), cliente.get("POLIZAS", []), patente_limpia
+        )
+    except Exception as e:
+        print(f"Error fetching poliza details: {e}")
 
-    # 7. Retornar datos completos
+    # 5. Retornar datos completos
     return {
         "valid": True,
         "cliente": {
@@ -1302,141 +889,58 @@ async def validate_siniestro(dni: str, patente: str):
 
 
 @app.get("/api/config-formularios")
-async def get_config_formularios():
+async def get_config_formularios(request: Request):
     """
     Retorna la configuración completa DYNAMIC para el frontend.
     Estructura: { "slug": { "titulo": "...", "campos": [...] } }
+    Se sirve desde memoria con ETag: el navegador revalida y recibe 304 si no cambió.
     """
-    t_forms = get_table("CONFIG_FORMULARIOS")
-    t_campos = get_table("CONFIG_CAMPOS")
-
-    if not t_forms or not t_campos:
+    if not get_repo("CONFIG_FORMULARIOS") or not get_repo("CONFIG_CAMPOS"):
         raise HTTPException(status_code=500, detail="Airtable config missing")
 
     try:
-        # 1. Traer Todos los Formularios
-        forms_records = t_forms.all()
-
-        # 2. Traer Todos los Campos (Optimizacion: traer todo y filtrar en memoria)
-        campos_records = t_campos.all()
-
-        config_response = {}
-
-        for f_rec in forms_records:
-            f = f_rec["fields"]
-            codigo = f.get("CODIGO")
-            visible = f.get("VISIBILIDAD", False)
-
-            if not codigo or not visible:
-                continue
-
-            form_id = f_rec["id"]
-            form_id_str = str(form_id)
-
-            # Filtrar campos para este formulario
-            # El campo "Formulario" en CONFIG_CAMPOS es un array de IDs [RecID]
-            my_fields = []
-            for c_rec in campos_records:
-                c = c_rec["fields"]
-                linked_forms = c.get("FORMULARIO") or c.get("Formulario", [])
-                # Convertir a strings para comparación robusta
-                linked_forms_str = [str(fid) for fid in linked_forms]
-                if form_id_str in linked_forms_str:
-                    # Mapear a estructura Frontend
-                    campo_front = {
-                        "id": c.get("ID CAMPO"),
-                        "label": c.get("ETIQUETA"),
-                        "type": c.get("TIPO", "text"),
-                        "required": c.get("OBLIGATORIO", False),
-                        # Opcionales
-                        "placeholder": c.get("PLACEHOLDER", ""),
-                        "options": c.get("OPCIONES", "").split(",")
-                        if c.get("OPCIONES")
-                        else [],
-                    }
-                    # NO exponer COLUMNA AIRTABLE al frontend (info interna)
-                    # Limpieza de None
-                    campo_front = {
-                        k: v for k, v in campo_front.items() if v is not None
-                    }
-
-                    # Agregar orden si existe para sortear despues
-                    campo_front["_orden"] = c.get("ORDEN", 999)
-
-                    my_fields.append(campo_front)
-
-            # Ordenar campos
-            my_fields.sort(key=lambda x: x["_orden"])
-
-            # Quitar _orden del output final clean
-            for mf in my_fields:
-                if "_orden" in mf:
-                    del mf["_orden"]
-
-            config_response[codigo] = {
-                "titulo": f.get("TITULO", "Sin Título"),
-                "icono": f.get("ICONO", "fa-file"),
-                "color": f.get("COLOR", "#333"),
-                "campos": my_fields,
-            }
-
-        print("✅ Configuración dinámica servida con éxito.")
-        return config_response
-
+        snapshot = await config_formularios.snapshot()
     except Exception as e:
         print(f"❌ Error sirviendo config: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+    return cached_json_response(request, snapshot.body, snapshot.etag, CONFIG_MAX_AGE)
+
 
 # ==============================================================================
 # CREACIÓN DE SINIESTRO (Python Puro — Sin n8n)
 # ==============================================================================
 
 
-def _generar_id_gestion(tabla_destino: str) -> str:
-    """
-    Genera un ID de gestión único para un siniestro.
-    Formato: SIN-2026-0001 (año + secuencial por tabla)
-    """
-    now = datetime.now()
-    year = now.strftime("%Y")
+def _respuesta_encolada(ticket: str, headers: Optional[dict] = None) -> JSONResponse:
+    return JSONResponse(
+        status_code=202,
+        content={
+            "status": "queued",
+            "ticket": ticket,
+            "estado_url": f"/api/siniestros/{ticket}",
+            "message": "Denuncia recibida. La estamos registrando.",
+        },
+        headers=headers,
+    )
 
-    # Intentar obtener el último ID de la tabla para continuar la secuencia
-    try:
-        t = get_table(tabla_destino)
-        if t:
-            # Buscar registros con ID_GESTION_UNICO que empiece con SIN-{year}
-            records = t.all(
-                formula=f"SEARCH('SIN-{year}', {{ID_GESTION_UNICO}})",
-                fields=["ID_GESTION_UNICO"],
-                sort=["ID_GESTION_UNICO"],
-            )
-            if records:
-                # Extraer el número más alto
-                max_num = 0
-                for r in records:
-                    gid = r["fields"].get("ID_GESTION_UNICO", "")
-                    try:
-                        num = int(gid.split("-")[-1])
-                        if num > max_num:
-                            max_num = num
-                    except Exception as e:
-                        print(f"Error parseando numero de gestión secuencial: {e}")
-                        continue
-                return f"SIN-{year}-{str(max_num + 1).zfill(4)}"
-    except Exception as e:
-        print(f"⚠️ Error generando ID secuencial: {e}")
 
-    # Fallback: timestamp único
-    ts = now.strftime("%m%d%H%M")
-    return f"SIN-{year}-{ts}"
+async def _respuesta_denuncia_previa(ticket: str) -> JSONResponse:
+    """Replay de una denuncia ya recibida: su resultado si terminó, o el mismo ticket si sigue en cola."""
+    headers = {"Idempotent-Replayed": "true"}
+    estado = await cola_siniestros.estado(ticket)
+    if estado and estado["estado"] == "completado" and estado["resultado"]:
+        return JSONResponse(content={**estado["resultado"], "ticket": ticket}, headers=headers)
+    return _respuesta_encolada(ticket, headers=headers)
 
 
 @app.post("/api/create-siniestro")
 async def create_siniestro(request: Request):
     """
-    Crea un registro de siniestro directamente en Airtable.
-    Flujo: Parsea datos → Sube archivos a Drive → Lee config dinámica → Mapea campos → Escribe en Airtable.
+    Recibe una denuncia de siniestro y la encola (respuesta 202 con ticket).
+    Flujo: Parsea datos → Lee config dinámica → Mapea campos → Persiste en la cola.
+    Los workers (procesar_siniestro) suben archivos y escriben en Airtable;
+    el progreso se consulta en /api/siniestros/{ticket}.
     100% Python, sin dependencia de n8n.
     """
     try:
@@ -1465,33 +969,51 @@ async def create_siniestro(request: Request):
             raise HTTPException(status_code=400, detail="JSON de datos inválido")
 
         # ==================================================================
-        # 3. LEER CONFIGURACIÓN DINÁMICA DE AIRTABLE
+        # 2. IDEMPOTENCIA: un reenvío de la misma denuncia no se procesa de nuevo
         # ==================================================================
-        t_forms = get_table("CONFIG_FORMULARIOS")
-        t_campos = get_table("CONFIG_CAMPOS")
+        # Header Idempotency-Key o, si no viene, huella de DNI + formulario + contenido
+        clave_idempotencia = request.headers.get("Idempotency-Key", "").strip()[:200]
+        if clave_idempotencia:
+            clave_idempotencia = f"hdr:{clave_idempotencia}"
+        else:
+            adjuntos = [
+                (key, item)
+                for key in form_data.keys()
+                for item in form_data.getlist(key)
+                if hasattr(item, "filename") and hasattr(item, "read")
+            ]
+            campos = {
+                "tipo_formulario": tipo_formulario,
+                "dni": dni,
+                "poliza_record_id": poliza_record_id,
+                "datos": datos_dict,
+            }
+            clave_idempotencia = "auto:" + await asyncio.to_thread(huella_denuncia, campos, adjuntos)
 
-        if not t_forms or not t_campos:
+        ticket_previo = await cola_siniestros.buscar_clave(clave_idempotencia)
+        if ticket_previo:
+            print(f"🔁 Denuncia repetida ({clave_idempotencia[:24]}…): se devuelve {ticket_previo}")
+            return await _respuesta_denuncia_previa(ticket_previo)
+
+        # ==================================================================
+        # 3. LEER CONFIGURACIÓN DINÁMICA (registro compilado en memoria)
+        # ==================================================================
+        if not get_repo("CONFIG_FORMULARIOS") or not get_repo("CONFIG_CAMPOS"):
             raise HTTPException(
                 status_code=500,
                 detail="Error de configuración: tablas CONFIG no disponibles",
             )
 
         # Buscar el formulario por CODIGO
-        forms_records = t_forms.all()
-        form_record = None
-        for f_rec in forms_records:
-            if f_rec["fields"].get("CODIGO") == tipo_formulario:
-                form_record = f_rec
-                break
-
-        if not form_record:
+        formulario = await config_formularios.formulario(tipo_formulario)
+
+        if not formulario:
             raise HTTPException(
                 status_code=400,
                 detail=f"Formulario '{tipo_formulario}' no encontrado en CONFIG_FORMULARIOS",
             )
 
-        form_id = form_record["id"]
-        tabla_destino = form_record["fields"].get("TABLA RELACIONADA")
+        tabla_destino = formulario.tabla_destino
 
         if not tabla_destino:
             raise HTTPException(
@@ -1504,35 +1026,11 @@ async def create_siniestro(request: Request):
         # ==================================================================
         # 4. MAPEAR DATOS DEL FORMULARIO A COLUMNAS AIRTABLE
         # ==================================================================
-        # Construir mapa: id_campo_frontend → columna_airtable
-        field_map = {}
-        campos_records = t_campos.all()
-
-        print(f"   🔍 DEBUG: form_id='{form_id}' (type: {type(form_id)})")
-
-        for c_rec in campos_records:
-            c = c_rec["fields"]
-            linked_forms = c.get("FORMULARIO") or c.get("Formulario", [])
-            # Debug: asegurar que form_id sea string para comparación
-            form_id_str = str(form_id) if form_id else ""
-            linked_forms_str = [str(fid) for fid in linked_forms]
-
-            print(
-                f"   🔍 DEBUG: Campo '{c.get('ID CAMPO')}' - linked_forms: {linked_forms_str}"
-            )
-
-            if form_id_str in linked_forms_str:
-                id_campo = c.get("ID CAMPO")
-                columna = c.get("COLUMNA AIRTABLE")
-                print(f"   🔍 DEBUG: MATCH! '{id_campo}' -> '{columna}'")
-                if id_campo and columna:
-                    field_map[id_campo] = columna
-
-        print(f"   🗺️ Campos mapeados: {field_map}")
+        # Mapa id_campo_frontend → columna_airtable (precompilado por formulario)
+        field_map = formulario.field_map
 
         # Recolectar archivos para subir después (Airtable Content API requiere Record ID)
         archivos_para_subir = {}  # { columna_airtable: [UploadFile] }
-        archivos_fallidos = []
 
         # Debug: mostrar todas las keys recibidas en form_data
         print(f"   🔍 DEBUG: Keys en form_data: {list(form_data.keys())}")
@@ -1583,7 +1081,7 @@ async def create_siniestro(request: Request):
 
                 if es_archivo and filename:
                     # Encontrar el nombre de columna en Airtable para este campo
-                    columna = field_map.get(key)
+                    columna = formulario.file_columns.get(key) or field_map.get(key)
                     print(f"   🔍 DEBUG: Mapeo encontrado: '{key}' -> '{columna}'")
                     if columna:
                         if columna not in archivos_para_subir:
@@ -1609,26 +1107,6 @@ async def create_siniestro(request: Request):
         if poliza_record_id:
             airtable_payload["POLIZAS"] = [poliza_record_id]
 
-        # ==================================================================
-        # 5. BUSCAR CLIENTE POR DNI Y VINCULAR
-        # ==================================================================
-        if dni:
-            try:
-                t_clientes = get_table("CLIENTES")
-                if t_clientes:
-                    dni_limpio = "".join(filter(str.isdigit, str(dni)))
-                    formula = f'({{DNI}} & "") = "{dni_limpio}"'
-                    cliente_records = t_clientes.all(formula=formula, max_records=1)
-                    if cliente_records:
-                        airtable_payload["CLIENTE"] = [cliente_records[0]["id"]]
-                        print(f"   👤 Cliente vinculado: {cliente_records[0]['id']}")
-            except Exception as e:
-                print(f"   ⚠️ Error buscando cliente: {e}")
-
-        # ==================================================================
-        # 6. AGREGAR CAMPOS AUTOMÁTICOS
-        # ==================================================================
-
         # ID de gestión único ya NO se genera acá porque es un campo FÓRMULA en Airtable
         # Airtable lo genera automáticamente basándose en otros campos vinculados
 
@@ -1639,132 +1117,229 @@ async def create_siniestro(request: Request):
             f"   🏷️  ESTADO_WEB configurado: '{estado_web_valor}' (formato: {'CON espacio' if EstadoWeb.USAR_CON_ESPACIO else 'SIN espacio'})"
         )
 
-        print(f"   📦 Payload Airtable keys: {list(airtable_payload.keys())}")
-
         # ==================================================================
-        # 7. SUBIR ARCHIVOS A IMGBB PRIMERO
+        # 5. ENCOLAR: la denuncia queda persistida y se procesa en segundo plano
         # ==================================================================
-        urls_imagenes = {}  # {columna: [urls]}
-
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            for columna, uploads in archivos_para_subir.items():
-                urls_imagenes[columna] = []
-                for up_file in uploads:
-                    filename = "imagen_desconocida.jpg"
-                    try:
-                        await up_file.seek(0)
-                        content = await up_file.read()
-                        filename = up_file.filename or "imagen.jpg"
-
-                        print(f"🚀 Subiendo a ImgBB: {filename} -> {columna}")
-
-                        # Subir a ImgBB
-                        files = {"image": (filename, content, "image/jpeg")}
-                        data = {"key": "6b042638d61c152b076d88dae24d0200"}
-
-                        resp = await client.post(
-                            "https://api.imgbb.com/1/upload", files=files, data=data
-                        )
+        ticket, nueva = await cola_siniestros.encolar(
+            {
+                "tipo_formulario": tipo_formulario,
+                "tabla_destino": tabla_destino,
+                "dni": dni,
+                "airtable_payload": airtable_payload,
+            },
+            archivos_para_subir,
+            clave=clave_idempotencia,
+        )
+        if not nueva:
+            # Otro envío idéntico ganó la carrera mientras guardábamos este
+            return await _respuesta_denuncia_previa(ticket)
+        print(f"📥 Denuncia encolada: {ticket} ({tipo_formulario})")
 
-                        if resp.status_code == 200:
-                            result = resp.json()
-                            if result.get("success"):
-                                img_url = result["data"]["url"]
-                                urls_imagenes[columna].append(img_url)
-                                print(f"   ✅ ImgBB OK: {filename} -> {img_url}")
-                            else:
-                                print(f"   ❌ ImgBB error: {result}")
-                        else:
-                            print(
-                                f"   ❌ ImgBB HTTP error: {resp.status_code} - {resp.text}"
-                            )
-
-                    except Exception as e:
-                        print(f"   ❌ Excepción subiendo {filename}: {e}")
+        return _respuesta_encolada(ticket)
 
-        # ==================================================================
-        # 8. CREAR REGISTRO EN AIRTABLE CON URLS
-        # ==================================================================
-        # Agregar URLs de imágenes al payload
-        for columna, urls in urls_imagenes.items():
-            if urls:
-                # Airtable requiere [{url: "..."}, ...] para campos adjuntos, NO strings simples
-                airtable_payload[columna] = [{"url": u} for u in urls]
-                print(
-                    f"   📎 URLs agregadas a {columna}: {len(urls)} imágenes → {[u[:40] for u in urls]}"
-                )
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
 
-        t_destino = get_table(tabla_destino)
-        if not t_destino:
-            raise HTTPException(
-                status_code=500,
-                detail=f"No se pudo conectar a la tabla '{tabla_destino}'",
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def _refrescar_portal_cliente(dni: str):
+    """
+    La denuncia nueva quedó vinculada al cliente: se relee su registro (el
+    índice puede tardar hasta su próximo refresco en ver el link) y se
+    descarta el snapshot del portal para que la muestre en la próxima visita.
+    """
+    dni_limpio = normalizar_dni(dni)
+    snapshots_portal.invalidar(dni_limpio)
+    try:
+        cliente_record = await clientes.get(dni_limpio)
+        table_clientes = get_repo("CLIENTES")
+        if cliente_record and table_clientes:
+            clientes.upsert(await table_clientes.get(cliente_record["id"]))
+    except Exception as e:
+        print(f"   ⚠️ No se pudo releer el cliente {dni_limpio} para el portal: {e}")
+
+
+async def procesar_siniestro(trabajo):
+    """
+    Worker de la cola: sube adjuntos, vincula cliente y crea el registro en Airtable.
+    Cada etapa terminada queda guardada en el trabajo, así un reintento no
+    vuelve a subir las imágenes ni a crear el registro.
+    """
+    payload = trabajo.payload
+    tabla_destino = payload["tabla_destino"]
+    airtable_payload = dict(payload["airtable_payload"])
+
+    # ==================================================================
+    # 1. SUBIR ARCHIVOS A IMGBB PRIMERO
+    # ==================================================================
+    if "urls_imagenes" not in trabajo.progreso:
+        # "columna:indice" -> detalle de su última subida; solo se reintentan las que fallaron
+        subidas = dict(trabajo.progreso.get("subidas", {}))
+        archivos = trabajo.abrir_archivos()
+        try:
+            pendientes = {}
+            claves = []
+            for columna, uploads in archivos.items():
+                for i, archivo in enumerate(uploads):
+                    if not subidas.get(f"{columna}:{i}", {}).get("ok"):
+                        pendientes.setdefault(columna, []).append(archivo)
+                        claves.append(f"{columna}:{i}")
+            if pendientes:
+                # En paralelo (con tope por request y global), en streaming desde disco
+                _, detalles = await imgbb.subir_todos(pendientes)
+                subidas.update(zip(claves, detalles))
+        finally:
+            for uploads in archivos.values():
+                for archivo in uploads:
+                    archivo.close()
+
+        fallidas = [d["archivo"] for d in subidas.values() if not d["ok"]]
+        if fallidas and trabajo.intentos < MAX_INTENTOS:
+            # Las que subieron quedan guardadas: el próximo intento sube solo las fallidas
+            await trabajo.guardar_progreso("subiendo_archivos", subidas=subidas)
+            raise RuntimeError(f"No se pudieron subir {len(fallidas)} archivo(s) a ImgBB: {fallidas}")
+
+        # Todo subido (o último intento: se crea la denuncia con lo que haya)
+        urls_imagenes = {columna: [] for columna in archivos}
+        detalle_archivos = []
+        for columna, uploads in archivos.items():
+            for i in range(len(uploads)):
+                detalle = subidas[f"{columna}:{i}"]
+                detalle_archivos.append(detalle)
+                if detalle["ok"]:
+                    urls_imagenes[columna].append(detalle["url"])
+        await trabajo.guardar_progreso(
+            "archivos_subidos", subidas=subidas, urls_imagenes=urls_imagenes, detalle_archivos=detalle_archivos
+        )
+
+    urls_imagenes = trabajo.progreso["urls_imagenes"]
+    detalle_archivos = trabajo.progreso["detalle_archivos"]
+    archivos_fallidos = [d["archivo"] for d in detalle_archivos if not d["ok"]]
+    bytes_ahorrados = sum(d.get("bytes_ahorrados", 0) for d in detalle_archivos)
+    if bytes_ahorrados:
+        print(f"   🗜️ Imágenes optimizadas: {bytes_ahorrados / 1024:.0f} KB ahorrados")
+
+    # ==================================================================
+    # 2. BUSCAR CLIENTE POR DNI Y VINCULAR
+    # ==================================================================
+    if payload.get("dni"):
+        try:
+            cliente_record = await clientes.get(payload["dni"])
+            if cliente_record:
+                airtable_payload["CLIENTE"] = [cliente_record["id"]]
+                print(f"   👤 Cliente vinculado: {cliente_record['id']}")
+        except Exception as e:
+            print(f"   ⚠️ Error buscando cliente: {e}")
+
+    # ==================================================================
+    # 3. CREAR REGISTRO EN AIRTABLE CON URLS
+    # ==================================================================
+    # Agregar URLs de imágenes al payload
+    for columna, urls in urls_imagenes.items():
+        if urls:
+            # Airtable requiere [{url: "..."}, ...] para campos adjuntos, NO strings simples
+            airtable_payload[columna] = [{"url": u} for u in urls]
+            print(
+                f"   📎 URLs agregadas a {columna}: {len(urls)} imágenes → {[u[:40] for u in urls]}"
             )
 
+    print(f"   📦 Payload Airtable keys: {list(airtable_payload.keys())}")
+
+    t_destino = get_repo(tabla_destino)
+    if not t_destino:
+        raise ErrorDefinitivo(f"No se pudo conectar a la tabla '{tabla_destino}'")
+
+    if "record_id" not in trabajo.progreso:
         try:
             # typecast=True para que Airtable convierta tipos automáticamente
             # (ej: string "14" → number 14 si el campo es Number)
-            record = t_destino.create(airtable_payload, typecast=True)
-            record_id = record.get("id", "N/A")
-
-            # Obtener el ID de gestión generado por Airtable (fórmula)
-            # Primero intentar con el nombre exacto confirmado por el usuario: ID_UNICO_GESTION
-            id_gestion = record.get("fields", {}).get("ID_UNICO_GESTION")
-
-            # Si Airtable no devolvió la fórmula inmediatamente al crear, lo buscamos explícitamente
-            if not id_gestion:
-                try:
-                    fetched_record = t_destino.get(record_id)
-                    id_gestion = fetched_record.get("fields", {}).get(
-                        "ID_UNICO_GESTION"
-                    )
-                except:
-                    pass
+            record = await t_destino.create(airtable_payload, typecast=True)
+        except AirtableError as e:
+            print(f"❌ Error creando registro en Airtable: {e}")
+            # Dar info útil para debugging: una columna mal configurada no se arregla reintentando
+            if "Unknown field name" in e.message or "UNKNOWN_FIELD_NAME" in e.message:
+                raise ErrorDefinitivo(
+                    f"Campo no encontrado en tabla '{tabla_destino}'. Verificar COLUMNA AIRTABLE en CONFIG_CAMPOS. Error: {e}"
+                )
+            if e.status_code in (400, 401, 403, 404, 422):
+                raise ErrorDefinitivo(f"Error guardando denuncia: {e}")
+            raise
+        await trabajo.guardar_progreso(
+            "registro_creado",
+            record_id=record.get("id", "N/A"),
+            id_gestion=record.get("fields", {}).get("ID_UNICO_GESTION"),
+        )
 
-            id_gestion = id_gestion or record_id  # Fallback
+    record_id = trabajo.progreso["record_id"]
+    # Obtener el ID de gestión generado por Airtable (fórmula): ID_UNICO_GESTION
+    id_gestion = trabajo.progreso.get("id_gestion")
 
-            print(f"✅ Siniestro creado exitosamente: {record_id} ({id_gestion})")
+    # Si Airtable no devolvió la fórmula inmediatamente al crear, lo buscamos explícitamente
+    if not id_gestion:
+        try:
+            fetched_record = await t_destino.get(record_id)
+            id_gestion = fetched_record.get("fields", {}).get("ID_UNICO_GESTION")
+        except Exception as e:
+            print(f"   ⚠️ No se pudo leer ID_UNICO_GESTION de {record_id}: {e}")
 
-            total_subidos = sum(len(urls) for urls in urls_imagenes.values())
+    id_gestion = id_gestion or record_id  # Fallback
 
-            return {
-                "status": "success",
-                "id": id_gestion,
-                "record_id": record_id,
-                "message": f"Denuncia registrada exitosamente. Tu número de gestión es {id_gestion}.",
-                "archivos_subidos": total_subidos,
-                "archivos_fallidos": archivos_fallidos,
-                "files_status": "ok"
-                if not archivos_fallidos and total_subidos > 0
-                else (
-                    "none"
-                    if total_subidos == 0 and not archivos_fallidos
-                    else "partial"
-                ),
-            }
+    print(f"✅ Siniestro creado exitosamente: {record_id} ({id_gestion})")
 
-        except Exception as e:
-            error_msg = str(e)
-            print(f"❌ Error creando registro en Airtable: {error_msg}")
-
-            # Dar info útil para debugging
-            if "Unknown field name" in error_msg:
-                # Extraer nombre del campo problemático
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Campo no encontrado en tabla '{tabla_destino}'. Verificar COLUMNA AIRTABLE en CONFIG_CAMPOS. Error: {error_msg}",
-                )
-            raise HTTPException(
-                status_code=500, detail=f"Error guardando denuncia: {error_msg}"
-            )
+    if payload.get("dni"):
+        await _refrescar_portal_cliente(payload["dni"])
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        import traceback
+    total_subidos = sum(len(urls) for urls in urls_imagenes.values())
 
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=str(e))
+    return {
+        "status": "success",
+        "id": id_gestion,
+        "record_id": record_id,
+        "message": f"Denuncia registrada exitosamente. Tu número de gestión es {id_gestion}.",
+        "archivos_subidos": total_subidos,
+        "archivos_fallidos": archivos_fallidos,
+        "archivos_detalle": detalle_archivos,
+        "bytes_ahorrados": bytes_ahorrados,
+        "files_status": "ok"
+        if not archivos_fallidos and total_subidos > 0
+        else (
+            "none"
+            if total_subidos == 0 and not archivos_fallidos
+            else "partial"
+        ),
+    }
+
+
+# Cola durable de denuncias (SQLite) procesada por workers en segundo plano
+cola_siniestros = ColaSiniestros(procesar_siniestro)
+
+
+@app.get("/api/siniestros/{ticket}")
+async def estado_siniestro(ticket: str):
+    """
+    Estado de una denuncia encolada: pendiente | procesando | completado | error.
+    Al completarse, 'resultado' trae la misma respuesta que daba create-siniestro.
+    """
+    estado = await cola_siniestros.estado(ticket)
+    if not estado:
+        raise HTTPException(status_code=404, detail="Ticket no encontrado")
+    return estado
+
+
+@app.get("/api/escrituras/{escritura_id}")
+async def estado_escritura(escritura_id: int):
+    """
+    Alta diferida (calificación, turno o escalación): pendiente | enviado | error.
+    Una vez enviada, 'recordId' es el ID del registro creado en Airtable.
+    """
+    estado = await escrituras.estado(escritura_id)
+    if not estado:
+        raise HTTPException(status_code=404, detail="Escritura no encontrada")
+    return estado
 
 
 # ==============================================================================
@@ -1772,72 +1347,77 @@ async def create_siniestro(request: Request):
 # ==============================================================================
 
 
+def _primer_valor(val):
+    """Los lookups de Airtable llegan como lista: se toma el primer elemento."""
+    if isinstance(val, list):
+        return val[0] if val else None
+    return val
+
+
+def _faq_visible(record) -> bool:
+    return bool(_primer_valor(record.get("fields", {}).get("VISIBLE")))
+
+
+def _faq_orden(record) -> int:
+    val = _primer_valor(record.get("fields", {}).get("ORDEN", 999))
+    try:
+        return int(val)
+    except (TypeError, ValueError):
+        return 999
+
+
+def _texto_plano(val, default=""):
+    """Campos de texto que podrían venir como listas (lookups)."""
+    if val is None:
+        return default
+    if isinstance(val, list):
+        return " ".join(map(str, val))
+    return str(val)
+
+
 @app.get("/api/faqs")
+@cached_endpoint("faqs")
 async def get_faqs():
     """
     Retorna las preguntas frecuentes configuradas en Airtable.
     Solo retorna las que tienen VISIBLE = true, ordenadas por ORDEN.
+    Se sirve desde memoria (ver cached_endpoint); esto corre solo al refrescar.
     """
-    print("DEBUG: Iniciando /api/faqs")
     try:
-        table_faqs = get_table("FAQ")
+        table_faqs = get_repo("FAQ")
         if not table_faqs:
             print("ERROR: table_faqs es None")
             raise HTTPException(status_code=500, detail="Tabla FAQ no configurada")
 
         # Traemos todas las FAQs y filtramos en memoria para evitar bugs del SDK con `formula=`
-        all_records = table_faqs.all()
-        
+        all_records = await table_faqs.list(fields=campos("faqs"))
+
         if not isinstance(all_records, list):
             print(f"ERROR: Airtable retornó un tipo inesperado: {type(all_records)}")
             all_records = []
 
-        print(f"DEBUG: Se obtuvieron {len(all_records)} registros crudos")
-
         # Filtrar localmente por campo VISIBLE = true y ordenar por ORDEN (default 999)
-        # Usamos manejo defensivo por si VISIBLE es un dict o lista (lookup)
-        def is_visible(record):
-            val = record.get("fields", {}).get("VISIBLE")
-            if isinstance(val, list) and len(val) > 0:
-                return bool(val[0])
-            return bool(val)
-
-        def get_orden(record):
-            val = record.get("fields", {}).get("ORDEN", 999)
-            if isinstance(val, list) and len(val) > 0:
-                try: return int(val[0])
-                except: return 999
-            try: return int(val)
-            except: return 999
-
-        records = [r for r in all_records if is_visible(r)]
-        records.sort(key=get_orden)
+        records = [r for r in all_records if _faq_visible(r)]
+        records.sort(key=_faq_orden)
 
         faqs = []
         for rec in records:
-            fields = rec.get("fields", {})
-            
-            # Helper para limpiar campos de texto que podrían venir como listas
-            def clean_text(val, default=""):
-                if val is None: return default
-                if isinstance(val, list):
-                    return " ".join(map(str, val))
-                return str(val)
-
+            fields = vista(rec.get("fields"), "faqs")
             faqs.append(
                 {
                     "id": rec["id"],
-                    "pregunta": clean_text(fields.get("PREGUNTA")),
-                    "respuesta": clean_text(fields.get("RESPUESTA")),
-                    "categoria": clean_text(fields.get("CATEGORIA")),
-                    "orden": get_orden(rec),
-                    "icono": clean_text(fields.get("ICONO"), "fa-question-circle"),
+                    "pregunta": _texto_plano(fields.get("PREGUNTA")),
+                    "respuesta": _texto_plano(fields.get("RESPUESTA")),
+                    "categoria": _texto_plano(fields.get("CATEGORIA")),
+                    "orden": _faq_orden(rec),
+                    "icono": _texto_plano(fields.get("ICONO"), "fa-question-circle"),
                 }
             )
 
-        print(f"DEBUG: Retornando {len(faqs)} FAQs visibles")
         return {"status": "success", "faqs": faqs, "total": len(faqs)}
 
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         print(f"❌ Error CRÍTICO obteniendo FAQs: {e}")
@@ -1855,12 +1435,14 @@ async def get_faqs():
 
 
 @app.get("/api/quienes-somos")
+@cached_endpoint("quienes_somos")
 async def get_quienes_somos():
     """
     Retorna la información de Quiénes Somos configurada en Airtable.
     Solo retorna el primer registro que tenga VISIBLE = true.
+    Se sirve desde memoria (ver cached_endpoint).
     """
-    table_qs = get_table("QUIENES_SOMOS")
+    table_qs = get_repo("QUIENES_SOMOS")
 
     if not table_qs:
         raise HTTPException(
@@ -1869,7 +1451,7 @@ async def get_quienes_somos():
 
     try:
         # Sin filtro para evitar errores de compatibilidad
-        records = table_qs.all(max_records=1)
+        records = await table_qs.list(max_records=1, fields=campos("quienes_somos"))
 
         if not records:
             return {
@@ -1878,7 +1460,7 @@ async def get_quienes_somos():
                 "message": "Sección no visible",
             }
 
-        fields = records[0].get("fields", {})
+        fields = vista(records[0].get("fields"), "quienes_somos")
 
         # Procesar foto de perfil
         foto_perfil = fields.get("FOTO PERFIL", [])
@@ -1937,64 +1519,68 @@ async def get_quienes_somos():
 # ==============================================================================
 
 
+# Sufijo entre paréntesis al final del nombre: "Centro (Casa Central)" → "Centro"
+_RE_SUFIJO_PARENTESIS = re.compile(r"\s*\([^)]*\)\s*$")
+
+
+def _valor_texto(fields: dict, key: str, default=""):
+    val = fields.get(key)
+    if val is None:
+        return default
+    if isinstance(val, list):
+        return ", ".join(map(str, val)) if val else default
+    return str(val)
+
+
+def _limpiar_nombre_oficina(name) -> str:
+    if not name:
+        return ""
+    return _RE_SUFIJO_PARENTESIS.sub("", str(name)).strip()
+
+
 @app.get("/api/sucursales")
+@cached_endpoint("sucursales")
 async def get_sucursales():
     """
     Retorna la lista de sucursales configuradas en Airtable.
     Solo retorna las que tienen VISIBLE = true, ordenadas por ORDEN.
+    Se sirve desde memoria (ver cached_endpoint).
     """
-    table_suc = get_table("OFICINAS")
+    table_suc = get_repo("OFICINAS")
 
     if not table_suc:
         raise HTTPException(status_code=500, detail="Tabla OFICINAS no configurada")
 
     try:
-        records = table_suc.all(max_records=50)
+        records = await table_suc.list(max_records=50, fields=campos("sucursales"))
 
         sucursales = []
         for rec in records:
-            fields = rec.get("fields", {})
-            visible = fields.get("VISIBILIDAD", False)
-            if visible:
-
-                def get_val(f_dict, key, default=""):
-                    val = f_dict.get(key)
-                    if val is None:
-                        return default
-                    if isinstance(val, list):
-                        return ", ".join(map(str, val)) if val else default
-                    return str(val)
-
-                google_map_field = fields.get("GOOGLE MAP", "")
-                google_map_url = ""
-                if isinstance(google_map_field, dict):
-                    google_map_url = google_map_field.get("url", "")
-                elif isinstance(google_map_field, str):
-                    google_map_url = google_map_field
-
-                import re
-
-                def clean_name(name):
-                    if not name:
-                        return ""
-                    return re.sub(r"\s*\([^)]*\)\s*$", "", str(name)).strip()
-
-                raw_name = get_val(fields, "NOMBRE_OFICINA_LIMPIO_WEB")
-                if not raw_name:
-                    raw_name = fields.get("OFICINAS", "")
-
-                final_name = clean_name(raw_name)
-
-                sucursales.append(
-                    {
-                        "nombre": final_name,
-                        "direccion": get_val(fields, "DOMICILIO"),
-                        "localidad": get_val(fields, "LOCALIDAD DE OFICINAS"),
-                        "horario": get_val(fields, "HORARIO"),
-                        "googleMap": google_map_url,
-                        "orden": fields.get("ORDEN", 999),
-                    }
-                )
+            fields = vista(rec.get("fields"), "sucursales")
+            if not fields.get("VISIBILIDAD", False):
+                continue
+
+            google_map_field = fields.get("GOOGLE MAP", "")
+            google_map_url = ""
+            if isinstance(google_map_field, dict):
+                google_map_url = google_map_field.get("url", "")
+            elif isinstance(google_map_field, str):
+                google_map_url = google_map_field
+
+            raw_name = _valor_texto(fields, "NOMBRE_OFICINA_LIMPIO_WEB")
+            if not raw_name:
+                raw_name = fields.get("OFICINAS", "")
+
+            sucursales.append(
+                {
+                    "nombre": _limpiar_nombre_oficina(raw_name),
+                    "direccion": _valor_texto(fields, "DOMICILIO"),
+                    "localidad": _valor_texto(fields, "LOCALIDAD DE OFICINAS"),
+                    "horario": _valor_texto(fields, "HORARIO"),
+                    "googleMap": google_map_url,
+                    "orden": fields.get("ORDEN", 999),
+                }
+            )
 
         sucursales.sort(key=lambda x: x.get("orden", 999))
 
@@ -2037,45 +1623,63 @@ class EscalationRequest(BaseModel):
 
 
 @app.post("/chat/validate")
-def validate_chat_client(request: ChatValidationRequest):
-    t_clientes = get_table("CLIENTES")
-    dni_limpio = "".join(filter(str.isdigit, str(request.dni)))
-    records = t_clientes.all(formula=f'({{DNI}} & "") = "{dni_limpio}"', max_records=1)
-    if not records:
+@carril_chat.limitar
+async def validate_chat_client(request: ChatValidationRequest):
+    cliente_record = await clientes.get(request.dni)
+    if not cliente_record:
         return {"status": "error", "message": "DNI no encontrado"}
-    cliente = records[0]["fields"]
+    # Solo los campos declarados para el agente (nunca la contraseña del portal)
+    cliente = proyectar(cliente_record["fields"], "chat_validate")
     return {"status": "success", "cliente": cliente}
 
 
 @app.get("/chat/polizas/{dni}")
-def get_chat_polizas(dni: str):
-    t_clientes = get_table("CLIENTES")
-    dni_limpio = "".join(filter(str.isdigit, str(dni)))
-    records = t_clientes.all(formula=f'({{DNI}} & "") = "{dni_limpio}"', max_records=1)
-    if not records:
+@carril_chat.limitar
+async def get_chat_polizas(dni: str):
+    cliente_record = await clientes.get(dni)
+    if not cliente_record:
         return []
-    return records[0]["fields"].get("ETIQUETA_POLIZA Compilación (de POLIZAS)", [])
+    # Contrato original: el valor crudo de la compilación (en los datos reales, un string)
+    return vista(cliente_record["fields"], "chat_polizas").get(
+        "ETIQUETA_POLIZA Compilación (de POLIZAS)", []
+    )
 
 
 @app.post("/chat/agendar")
-def schedule_appointment(request: AppointmentRequest):
-    t_asesoria = get_table("ASESORIA_ONLINE")
+@carril_chat.limitar
+async def schedule_appointment(request: AppointmentRequest):
+    if not get_repo("ASESORIA_ONLINE"):
+        raise HTTPException(status_code=500, detail="Airtable config missing")
     fields = {
         "DNI": request.dni,
         "FECHA": request.fecha,
         "MOTIVO": request.motivo,
-        "NOTAS": request.notes,
+        "NOTAS": request.notas,
+    }
+    escritura_id = await escrituras.encolar("ASESORIA_ONLINE", fields)
+    return {
+        "status": "accepted",
+        "escrituraId": escritura_id,
+        "estado_url": f"/api/escrituras/{escritura_id}",
+        "fields": fields,
     }
-    return t_asesoria.create(fields)
 
 
 @app.post("/chat/escalar")
-def escalate_issue(request: EscalationRequest):
-    t_gestion = get_table("GESTION_GENERAL")
+@carril_chat.limitar
+async def escalate_issue(request: EscalationRequest):
+    if not get_repo("GESTIÓN GENERAL"):
+        raise HTTPException(status_code=500, detail="Airtable config missing")
     fields = {
         "DNI": request.dni,
         "TIPO GESTION": "ESCALACION IA",
         "NOTAS": f"RAZON: {request.razon} | GRAVEDAD: {request.gravedad}",
         "ESTADO": "NUEVO",
     }
-    return t_gestion.create(fields)
+    escritura_id = await escrituras.encolar("GESTIÓN GENERAL", fields)
+    return {
+        "status": "accepted",
+        "escrituraId": escritura_id,
+        "estado_url": f"/api/escrituras/{escritura_id}",
+        "fields": fields,
+    }
@@ -0,0 +1,262 @@
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+# Cantidad de textos de ETIQUETA_POLIZA distintos que se memorizan ya parseados
+PARSE_CACHE_SIZE = int(os.getenv("POLIZAS_PARSE_CACHE_SIZE", "4096"))
+
+# ==============================================================================
+# PARSER DE ETIQUETA_POLIZA Compilación
+# ==============================================================================
+
+# Un fragmento (entre '|') abre una póliza nueva si tiene emoji de estado Y palabra clave
+_RE_EMOJI_INICIO = re.compile("✅|❌|⏳|⚠️|🟢|🔴|🟣|⭕")
+_RE_KEYWORD_INICIO = re.compile(
+    "VIGENTE|VENCE|ANULADA|BAJA|ACTIVA|SIN VIGENCIA|SIN POLIZAS|TRAMITES"
+)
+
+# N° POL — usar [0-9] en vez de d, [ ] en vez de s
+_RE_NUMERO = re.compile(r"N[°][ ]*POL[:]?[ ]*([0-9]+)", re.IGNORECASE)
+# Fallback: cualquier secuencia de 5+ dígitos
+_RE_NUMERO_FALLBACK = re.compile(r"([0-9]{5,})")
+# Patente con emoji explícito 🏷️ y variante laxa (🏷 sin selector de variación)
+_RE_PATENTE_EXPLICITA = re.compile(r"🏷️[ ]*([A-Z0-9]+)", re.IGNORECASE)
+_RE_PATENTE_LAXA = re.compile(
+    r"🏷️?[ ]*([A-Z]{2,3}[0-9]{3}[A-Z]{0,2}|[A-Z0-9]{6,9})", re.IGNORECASE
+)
+# Tipo de vehículo a continuación del emoji auto/moto/camión
+_RE_TIPO = re.compile(r"[🚗🚙🚛🏍️][ ]+([A-ZÁ-Ú]+)")
+_RE_VENCE = re.compile(r"(VENCE[ ]*[0-9]+[D]?)")
+
+_TIPOS_CLAVE = (
+    "AUTOMOVIL",
+    "AUTO",
+    "CAMIONETA",
+    "MOTO",
+    "CAMION",
+    "UTILITARIO",
+    "PICK UP",
+    "PICKUP",
+)
+
+
+@dataclass(frozen=True)
+class PolizaParseada:
+    """Una póliza extraída de la etiqueta compilada (inmutable: se comparte desde la cache)."""
+
+    numero: str = ""
+    patente: str = ""
+    tipo_vehiculo: str = ""
+    categoria: str = ""
+    vida: bool = False
+    auxilio: bool = False
+    estado: str = ""
+    descripcion_completa: str = ""
+
+    @property
+    def inactiva(self) -> bool:
+        """ANULADA o DE BAJA según el estado parseado (no el resto del bloque)."""
+        estado = self.estado.upper()
+        return "ANULADA" in estado or "BAJA" in estado
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "numero": self.numero,
+            "patente": self.patente,
+            "tipo_vehiculo": self.tipo_vehiculo,
+            "categoria": self.categoria,
+            "vida": self.vida,
+            "auxilio": self.auxilio,
+            "estado": self.estado,
+            "descripcion_completa": self.descripcion_completa,
+        }
+
+
+def _parsear_bloque(bloque: str, bloque_upper: str) -> PolizaParseada:
+    match = _RE_NUMERO.search(bloque) or _RE_NUMERO_FALLBACK.search(bloque)
+    numero = match.group(1) if match else ""
+
+    patente = ""
+    match = _RE_PATENTE_EXPLICITA.search(bloque)
+    if match:
+        patente = match.group(1).upper()
+    else:
+        match = _RE_PATENTE_LAXA.search(bloque)
+        if match:
+            # Evitar falsos positivos tipo "POL..." o fragmentos cortos
+            posible = match.group(1).upper()
+            if len(posible) >= 6 and not posible.startswith("POL"):
+                patente = posible
+
+    tipo_vehiculo = ""
+    match = _RE_TIPO.search(bloque)
+    if match:
+        tipo = match.group(1).strip()
+        if len(tipo) > 2 and tipo != "POL":
+            tipo_vehiculo = tipo
+    if not tipo_vehiculo:
+        tipo_vehiculo = next((t for t in _TIPOS_CLAVE if t in bloque_upper), "")
+
+    estado = ""
+    if "ANULADA" in bloque_upper:
+        estado = "ANULADA"
+    elif "VIGENTE" in bloque_upper:
+        estado = "VIGENTE"
+    elif "SIN VIGENCIA" in bloque_upper:
+        estado = "SIN VIGENCIA"
+    match = _RE_VENCE.search(bloque_upper)
+    if match:
+        estado = match.group(1)
+
+    return PolizaParseada(
+        numero=numero,
+        patente=patente,
+        tipo_vehiculo=tipo_vehiculo,
+        vida="VIDA" in bloque_upper,
+        auxilio="AUX" in bloque_upper or "🆘" in bloque or "🔧" in bloque,
+        estado=estado,
+        descripcion_completa=bloque,
+    )
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parsear_etiqueta(texto: str) -> Tuple[PolizaParseada, ...]:
+    """
+    Parsea un texto de ETIQUETA_POLIZA Compilación en pólizas tipadas.
+
+    Una sola pasada sobre los fragmentos separados por '|': cada fragmento se
+    pasa a mayúsculas una vez y se decide si abre una póliza nueva (emoji de
+    estado + palabra clave). Al cerrar cada bloque se extraen sus datos con
+    regex precompiladas. El resultado queda memorizado por texto (lru_cache).
+    """
+    if not texto:
+        return ()
+
+    polizas = []
+    partes: List[str] = []
+    partes_upper: List[str] = []
+    for fragmento in texto.split("|"):
+        parte = fragmento.strip()
+        parte_upper = parte.upper()
+        es_inicio = bool(
+            _RE_EMOJI_INICIO.search(parte) and _RE_KEYWORD_INICIO.search(parte_upper)
+        )
+        if partes and es_inicio:
+            polizas.append(_parsear_bloque(" | ".join(partes), " | ".join(partes_upper)))
+            partes, partes_upper = [], []
+        partes.append(parte)
+        partes_upper.append(parte_upper)
+
+    polizas.append(_parsear_bloque(" | ".join(partes), " | ".join(partes_upper)))
+    return tuple(polizas)
+
+
+def parse_poliza_block(bloque_texto: str) -> list:
+    """
+    Parsea un bloque de ETIQUETA_POLIZA y extrae toda la información.
+    Soporta múltiples pólizas concatenadas separandolas por emojis de estado o palabras clave.
+    Retorna dicts nuevos en cada llamada (el parseo en sí está memorizado).
+    """
+    return [p.to_dict() for p in parsear_etiqueta(bloque_texto or "")]
+
+
+# ==============================================================================
+# VISTA DE PÓLIZAS POR CLIENTE
+# ==============================================================================
+
+# Lookup en CLIENTES con una etiqueta por póliza vinculada
+CAMPO_COMPILACION = "ETIQUETA_POLIZA Compilación (de POLIZAS)"
+
+
+@dataclass(frozen=True)
+class PolizasCliente:
+    """
+    Pólizas parseadas de un cliente: la única fuente para el matching patente → póliza.
+
+    Se construye una vez por versión de la compilación (polizas_de_cliente) y se
+    comparte entre validar-cliente, validate-siniestro, portal/register y /chat/polizas.
+    """
+
+    etiquetas: Tuple[str, ...]
+    polizas: Tuple[PolizaParseada, ...]
+    por_patente: Dict[str, PolizaParseada]
+
+    def buscar(self, patente: Any) -> Optional[PolizaParseada]:
+        return self.por_patente.get(normalizar_patente(patente))
+
+
+def _etiquetas(compilacion: Any) -> Tuple[str, ...]:
+    if isinstance(compilacion, list):
+        return tuple(str(x) for x in compilacion)
+    return (str(compilacion),) if compilacion else ()
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _vista_polizas(etiquetas: Tuple[str, ...]) -> PolizasCliente:
+    # Cada elemento del lookup es la etiqueta de UNA póliza: se unen con '|' para
+    # que ningún fragmento de una quede pegado al estado de la siguiente
+    polizas = parsear_etiqueta(" | ".join(etiquetas))
+    por_patente: Dict[str, PolizaParseada] = {}
+    for poliza in polizas:
+        patente = normalizar_patente(poliza.patente)
+        if patente:
+            por_patente.setdefault(patente, poliza)
+    return PolizasCliente(etiquetas=etiquetas, polizas=polizas, por_patente=por_patente)
+
+
+def polizas_de_cliente(fields: Dict[str, Any]) -> PolizasCliente:
+    """Vista de pólizas de un registro de CLIENTES (memorizada por contenido de la compilación)."""
+    return _vista_polizas(_etiquetas(fields.get(CAMPO_COMPILACION)))
+
+
+# Campos de POLIZAS necesarios para identificar la póliza de una patente.
+# La patente sale de la ETIQUETA_POLIZA propia de cada póliza (segmento 🏷️):
+# "PATENTE DEL VEHICULO (de GESTIÓN GENERAL) (from CLIENTES)" es un lookup a
+# través de CLIENTES y lista las patentes de TODAS las pólizas del cliente.
+CAMPO_ETIQUETA = "ETIQUETA_POLIZA"
+CAMPOS_RESOLUCION = [CAMPO_ETIQUETA]
+
+
+def normalizar_patente(patente: Any) -> str:
+    return str(patente or "").upper().replace(" ", "").replace("-", "").strip()
+
+
+def _patentes_de_poliza(fields: Dict[str, Any]) -> List[str]:
+    """Patentes de un registro de POLIZAS según su propia etiqueta (parsear_etiqueta)."""
+    etiqueta = fields.get(CAMPO_ETIQUETA) or ""
+    if isinstance(etiqueta, list):
+        etiqueta = " | ".join(str(x) for x in etiqueta)
+    patentes = []
+    for poliza in parsear_etiqueta(str(etiqueta)):
+        patente = normalizar_patente(poliza.patente)
+        if patente and patente not in patentes:
+            patentes.append(patente)
+    return patentes
+
+
+async def resolver_poliza_por_patente(
+    repo_polizas, ids_polizas: List[str], patente: str
+) -> Optional[str]:
+    """
+    Retorna el Record ID (rec...) de la póliza del cliente cuya patente coincide.
+
+    Trae TODAS las pólizas vinculadas en una sola llamada OR(RECORD_ID()=...)
+    (solo la etiqueta) en vez de un GET por póliza, y compara contra la patente
+    de la etiqueta de cada póliza. Si coincide más de una no se adivina: None.
+    """
+    patente_buscada = normalizar_patente(patente)
+    if not repo_polizas or not ids_polizas or not patente_buscada:
+        return None
+
+    registros = await repo_polizas.get_many(ids_polizas, fields=CAMPOS_RESOLUCION)
+    coincidencias = [
+        registro["id"]
+        for registro in registros
+        if patente_buscada in _patentes_de_poliza(registro.get("fields", {}))
+    ]
+    if len(coincidencias) > 1:
+        print(f"⚠️ Patente {patente_buscada} en varias pólizas {coincidencias}: no se vincula ninguna")
+        return None
+    return coincidencias[0] if coincidencias else None
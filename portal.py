@@ -0,0 +1,372 @@
+import asyncio
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    from .proyecciones import RELACIONES_PORTAL, campos, proyeccion
+    from .referencias import (
+        EMP_NAME_KEYS,
+        OFIC_NAME_KEYS,
+        CIA_NAME_KEYS,
+        PROD_NAME_KEYS,
+        _is_airtable_id,
+        _normalize_text,
+        _pick_display_name,
+    )
+except ImportError:
+    from proyecciones import RELACIONES_PORTAL, campos, proyeccion
+    from referencias import (
+        EMP_NAME_KEYS,
+        OFIC_NAME_KEYS,
+        CIA_NAME_KEYS,
+        PROD_NAME_KEYS,
+        _is_airtable_id,
+        _normalize_text,
+        _pick_display_name,
+    )
+
+# Registros por página de gestiones/denuncias en la vista resumida
+PORTAL_PAGE_SIZE = int(os.getenv("PORTAL_PAGE_SIZE", "20"))
+PORTAL_PAGE_SIZE_MAX = 100
+
+VISTA_RESUMEN = "summary"
+VISTA_COMPLETA = "full"
+VISTAS = (VISTA_RESUMEN, VISTA_COMPLETA)
+
+# Tabla (clave de TABLES) de cada sección del portal
+TABLAS_PORTAL = {
+    "polizas": "POLIZAS",
+    "gestiones": "GESTIÓN GENERAL",
+    "accidentes": "DENUNCIA DE ACCIDENTE",
+    "robo_oc": "DENUNCIA ROBO OC",
+    "robo_incendio": "DENUNCIA ROBO / INCENDIO",
+}
+# Historial que crece con los años: se pagina (las pólizas van siempre completas)
+SECCIONES_PAGINADAS = ("gestiones", "accidentes", "robo_oc", "robo_incendio")
+# Secciones que el portal agrupa como "denuncias"
+DENUNCIAS = ("accidentes", "robo_oc", "robo_incendio")
+
+# Campo "last modified time" de las tablas del portal (versión de los snapshots)
+CAMPO_MODIFICACION = "ULTIMA MODIFICACION"
+
+# Campos que el resolver de nombres lee (y reescribe) en cada registro
+CLAVES_OFICINA = ["OFICINAS", "OFICINA", "Sede", "Oficina", "OFICINAS (from CLIENTES)", "OFICINA (from CLIENTES)"]
+CLAVES_ATENDIDO = ["ATENDIDO X", "ATENDIDO X (from CLIENTES)", "Empleado", "Atendido por", "ATENDIDO POR"]
+CLAVES_COMPANIA = ["COMPANIA LINK", "COMPAÑIA", "COMPANIA", "Compañía"]
+CLAVES_PRODUCTO = ["PRODUCTO LINK", "PRODUCTO", "Producto"]
+
+# Vista resumida: lo que Portal-Cliente/portal.js muestra en listas y modales.
+# Los textos largos (p.ej. el análisis de IA) llegan con el detalle del registro.
+proyeccion(
+    "portal_polizas",
+    "POLIZAS",
+    [
+        "ESTADO DE LA POLIZA",
+        "ETIQUETA_POLIZA",
+        "N° DE POLIZA",
+        "PATENTE DEL VEHICULO (de GESTIÓN GENERAL) (from CLIENTES)",
+        "MARCA DEL VEHICULO",
+        "MODELO DEL VEHICULO",
+        "COBERTURA",
+        "FECHA VENCIMIENTO DE LA POLIZA",
+        "COMPANIA LINK",
+        "PRODUCTO LINK",
+        CAMPO_MODIFICACION,
+    ],
+)
+proyeccion(
+    "portal_gestiones",
+    "GESTIÓN GENERAL",
+    [
+        "ID_UNICO_GESTION",
+        "FECHA DE CREACION",
+        "POLIZAS",
+        "MOTIVOS DE LA CONSULTA",
+        "DETALLAR OTROS",
+        "N° DE POLIZA",
+        "PATENTE DEL VEHICULO",
+        "FORMA DE PAGOS",
+        "VIDA",
+        "AUXILIOS",
+        "IMPORTE",
+        "IMPORTE VIDA",
+        "IMPORTE AUX 24",
+        "OFICINAS",
+        "ATENDIDO X",
+        CAMPO_MODIFICACION,
+    ],
+)
+proyeccion(
+    "portal_accidentes",
+    "DENUNCIA DE ACCIDENTE",
+    [
+        "NUMERO DE SINIESTRO",
+        "FECHA DE CREACION",
+        "TIPO DE ATENCIÓN",
+        "CLASIFICACIÓN",
+        "CULPABILIDAD",
+        "TRATAMIENTO",
+        "PATENTE DEL VEHICULO",
+        "MARCA DEL VEHICULO",
+        "MODELO DEL  VEHICULO",
+        "COBERTURA",
+        "OFICINAS",
+        "ATENDIDO X",
+        CAMPO_MODIFICACION,
+    ],
+)
+proyeccion(
+    "portal_robo_oc",
+    "DENUNCIA ROBO OC",
+    [
+        "NUMERO DE SINIESTRO ",
+        "NUMERO",
+        "FECHA DE CREACION",
+        "CLASIFICACIÓN DEL DAÑO",
+        "ALCANCE DE COBERTURA",
+        "TIPO DE ATENCIÓN",
+        "ORDEN PEDIDA A CIA",
+        "VERIFICACION DE ORDEN",
+        "PATENTE DEL VEHICULO (de GESTIÓN GENERAL) (from CLIENTES) Compilación (de N° POLIZA)",
+        "MARCA DEL VEHICULO Compilación (de N° POLIZA)",
+        "MODELO DEL VEHICULO",
+        "COBERTURA",
+        "N° DE POLIZA",
+        "OFICINAS",
+        "ATENDIDO X",
+        CAMPO_MODIFICACION,
+    ],
+)
+proyeccion(
+    "portal_robo_incendio",
+    "DENUNCIA ROBO / INCENDIO",
+    [
+        "FECHA DE CREACION",
+        "CLASIFICACIÓN DEL SINIESTRO",
+        "TIPO DE ATENCIÓN",
+        "ALCANCE DE COBERTURA",
+        "TRATAMIENTO",
+        "OFICINAS",
+        "ATENDIDO X",
+        CAMPO_MODIFICACION,
+    ],
+)
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+def paginar(ids: List[str], cursor: Optional[str], limit: Optional[int]) -> Tuple[List[str], Optional[str]]:
+    """
+    Página de IDs de una relación, de la más nueva a la más vieja.
+
+    Airtable agrega los vínculos nuevos al final del campo link, así que se
+    recorre la lista invertida. El cursor es opaco para el cliente (hoy, la
+    posición de inicio); None en la respuesta = no hay más.
+    """
+    ids = list(reversed(ids or []))
+    inicio = 0
+    if cursor:
+        try:
+            inicio = int(cursor)
+        except ValueError:
+            raise CursorInvalido(cursor)
+        if inicio < 0:
+            raise CursorInvalido(cursor)
+    if limit is None:
+        return ids[inicio:], None
+    fin = inicio + limit
+    return ids[inicio:fin], (str(fin) if fin < len(ids) else None)
+
+
+def limite_pagina(limit: Optional[int], view: str) -> Optional[int]:
+    """Tamaño de página efectivo: la vista completa sin limit conserva el historial entero."""
+    if limit is None:
+        return PORTAL_PAGE_SIZE if view == VISTA_RESUMEN else None
+    return max(1, min(limit, PORTAL_PAGE_SIZE_MAX))
+
+
+def perfil_portal(cliente: Dict[str, Any], dni: str) -> Dict[str, Any]:
+    return {
+        "nombres": cliente.get("NOMBRES", ""),
+        "apellido": cliente.get("APELLIDO", ""),
+        "dni": cliente.get("DNI", dni),
+        "telefono": cliente.get("TELEFONO", ""),
+        "email": cliente.get("EMAIL", ""),
+        "fecha_alta": cliente.get("FECHA DE ALTA", ""),
+        "id_registro": cliente.get("ID_REGISTRO_CLIENTE", ""),
+        # Campos calculados de Airtable
+        "total_polizas": cliente.get("✅ CANTIDAD_POLIZAS", 0),
+        "polizas_activas": cliente.get("🟢 POLIZAS_ACTIVAS", 0),
+        "polizas_anuladas": cliente.get("🔴 POLIZAS_ANULADAS", 0),
+        "polizas_tramite": cliente.get("🟡 POLIZAS_EN_TRAMITES", 0),
+        "polizas_sin_vigencia": cliente.get("🟣 POLIZAS_SIN_VIGENCIA", 0),
+        "vence_30dias": cliente.get("📆 LA_POLIZAS VENCE EN 30 DIAS", 0),
+        "vence_7dias": cliente.get("📆 LA_POLIZAS VENCE EN 7 DIAS", 0),
+    }
+
+
+def relaciones_cliente(cliente: Dict[str, Any]) -> Dict[str, List[str]]:
+    """IDs vinculados desde CLIENTES para cada sección del portal."""
+    return {seccion: cliente.get(campo) or [] for seccion, campo in RELACIONES_PORTAL.items()}
+
+
+class PortalCliente:
+    """
+    Arma las secciones del portal de autogestión a partir del registro de
+    CLIENTES: trae los registros vinculados (resumidos o completos, por páginas)
+    y resuelve los IDs de oficina/empleado/compañía/producto a nombres.
+    """
+
+    def __init__(self, repo_provider: Callable[[str], Any], referencias):
+        # repo_provider(table_key) -> AirtableRepository (o None si no hay config)
+        self.repo_provider = repo_provider
+        self.referencias = referencias
+
+    async def _traer(self, seccion: str, record_ids: List[str], view: str) -> List[Dict[str, Any]]:
+        table = self.repo_provider(TABLAS_PORTAL[seccion])
+        if not table or not record_ids:
+            return []
+        fields = campos(f"portal_{seccion}") if view == VISTA_RESUMEN else None
+        # get_many agrupa los IDs en fórmulas OR(RECORD_ID()=...) de a 50
+        fetched = await table.get_many(record_ids, fields=fields)
+        result = []
+        for f in fetched:
+            # Append the record ID directly to the fields so frontend has it easily
+            f["fields"]["RECORD_ID"] = f["id"]
+            result.append(f["fields"])
+        return result
+
+    async def seccion(
+        self,
+        relaciones: Dict[str, List[str]],
+        seccion: str,
+        view: str = VISTA_COMPLETA,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """
+        (registros, página) de una sección, sin resolver nombres.
+        página es None para las secciones que no se paginan. Propaga los
+        errores de Airtable (quien arma la respuesta decide qué mostrar).
+        """
+        ids = relaciones.get(seccion) or []
+        if seccion not in SECCIONES_PAGINADAS:
+            return await self._traer(seccion, ids, view), None
+        pagina_ids, siguiente = paginar(ids, cursor, limite_pagina(limit, view))
+        records = await self._traer(seccion, pagina_ids, view)
+        return records, {"total": len(ids), "next_cursor": siguiente}
+
+    async def detalle(
+        self, relaciones: Dict[str, List[str]], seccion: str, record_id: str
+    ) -> Optional[Dict[str, Any]]:
+        """Registro completo (todos los campos), solo si está vinculado al cliente."""
+        if record_id not in (relaciones.get(seccion) or []):
+            return None
+        records = await self._traer(seccion, [record_id], VISTA_COMPLETA)
+        if not records:
+            return None
+        await self.resolver([records])
+        return records[0]
+
+    # ------------------------------------------------------------------
+    # RESOLUCIÓN DE LOOKUPS (Mapeo de IDs a Nombres)
+    # ------------------------------------------------------------------
+
+    async def _resolve_record_id(self, table, name_map, rec_id, preferred_keys, label):
+        if not _is_airtable_id(rec_id):
+            return rec_id
+
+        cached = name_map.get(rec_id)
+        if cached:
+            return cached
+
+        if not table:
+            return rec_id
+
+        try:
+            record = await table.get(rec_id)
+            name = _pick_display_name(record.get("fields", {}), preferred_keys)
+            if name:
+                name_map[rec_id] = name
+                return name
+        except Exception as e:
+            print(f"Lookup puntual falló en {label} para {rec_id}: {e}")
+
+        return rec_id
+
+    async def _resolve_value(self, raw_value, table, name_map, preferred_keys, label):
+        if isinstance(raw_value, list):
+            parts = []
+            for item in raw_value:
+                if isinstance(item, str):
+                    parts.append(
+                        await self._resolve_record_id(table, name_map, item, preferred_keys, label)
+                    )
+                else:
+                    txt = _normalize_text(item)
+                    if txt:
+                        parts.append(txt)
+            return ", ".join([p for p in parts if p])
+
+        if isinstance(raw_value, str):
+            return await self._resolve_record_id(table, name_map, raw_value, preferred_keys, label)
+
+        return _normalize_text(raw_value)
+
+    async def resolver(self, listas: List[List[Dict[str, Any]]]):
+        """Reemplaza en el lugar los IDs de oficina/empleado/compañía/producto por nombres."""
+        try:
+            # Mapas compartidos entre requests (cache con TTL), no se descargan por request
+            table_emp = self.repo_provider("EMPLEADOS")
+            table_ofic = self.repo_provider("OFICINAS")
+            table_cia = self.repo_provider("COMPANIA")
+            table_prod = self.repo_provider("PRODUCTOS")
+            emp_map, ofic_map, cia_map, prod_map = await asyncio.gather(
+                self.referencias.name_map("EMPLEADOS"),
+                self.referencias.name_map("OFICINAS"),
+                self.referencias.name_map("COMPANIA"),
+                self.referencias.name_map("PRODUCTOS"),
+            )
+
+            for record_list in listas:
+                for rec in record_list:
+                    # 1. Oficinas
+                    ofic_key = next((k for k in CLAVES_OFICINA if k in rec), None)
+                    if ofic_key:
+                        resolved_ofic = await self._resolve_value(
+                            rec.get(ofic_key), table_ofic, ofic_map, OFIC_NAME_KEYS, "OFICINAS"
+                        )
+                        if resolved_ofic:
+                            rec["OFICINAS"] = resolved_ofic
+                            rec["OFICINA"] = resolved_ofic
+
+                    # 2. Atendido X
+                    aten_key = next((k for k in CLAVES_ATENDIDO if k in rec), None)
+                    if aten_key:
+                        resolved_emp = await self._resolve_value(
+                            rec.get(aten_key), table_emp, emp_map, EMP_NAME_KEYS, "EMPLEADOS"
+                        )
+                        if resolved_emp:
+                            rec["ATENDIDO X"] = resolved_emp
+                            rec["ATENDIDO X (from CLIENTES)"] = resolved_emp
+
+                    # 3. Compañía y Producto
+                    cia_key = next((k for k in CLAVES_COMPANIA if k in rec), None)
+                    if cia_key:
+                        rec["COMPANIA_RESOLVED"] = await self._resolve_value(
+                            rec.get(cia_key), table_cia, cia_map, CIA_NAME_KEYS, "COMPANIA"
+                        )
+
+                    prod_key = next((k for k in CLAVES_PRODUCTO if k in rec), None)
+                    if prod_key:
+                        rec["PRODUCTO_RESOLVED"] = await self._resolve_value(
+                            rec.get(prod_key), table_prod, prod_map, PROD_NAME_KEYS, "PRODUCTOS"
+                        )
+
+        except Exception as e:
+            print(f"Error en resolución crítica de Lookups en backend/portal.py: {e}")
+            import traceback
+
+            traceback.print_exc()
@@ -0,0 +1,257 @@
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+    from .airtable_scheduler import BACKGROUND, prioridad
+    from .clientes_index import OVERLAP, _iso
+    from .portal import CAMPO_MODIFICACION, TABLAS_PORTAL, limite_pagina, relaciones_cliente
+except ImportError:
+    from airtable_scheduler import BACKGROUND, prioridad
+    from clientes_index import OVERLAP, _iso
+    from portal import CAMPO_MODIFICACION, TABLAS_PORTAL, limite_pagina, relaciones_cliente
+
+# Tope de memoria de los snapshots (tamaño del JSON cacheado) y de clientes guardados
+MAX_BYTES = int(float(os.getenv("PORTAL_SNAPSHOT_MAX_MB", "32")) * 1024 * 1024)
+MAX_CLIENTES = int(os.getenv("PORTAL_SNAPSHOT_MAX_CLIENTES", "5000"))
+# Cada cuánto se buscan en Airtable vinculados modificados (segundos, en fondo)
+POLL_INTERVAL = float(os.getenv("PORTAL_SNAPSHOT_POLL", "30"))
+# Vida máxima aunque no se detecten cambios (nombres resueltos, borrados)
+MAX_AGE = float(os.getenv("PORTAL_SNAPSHOT_MAX_AGE", "3600"))
+# Cuánto se recuerda una invalidación (descarta armados que estaban en curso)
+RECORDAR_INVALIDACION = 300
+
+
+def version_cliente(cliente: Dict[str, Any], relaciones: Dict[str, List[str]]) -> Tuple:
+    """
+    ULTIMA MODIFICACION del cliente + sus vínculos: un link nuevo cambia la
+    versión aunque el índice todavía no tenga el timestamp nuevo.
+    """
+    return (cliente.get(CAMPO_MODIFICACION), tuple(tuple(relaciones[s]) for s in sorted(relaciones)))
+
+
+class SnapshotCliente:
+    """Secciones ya armadas (y con nombres resueltos) de un DNI para una versión de su registro."""
+
+    __slots__ = ("version", "partes", "modificados", "bytes", "creado")
+
+    def __init__(self, version: Tuple):
+        self.version = version
+        # (sección, view, límite) → (registros, página)
+        self.partes: Dict[Tuple[str, str, Optional[int]], Tuple[List[Dict[str, Any]], Optional[Dict]]] = {}
+        # record_id vinculado → ULTIMA MODIFICACION de la copia guardada
+        self.modificados: Dict[str, Any] = {}
+        self.bytes = 0
+        self.creado = time.monotonic()
+
+
+class SnapshotsPortal:
+    """
+    Cache LRU por DNI de las secciones del portal (primera página de cada una).
+
+    - Una visita repetida se sirve sin llamar a Airtable: el registro del
+      cliente sale del índice en memoria y las secciones del snapshot.
+    - El snapshot vale mientras no cambie la versión del cliente (ULTIMA
+      MODIFICACION + vínculos) ni la ULTIMA MODIFICACION de sus vinculados:
+      un loop de fondo busca cada POLL_INTERVAL los registros modificados de
+      las tablas del portal y descarta los snapshots que los contienen.
+    - invalidar(dni) lo descarta en el momento (p.ej. al crear una denuncia).
+    - Acotado por MAX_CLIENTES y por MAX_BYTES (tamaño JSON de lo guardado).
+
+    Los registros retornados son compartidos: tratarlos como solo-lectura.
+    """
+
+    def __init__(self, portal, repo_provider, max_bytes: int = MAX_BYTES, max_clientes: int = MAX_CLIENTES):
+        # portal: PortalCliente; repo_provider(table_key) -> AirtableRepository (o None)
+        self.portal = portal
+        self.repo_provider = repo_provider
+        self.max_bytes = max_bytes
+        self.max_clientes = max_clientes
+
+        self._snapshots: "OrderedDict[str, SnapshotCliente]" = OrderedDict()
+        self._dnis_por_id: Dict[str, Set[str]] = {}
+        self._invalidado: Dict[str, float] = {}  # dni → time.monotonic() de la invalidación
+        self._cursores: Dict[str, datetime] = {}  # tabla → hora UTC del último barrido
+        self.bytes = 0
+        self._task: Optional[asyncio.Task] = None
+
+        self.stats = {"hits": 0, "misses": 0, "invalidaciones": 0, "desalojos": 0, "errors": 0}
+
+    # ------------------------------------------------------------------
+    # LRU
+    # ------------------------------------------------------------------
+
+    def _vigente(self, dni: str, version: Tuple) -> Optional[SnapshotCliente]:
+        snap = self._snapshots.get(dni)
+        if snap is None:
+            return None
+        if snap.version != version or time.monotonic() - snap.creado > MAX_AGE:
+            self._quitar(dni)
+            return None
+        self._snapshots.move_to_end(dni)
+        return snap
+
+    def _quitar(self, dni: str):
+        snap = self._snapshots.pop(dni, None)
+        if snap is None:
+            return
+        self.bytes -= snap.bytes
+        for record_id in snap.modificados:
+            dnis = self._dnis_por_id.get(record_id)
+            if dnis:
+                dnis.discard(dni)
+                if not dnis:
+                    del self._dnis_por_id[record_id]
+
+    def _guardar(self, dni, version, clave, records, pagina, desde: float):
+        # Invalidado mientras se armaba: lo armado puede ser anterior al cambio
+        if self._invalidado.get(dni, 0) >= desde:
+            return
+        snap = self._snapshots.get(dni)
+        if snap is None or snap.version != version:
+            self._quitar(dni)
+            snap = self._snapshots[dni] = SnapshotCliente(version)
+        if clave in snap.partes:
+            return
+
+        tamanio = len(json.dumps([records, pagina], default=str))
+        snap.partes[clave] = (records, pagina)
+        snap.bytes += tamanio
+        self.bytes += tamanio
+        for rec in records:
+            record_id = rec.get("RECORD_ID")
+            snap.modificados[record_id] = rec.get(CAMPO_MODIFICACION)
+            self._dnis_por_id.setdefault(record_id, set()).add(dni)
+
+        self._snapshots.move_to_end(dni)
+        while self._snapshots and (self.bytes > self.max_bytes or len(self._snapshots) > self.max_clientes):
+            self._quitar(next(iter(self._snapshots)))
+            self.stats["desalojos"] += 1
+
+    def invalidar(self, dni: str):
+        """Descarta el snapshot del DNI (y lo que se esté armando para él)."""
+        self._invalidado[dni] = time.monotonic()
+        if dni in self._snapshots:
+            self._quitar(dni)
+            self.stats["invalidaciones"] += 1
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+
+    async def secciones(
+        self,
+        dni: str,
+        cliente: Dict[str, Any],
+        view: str,
+        limit: Optional[int] = None,
+        nombres: Optional[Iterable[str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Primera página de las secciones pedidas (default: todas), ya resueltas,
+        + data["paginas"]. Solo se piden a Airtable las que no están en el snapshot.
+        """
+        relaciones = relaciones_cliente(cliente)
+        version = version_cliente(cliente, relaciones)
+        nombres = list(nombres or TABLAS_PORTAL)
+        limite = limite_pagina(limit, view)
+
+        snap = self._vigente(dni, version)
+        partes = {}
+        for seccion in nombres:
+            if snap and (seccion, view, limite) in snap.partes:
+                partes[seccion] = snap.partes[(seccion, view, limite)]
+        faltan = [s for s in nombres if s not in partes]
+
+        if not faltan:
+            self.stats["hits"] += 1
+        else:
+            self.stats["misses"] += 1
+            desde = time.monotonic()
+            # Las secciones (y los bloques de IDs de cada una) se piden en paralelo,
+            # acotadas por el límite global de concurrencia del gateway
+            resultados = await asyncio.gather(
+                *[self.portal.seccion(relaciones, s, view, limit) for s in faltan],
+                return_exceptions=True,
+            )
+            ok = {}
+            for seccion, resultado in zip(faltan, resultados):
+                if isinstance(resultado, Exception):
+                    # Se muestra vacía y no se guarda: el próximo request reintenta
+                    print(f"Error fetching from {TABLAS_PORTAL[seccion]}: {resultado}")
+                    self.stats["errors"] += 1
+                    partes[seccion] = ([], None)
+                else:
+                    ok[seccion] = partes[seccion] = resultado
+            await self.portal.resolver([records for records, _ in ok.values()])
+            for seccion, (records, pagina) in ok.items():
+                self._guardar(dni, version, (seccion, view, limite), records, pagina, desde)
+
+        data: Dict[str, Any] = {s: partes[s][0] for s in nombres}
+        data["paginas"] = {s: partes[s][1] for s in nombres if partes[s][1] is not None}
+        return data
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "clientes": len(self._snapshots),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            **self.stats,
+        }
+
+    # ------------------------------------------------------------------
+    # Loop de fondo: vinculados modificados en Airtable
+    # ------------------------------------------------------------------
+
+    async def _barrer(self, tabla: str):
+        started = datetime.now(timezone.utc)
+        desde = self._cursores.get(tabla)
+        # Sin snapshots no hay nada que invalidar: solo se avanza el cursor
+        if desde is None or not self._dnis_por_id:
+            self._cursores[tabla] = started
+            return
+        repo = self.repo_provider(tabla)
+        if not repo:
+            return
+
+        records = await repo.list(
+            formula=f"IS_AFTER(LAST_MODIFIED_TIME(), '{_iso(desde - OVERLAP)}')",
+            fields=[CAMPO_MODIFICACION],
+        )
+        self._cursores[tabla] = started
+        for record in records:
+            modificado = record.get("fields", {}).get(CAMPO_MODIFICACION)
+            for dni in list(self._dnis_por_id.get(record["id"], ())):
+                snap = self._snapshots.get(dni)
+                # Sin ULTIMA MODIFICACION (campo ausente) cualquier cambio invalida
+                if snap and (modificado is None or snap.modificados.get(record["id"]) != modificado):
+                    self.invalidar(dni)
+
+    async def _run(self):
+        while True:
+            for tabla in dict.fromkeys(TABLAS_PORTAL.values()):
+                try:
+                    with prioridad(BACKGROUND):
+                        await self._barrer(tabla)
+                except Exception as e:
+                    print(f"⚠️ Error buscando cambios en {tabla} para el portal: {e}")
+            corte = time.monotonic() - RECORDAR_INVALIDACION
+            self._invalidado = {dni: t for dni, t in self._invalidado.items() if t >= corte}
+            await asyncio.sleep(POLL_INTERVAL)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,192 @@
+import os
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+    from .polizas import CAMPO_COMPILACION
+except ImportError:
+    from polizas import CAMPO_COMPILACION
+
+# PROYECCION_DEBUG=1: avisa (una vez por campo) cuando el código lee un campo
+# que su proyección no declara (en producción llegaría vacío)
+PROYECCION_DEBUG = os.getenv("PROYECCION_DEBUG", "0") == "1"
+
+
+class Proyeccion:
+    """Campos de `tabla` que lee un consumidor (endpoint, índice, cache)."""
+
+    __slots__ = ("nombre", "tabla", "campos")
+
+    def __init__(self, nombre: str, tabla: str, campos: Iterable[str]):
+        self.nombre = nombre
+        self.tabla = tabla
+        self.campos: Tuple[str, ...] = tuple(dict.fromkeys(campos))
+
+
+PROYECCIONES: Dict[str, Proyeccion] = {}
+
+
+def proyeccion(nombre: str, tabla: str, campos: Iterable[str]) -> Proyeccion:
+    """Declara (o redefine) la proyección de un consumidor."""
+    p = PROYECCIONES[nombre] = Proyeccion(nombre, tabla, campos)
+    return p
+
+
+def campos(nombre: str) -> List[str]:
+    """Lista para `fields=` de AirtableRepository.list/get_many."""
+    return list(PROYECCIONES[nombre].campos)
+
+
+def campos_tabla(tabla: str) -> List[str]:
+    """Unión de las proyecciones de una tabla (lo que guarda un índice compartido)."""
+    union: Dict[str, None] = {}
+    for p in PROYECCIONES.values():
+        if p.tabla == tabla:
+            union.update(dict.fromkeys(p.campos))
+    return list(union)
+
+
+def proyectar(fields: Dict[str, Any], nombre: str) -> Dict[str, Any]:
+    """Copia de fields solo con los campos de la proyección (para respuestas)."""
+    return {k: fields[k] for k in PROYECCIONES[nombre].campos if k in fields}
+
+
+_avisados: Set[Tuple[str, str]] = set()
+
+
+class CamposVigilados(dict):
+    """fields de un registro que avisa cuando se lee un campo fuera de la proyección."""
+
+    __slots__ = ("_proyeccion",)
+
+    def __init__(self, data: Dict[str, Any], p: Proyeccion):
+        super().__init__(data)
+        self._proyeccion = p
+
+    def _vigilar(self, key):
+        p = self._proyeccion
+        if key not in p.campos and (p.nombre, key) not in _avisados:
+            _avisados.add((p.nombre, key))
+            print(f"🔎 Proyección '{p.nombre}' ({p.tabla}): se lee '{key}', que no está declarado")
+
+    def __getitem__(self, key):
+        self._vigilar(key)
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self._vigilar(key)
+        return super().get(key, default)
+
+    def __contains__(self, key):
+        self._vigilar(key)
+        return super().__contains__(key)
+
+
+def vista(fields: Optional[Dict[str, Any]], nombre: str) -> Dict[str, Any]:
+    """fields tal cual; en modo debug, envuelto para detectar lecturas no declaradas."""
+    if fields is None:
+        fields = {}
+    if not PROYECCION_DEBUG:
+        return fields
+    return CamposVigilados(fields, PROYECCIONES[nombre])
+
+
+# ==============================================================================
+# CLIENTES: el índice en memoria guarda la unión de estas proyecciones
+# ==============================================================================
+
+CAMPOS_PERFIL = [
+    "NOMBRES",
+    "APELLIDO",
+    "DNI",
+    "TELEFONO",
+    "EMAIL",
+    "FECHA DE ALTA",
+    "ID_REGISTRO_CLIENTE",
+    "✅ CANTIDAD_POLIZAS",
+    "🟢 POLIZAS_ACTIVAS",
+    "🔴 POLIZAS_ANULADAS",
+    "🟡 POLIZAS_EN_TRAMITES",
+    "🟣 POLIZAS_SIN_VIGENCIA",
+    "📆 LA_POLIZAS VENCE EN 30 DIAS",
+    "📆 LA_POLIZAS VENCE EN 7 DIAS",
+]
+
+# Campos link de CLIENTES hacia cada sección del portal
+RELACIONES_PORTAL = {
+    "polizas": "POLIZAS",
+    "gestiones": "GESTIÓN GENERAL",
+    "accidentes": "DENUNCIA DE ACCIDENTE",
+    "robo_oc": "CARGA DENUNCIA OC (  CRISTALES, CERRADURAS, BATERIA, RUEDAS ) 6",
+    "robo_incendio": "DENUNCIA ROBO TOTAL , INCENDIO  TOTAL/PARCIAL 2",
+}
+
+proyeccion("clientes_indice", "CLIENTES", ["DNI"])
+proyeccion(
+    "validar_cliente",
+    "CLIENTES",
+    ["NOMBRES", "APELLIDO", "NOMBRE COMPLETO", CAMPO_COMPILACION, "POLIZAS"],
+)
+proyeccion(
+    "validate_siniestro",
+    "CLIENTES",
+    ["NOMBRES", "APELLIDO", "NOMBRE COMPLETO", CAMPO_COMPILACION, "POLIZAS"],
+)
+# ULTIMA MODIFICACION: versión del cliente para los snapshots del portal
+proyeccion(
+    "portal_user_data",
+    "CLIENTES",
+    CAMPOS_PERFIL + list(RELACIONES_PORTAL.values()) + ["ULTIMA MODIFICACION"],
+)
+proyeccion("portal_register", "CLIENTES", [CAMPO_COMPILACION])
+proyeccion("portal_login", "CLIENTES", ["CONTRASEÑA PORTAL", "NOMBRES", "APELLIDO", "DNI"])
+# Lo que ve el agente de chat (nunca la contraseña del portal)
+proyeccion(
+    "chat_validate",
+    "CLIENTES",
+    ["DNI", "NOMBRES", "APELLIDO", "NOMBRE COMPLETO", "TELEFONO", "EMAIL", CAMPO_COMPILACION],
+)
+proyeccion("chat_polizas", "CLIENTES", [CAMPO_COMPILACION])
+
+# ==============================================================================
+# Contenido del sitio (CMS)
+# ==============================================================================
+
+proyeccion("faqs", "FAQ", ["VISIBLE", "ORDEN", "PREGUNTA", "RESPUESTA", "CATEGORIA", "ICONO"])
+proyeccion(
+    "quienes_somos",
+    "QUIENES_SOMOS",
+    [
+        "FOTO PERFIL",
+        "IMAGEN FONDO",
+        "VALORES",
+        "TITULO",
+        "SUBTITULO",
+        "TEXTO PRINCIPAL",
+        "NOMBRE RESPONSABLE",
+        "CARGO",
+        "ANIOS EXPERIENCIA",
+        "CANTIDAD CLIENTES",
+        "CANTIDAD SUCURSALES",
+        "CANTIDAD POLIZAS",
+        "MOSTRAR ESTADISTICAS",
+        "MISION",
+        "VISION",
+        "COLOR PRINCIPAL",
+        "COLOR SECUNDARIO",
+        "VIDEO PRESENTACION",
+    ],
+)
+proyeccion(
+    "sucursales",
+    "OFICINAS",
+    [
+        "VISIBILIDAD",
+        "GOOGLE MAP",
+        "NOMBRE_OFICINA_LIMPIO_WEB",
+        "OFICINAS",
+        "DOMICILIO",
+        "LOCALIDAD DE OFICINAS",
+        "HORARIO",
+        "ORDEN",
+    ],
+)
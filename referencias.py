@@ -0,0 +1,129 @@
+import os
+from typing import Any, Callable, Dict
+
+try:
+    from .cache import RefreshingCache
+except ImportError:
+    from cache import RefreshingCache
+
+# TTL de los mapas rec_id → nombre (segundos). Vencido, se sirven y refrescan en fondo.
+REFERENCIAS_TTL = float(os.getenv("REFERENCIAS_TTL", "600"))
+
+# Claves preferidas para el nombre visible de cada tabla de referencia
+EMP_NAME_KEYS = [
+    "NOMBRE Y APELLIDO",
+    "APELLIDO Y NOMBRE",
+    "NOMBRE COMPLETO",
+    "NOMBRE",
+    "Nombre",
+    "USUARIO",
+    "EMPLEADO",
+    "ATENDIDO X",
+]
+OFIC_NAME_KEYS = [
+    "NOMBRE_OFICINA_LIMPIO_WEB",
+    "OFICINAS",
+    "OFICINA",
+    "NOMBRE",
+    "Sede",
+    "SUCURSAL",
+    "AGENCIA",
+]
+CIA_NAME_KEYS = ["NOMBRE", "COMPAÑIA", "COMPANIA", "Compañía"]
+PROD_NAME_KEYS = ["NOMBRE PRODUCTO", "PRODUCTO", "Producto"]
+
+NAME_KEYS = {
+    "EMPLEADOS": EMP_NAME_KEYS,
+    "OFICINAS": OFIC_NAME_KEYS,
+    "COMPANIA": CIA_NAME_KEYS,
+    "PRODUCTOS": PROD_NAME_KEYS,
+}
+
+
+def _is_airtable_id(value):
+    return isinstance(value, str) and value.startswith("rec")
+
+
+def _normalize_text(value):
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        parts = []
+        for item in value:
+            txt = _normalize_text(item)
+            if txt:
+                parts.append(txt)
+        return ", ".join(parts)
+    if isinstance(value, dict):
+        for key in ("name", "label", "value", "text"):
+            txt = _normalize_text(value.get(key))
+            if txt:
+                return txt
+        return ""
+    return str(value).strip()
+
+
+def _looks_human_text(text):
+    if not text or _is_airtable_id(text):
+        return False
+    return any(ch.isalpha() for ch in text)
+
+
+def _pick_display_name(fields, preferred_keys):
+    for key in preferred_keys:
+        txt = _normalize_text(fields.get(key))
+        if _looks_human_text(txt):
+            return txt
+
+    for _, raw in fields.items():
+        txt = _normalize_text(raw)
+        if _looks_human_text(txt):
+            return txt
+
+    return ""
+
+
+class ReferenceNames:
+    """
+    Mapas rec_id → nombre visible de EMPLEADOS, OFICINAS, COMPANIA y PRODUCTOS.
+
+    Cada mapa se construye UNA vez (con las reglas de _pick_display_name) y se
+    reutiliza entre requests; al vencer REFERENCIAS_TTL se sigue sirviendo el
+    mapa anterior mientras se reconstruye en segundo plano. Los contadores de
+    hit/miss quedan en self.cache.stats().
+    """
+
+    def __init__(self, repo_provider: Callable[[str], Any]):
+        # repo_provider(table_key) -> AirtableRepository (o None si no hay config)
+        self.repo_provider = repo_provider
+        self.cache = RefreshingCache("referencias", self._build_name_map, ttl=REFERENCIAS_TTL)
+
+    async def _build_name_map(self, table_key: str) -> Dict[str, str]:
+        table = self.repo_provider(table_key)
+        if not table:
+            return {}
+
+        # Tablas chicas: se traen completas (sin proyección) porque _pick_display_name
+        # recurre a cualquier campo legible si no encuentra una de las claves preferidas.
+        # Un error acá se propaga: la cache conserva el mapa anterior (o falla el miss)
+        records = await table.list()
+
+        preferred_keys = NAME_KEYS[table_key]
+        name_map = {}
+        for rec in records:
+            rec_id = rec.get("id")
+            name = _pick_display_name(rec.get("fields", {}), preferred_keys)
+            if rec_id and name:
+                name_map[rec_id] = name
+        return name_map
+
+    async def name_map(self, table_key: str) -> Dict[str, str]:
+        """Mapa compartido (se puede completar con lookups puntuales, no reemplazar)."""
+        try:
+            return await self.cache.get(table_key)
+        except Exception as e:
+            print(f"Error cargando tabla {table_key} para lookup: {e}")
+            return {}
+
+    def stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
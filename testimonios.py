@@ -0,0 +1,178 @@
+import os
+import random
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    from .cache import RefreshingCache
+    from .proyecciones import campos, proyeccion, vista
+except ImportError:
+    from cache import RefreshingCache
+    from proyecciones import campos, proyeccion, vista
+
+# Cada cuánto se vuelven a leer las CALIFICACIONES publicables (segundos, en fondo)
+TESTIMONIOS_TTL = float(os.getenv("TESTIMONIOS_TTL", "600"))
+# "Reciente" = últimos 90 días
+VENTANA_RECIENTE = 90 * 24 * 60 * 60
+
+# Objetivo: 7 Buenos (>=3 estrellas), 3 Malos/Otros; 10 en total
+OBJETIVO_BUENOS = 7
+OBJETIVO_MALOS = 3
+OBJETIVO_TOTAL = 10
+
+FORMULA_PUBLICABLES = "AND({VISIBLE}=TRUE(), {AUTORIZA_PUBLICAR}=TRUE(), {COMENTARIO}!='')"
+
+proyeccion(
+    "testimonios",
+    "CALIFICACIONES",
+    ["ESTRELLAS", "FECHA DE CREACION", "NOMBRE", "COMENTARIO", "USAR FOTO", "FOTO PERFIL"],
+)
+
+
+def texto_relativo(creado: Optional[float], ahora: float) -> str:
+    """Etiqueta 'Hoy' / 'Hace N días' / ... a partir del timestamp de creación."""
+    if creado is None:
+        return "Reciente"
+    days = int((ahora - creado) // 86400)
+    if days == 0:
+        return "Hoy"
+    elif days == 1:
+        return "Ayer"
+    elif days < 7:
+        return f"Hace {days} días"
+    elif days < 30:
+        return f"Hace {days // 7} semanas"
+    else:
+        return f"Hace {days // 30} meses"
+
+
+def _iniciales(nombre: str) -> str:
+    partes = nombre.strip().split()
+    if not partes:
+        return "?"
+    return (partes[0][0] + (partes[-1][0] if len(partes) > 1 else "")).upper()
+
+
+class Testimonio:
+    """Registro de CALIFICACIONES ya formateado; solo la fecha relativa se arma al servir."""
+
+    __slots__ = ("item", "creado", "estrellas")
+
+    def __init__(self, record: Dict[str, Any]):
+        f = vista(record["fields"], "testimonios")
+        self.estrellas = f.get("ESTRELLAS", 0)
+
+        date_str = f.get("FECHA DE CREACION") or record.get("createdTime")
+        try:
+            # ISO format from Airtable: 2023-10-25T12:00:00.000Z
+            self.creado = datetime.fromisoformat(date_str.replace("Z", "+00:00")).timestamp()
+        except Exception as e:
+            print(f"Error calculando tiempo relativo de testimonio {date_str}: {e}")
+            self.creado = None
+
+        nombre = f.get("NOMBRE", "Anónimo")
+        foto_url = None
+        if f.get("USAR FOTO") and f.get("FOTO PERFIL"):
+            fotos = f.get("FOTO PERFIL")
+            if isinstance(fotos, list) and len(fotos) > 0:
+                foto_url = fotos[0].get("url")
+
+        self.item = {
+            "id": record["id"],
+            "nombre": nombre,
+            "iniciales": _iniciales(nombre),
+            "estrellas": self.estrellas,
+            "comentario": f.get("COMENTARIO", ""),
+            "fotoUrl": foto_url,
+        }
+
+    def to_dict(self, ahora: float) -> Dict[str, Any]:
+        item = dict(self.item)
+        item["fecha"] = texto_relativo(self.creado, ahora)
+        return item
+
+
+class PoolsTestimonios:
+    """Testimonios publicables separados por calificación y antigüedad."""
+
+    def __init__(self, records: List[Dict[str, Any]], ahora: Optional[float] = None):
+        ahora = time.time() if ahora is None else ahora
+        corte = ahora - VENTANA_RECIENTE
+
+        recent_good, recent_bad, old_good, old_bad = [], [], [], []
+        for r in records:
+            t = Testimonio(r)
+            # Sin fecha parseable cuenta como antiguo
+            reciente = t.creado is not None and t.creado >= corte
+            if t.estrellas >= 3:
+                (recent_good if reciente else old_good).append(t)
+            else:
+                (recent_bad if reciente else old_bad).append(t)
+
+        self.recent_good = tuple(recent_good)
+        self.recent_bad = tuple(recent_bad)
+        self.old_good = tuple(old_good)
+        self.old_bad = tuple(old_bad)
+        self.todos = self.recent_good + self.old_good + self.recent_bad + self.old_bad
+
+    def __len__(self) -> int:
+        return len(self.todos)
+
+    @staticmethod
+    def _tomar(preferido: Tuple, respaldo: Tuple, k: int, rng: random.Random) -> List[Testimonio]:
+        elegidos = rng.sample(preferido, min(k, len(preferido)))
+        faltan = k - len(elegidos)
+        if faltan > 0:
+            elegidos.extend(rng.sample(respaldo, min(faltan, len(respaldo))))
+        return elegidos
+
+    def seleccionar(self, rng: random.Random = random, ahora: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Muestra 70/30 priorizando los últimos 3 meses (los antiguos completan el
+        cupo). Si no se llega a OBJETIVO_TOTAL se completa con cualquier sobrante.
+        Solo toca los ~10 elegidos: no recorre ni mezcla los pools completos.
+        """
+        seleccion = self._tomar(self.recent_bad, self.old_bad, OBJETIVO_MALOS, rng)
+        seleccion += self._tomar(self.recent_good, self.old_good, OBJETIVO_BUENOS, rng)
+
+        faltan = min(OBJETIVO_TOTAL, len(self.todos)) - len(seleccion)
+        if faltan > 0:
+            # Muestra uniforme de los sobrantes sin armarlos: se sortean
+            # faltan + len(seleccion) y se descartan los ya elegidos
+            ya = {id(t) for t in seleccion}
+            candidatos = rng.sample(self.todos, min(len(self.todos), faltan + len(seleccion)))
+            seleccion += [t for t in candidatos if id(t) not in ya][:faltan]
+
+        # Mezcla final para mostrar
+        rng.shuffle(seleccion)
+        ahora = time.time() if ahora is None else ahora
+        return [t.to_dict(ahora) for t in seleccion]
+
+
+class TestimoniosCache:
+    """
+    Pools de testimonios materializados en memoria y refrescados en segundo plano
+    cada TESTIMONIOS_TTL segundos; cada request solo hace el muestreo.
+    """
+
+    def __init__(self, repo_provider: Callable[[str], Any]):
+        # repo_provider(table_key) -> AirtableRepository (o None si no hay config)
+        self.repo_provider = repo_provider
+        self.cache = RefreshingCache("testimonios", self._load, ttl=TESTIMONIOS_TTL)
+
+    async def _load(self, _key=None) -> PoolsTestimonios:
+        table_calif = self.repo_provider("CALIFICACIONES")
+        if not table_calif:
+            raise RuntimeError("Airtable config missing")
+        # Traemos TODO (sin filtro de fecha en API) para poder hacer el fallback
+        records = await table_calif.list(formula=FORMULA_PUBLICABLES, fields=campos("testimonios"))
+        pools = PoolsTestimonios(records)
+        print(f"💬 Testimonios: {len(pools)} publicables en memoria")
+        return pools
+
+    async def pools(self) -> PoolsTestimonios:
+        return await self.cache.get()
+
+    def invalidate(self):
+        self.cache.invalidate()
@@ -0,0 +1,59 @@
+import os
+import sys
+import tempfile
+
+import httpx
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, "ejecucion"))
+
+# almacen_local fija DATA_DIR al importarse: las bases SQLite de los tests van a un temporal
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="tests-data-")
+# main lee las credenciales al importarse: las de prueba apuntan al Airtable falso
+os.environ.setdefault("AIRTABLE_API_KEY", "x")
+os.environ.setdefault("AIRTABLE_BASE_ID", "appTEST")
+os.environ.setdefault("IMGBB_API_KEY", "k")
+
+import fake_airtable_server as fake  # noqa: E402
+from airtable_gateway import AirtableGateway  # noqa: E402
+
+TABLAS = {"CLIENTES": "tblClientes", "POLIZAS": "tblPolizas"}
+
+
+class TransporteContado(httpx.AsyncBaseTransport):
+    """Airtable falso en proceso que registra cada request (método, ruta)."""
+
+    def __init__(self):
+        self.inner = httpx.ASGITransport(app=fake.app)
+        self.requests = []
+
+    async def handle_async_request(self, request):
+        self.requests.append((request.method, request.url.path))
+        return await self.inner.handle_async_request(request)
+
+    def contar(self, metodo=None):
+        return sum(1 for m, _ in self.requests if metodo is None or m == metodo)
+
+
+@pytest.fixture
+def transporte():
+    fake.DB.clear()
+    return TransporteContado()
+
+
+@pytest.fixture
+def airtable(transporte):
+    """Gateway contra el Airtable falso en memoria (vacío al empezar cada test)."""
+    return AirtableGateway("x", "appTEST", TABLAS, transport=transporte)
+
+
+@pytest.fixture
+def app_main(transporte):
+    """El módulo main con su gateway apuntando al Airtable falso (sin correr el startup)."""
+    import main
+
+    if main.airtable.transport is None:
+        main.airtable.transport = httpx.ASGITransport(app=fake.app)
+    return main
@@ -0,0 +1,39 @@
+from airtable_gateway import AirtableGateway
+from conftest import TABLAS
+
+
+def test_tablas_comparten_una_sola_sesion():
+    gateway = AirtableGateway("x", "appTEST", TABLAS)
+
+    clientes = gateway.table("CLIENTES")
+    polizas = gateway.table("POLIZAS")
+
+    assert gateway.table("CLIENTES") is clientes
+    assert clientes.session is polizas.session is gateway.session
+    # La clave se traduce con TABLE_MAPPING; una tabla sin mapeo usa su nombre
+    assert clientes.table_name == TABLAS["CLIENTES"]
+    assert gateway.table("FAQ").table_name == "FAQ"
+
+
+def test_repositorios_comparten_cliente_y_planificador(airtable):
+    clientes = airtable.repo("CLIENTES")
+
+    assert airtable.repo("CLIENTES") is clientes
+    assert airtable.repo("POLIZAS").client is clientes.client
+    assert airtable.repo("POLIZAS").scheduler is clientes.scheduler
+
+
+def test_sin_credenciales_no_hay_tablas():
+    gateway = AirtableGateway(None, "appTEST", TABLAS)
+
+    assert not gateway.configured
+    assert gateway.table("CLIENTES") is None
+
+
+def test_close_descarta_la_sesion():
+    gateway = AirtableGateway("x", "appTEST", TABLAS)
+    sesion = gateway.table("CLIENTES").session
+
+    gateway.close()
+
+    assert gateway.table("CLIENTES").session is not sesion
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+import fake_airtable_server as fake
+from airtable_gateway import AirtableGateway
+from airtable_repository import AirtableError
+from conftest import TABLAS
+
+
+def _clientes(cantidad):
+    return [fake.insert(TABLAS["CLIENTES"], {"DNI": i, "NOMBRES": f"N{i}"})["id"] for i in range(cantidad)]
+
+
+def test_list_recorre_todas_las_paginas(airtable, transporte):
+    _clientes(25)
+
+    records = asyncio.run(airtable.repo("CLIENTES").list(page_size=10, fields=["DNI"]))
+
+    assert [r["fields"]["DNI"] for r in records] == list(range(25))
+    assert transporte.contar("POST") == 3
+
+
+def test_get_many_en_bloques_respeta_el_orden(airtable, transporte):
+    ids = _clientes(60)
+    pedidos = list(reversed(ids)) + ["recNOEXISTE"]
+
+    records = asyncio.run(airtable.repo("CLIENTES").get_many(pedidos, fields=["DNI"]))
+
+    assert [r["id"] for r in records] == list(reversed(ids))
+    # 60 IDs → 2 fórmulas OR(RECORD_ID()=...) de hasta 50, no un GET por registro
+    assert transporte.contar() == 2
+
+
+def test_create_many_en_lotes_de_diez(airtable, transporte):
+    creados = asyncio.run(
+        airtable.repo("CLIENTES").create_many([{"DNI": i} for i in range(23)])
+    )
+
+    assert [r["fields"]["DNI"] for r in creados] == list(range(23))
+    assert transporte.contar("POST") == 3
+    assert len(fake.DB[TABLAS["CLIENTES"]]) == 23
+
+
+def test_error_de_airtable_trae_status(airtable):
+    with pytest.raises(AirtableError) as exc:
+        asyncio.run(airtable.repo("CLIENTES").get("recNOEXISTE"))
+    assert exc.value.status_code == 404
+
+
+def test_sin_credenciales_no_hay_repositorio():
+    assert AirtableGateway(None, None, TABLAS).repo("CLIENTES") is None
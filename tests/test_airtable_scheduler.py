@@ -0,0 +1,90 @@
+import asyncio
+import time
+
+import httpx
+
+import airtable_scheduler
+from airtable_gateway import AirtableGateway
+from airtable_scheduler import (
+    BACKGROUND,
+    INTERACTIVE,
+    AirtableScheduler,
+    current_priority,
+    prioridad,
+)
+from conftest import TABLAS
+
+
+def test_rafaga_inmediata_y_luego_a_ritmo():
+    async def escenario():
+        scheduler = AirtableScheduler(rate=50, burst=2, max_concurrency=10)
+        started = time.monotonic()
+        for _ in range(6):
+            async with scheduler.slot():
+                pass
+        return scheduler, time.monotonic() - started
+
+    scheduler, duracion = asyncio.run(escenario())
+    # 2 de ráfaga + 4 a 50 req/s
+    assert duracion >= 4 / 50 * 0.9
+    assert scheduler.admitted == 6
+
+
+def test_interactivos_pasan_antes_que_los_de_fondo():
+    async def escenario():
+        scheduler = AirtableScheduler(rate=20, burst=1, max_concurrency=10)
+        orden = []
+
+        async def pedir(nombre, clase):
+            async with scheduler.slot(clase):
+                orden.append(nombre)
+
+        await pedir("primero", INTERACTIVE)  # consume la ráfaga
+        fondo = [asyncio.ensure_future(pedir(f"fondo{i}", BACKGROUND)) for i in range(2)]
+        await asyncio.sleep(0)
+        usuario = asyncio.ensure_future(pedir("usuario", INTERACTIVE))
+        await asyncio.gather(*fondo, usuario)
+        return orden
+
+    assert asyncio.run(escenario()) == ["primero", "usuario", "fondo0", "fondo1"]
+
+
+def test_prioridad_del_contexto():
+    assert current_priority.get() == INTERACTIVE
+    with prioridad(BACKGROUND):
+        assert current_priority.get() == BACKGROUND
+    assert current_priority.get() == INTERACTIVE
+
+
+def test_backoff_pausa_la_admision(monkeypatch):
+    monkeypatch.setattr(airtable_scheduler, "BACKOFF_BASE", 0.01)
+    scheduler = AirtableScheduler()
+
+    con_header = scheduler.backoff(0, retry_after="0.2")
+    assert 0.2 <= con_header <= 0.21
+    assert scheduler.metrics()["paused_for_s"] > 0.1
+    assert not scheduler._try_take()
+
+    sin_header = scheduler.backoff(3)
+    assert 0 <= sin_header <= 0.01 * 2**3
+    assert scheduler.metrics()["throttled_429"] == 2
+
+
+def test_repositorio_reintenta_los_429(monkeypatch):
+    monkeypatch.setattr(airtable_scheduler, "BACKOFF_BASE", 0.01)
+    respuestas = [httpx.Response(429, headers={"Retry-After": "0"}, json={"error": "rate"})]
+
+    class Transporte(httpx.AsyncBaseTransport):
+        async def handle_async_request(self, request):
+            if respuestas:
+                return respuestas.pop()
+            return httpx.Response(200, json={"records": [{"id": "rec1", "fields": {}}]})
+
+    async def escenario():
+        gateway = AirtableGateway("x", "appTEST", TABLAS, transport=Transporte())
+        repo = gateway.repo("CLIENTES")
+        return await repo.list(), repo.scheduler
+
+    records, scheduler = asyncio.run(escenario())
+    assert [r["id"] for r in records] == ["rec1"]
+    assert scheduler.retries == 1
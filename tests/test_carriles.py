@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from carriles import Carril
+
+
+def _carril(**kwargs):
+    opciones = {"max_concurrencia": 2, "max_cola": 2, "espera_max": 1.0}
+    opciones.update(kwargs)
+    return Carril("test", **opciones)
+
+
+def test_cola_llena_responde_503():
+    async def escenario():
+        carril = _carril()
+        liberar = asyncio.Event()
+
+        @carril.limitar
+        async def endpoint():
+            await liberar.wait()
+            return "ok"
+
+        tareas = [asyncio.ensure_future(endpoint()) for _ in range(4)]
+        await asyncio.sleep(0.01)  # 2 corriendo + 2 en cola
+        assert (carril.en_curso, carril.en_cola) == (2, 2)
+
+        with pytest.raises(HTTPException) as exc:
+            await endpoint()
+        assert exc.value.status_code == 503
+        assert exc.value.headers["Retry-After"]
+
+        liberar.set()
+        assert await asyncio.gather(*tareas) == ["ok"] * 4
+        return carril
+
+    carril = asyncio.run(escenario())
+    metricas = carril.metricas()
+    assert metricas["atendidos"] == 4
+    assert metricas["rechazados_503"] == 1
+    assert (carril.en_curso, carril.en_cola) == (0, 0)
+
+
+def test_espera_vencida_responde_503_sin_perder_permisos():
+    async def escenario():
+        carril = _carril(max_concurrencia=1, max_cola=10, espera_max=0.05)
+        liberar = asyncio.Event()
+
+        @carril.limitar
+        async def lento():
+            await liberar.wait()
+
+        ocupado = asyncio.ensure_future(lento())
+        await asyncio.sleep(0.01)
+        with pytest.raises(HTTPException) as exc:
+            await lento()
+        assert exc.value.status_code == 503
+
+        liberar.set()
+        await ocupado
+        return carril
+
+    carril = asyncio.run(escenario())
+    assert carril.rechazados == 1
+    assert carril.en_cola == 0
+    assert carril.semaforo._value == carril.max_concurrencia
+
+
+def test_timeouts_en_carrera_con_liberaciones_no_achican_el_carril():
+    async def escenario():
+        carril = _carril(max_concurrencia=2, max_cola=1000, espera_max=0.002)
+
+        @carril.limitar
+        async def endpoint():
+            await asyncio.sleep(0.002)
+
+        async def pedir():
+            try:
+                await endpoint()
+            except HTTPException:
+                pass
+
+        for _ in range(5):
+            await asyncio.gather(*[pedir() for _ in range(100)])
+        return carril
+
+    carril = asyncio.run(escenario())
+    assert carril.atendidos + carril.rechazados == 500
+    assert carril.semaforo._value == carril.max_concurrencia
+    assert (carril.en_curso, carril.en_cola) == (0, 0)
@@ -0,0 +1,105 @@
+import asyncio
+
+import fake_airtable_server as fake
+from clientes_index import ClientIndex, normalizar_dni
+from conftest import TABLAS
+
+COMPILACION = "ETIQUETA_POLIZA Compilación (de POLIZAS)"
+VIEJO = "2020-01-01T00:00:00.000Z"
+
+
+def _indice(airtable):
+    return ClientIndex(
+        lambda: airtable.repo("CLIENTES"),
+        fields=["DNI", "NOMBRES", COMPILACION],
+        polizas_provider=lambda: airtable.repo("POLIZAS"),
+    )
+
+
+def _envejecer():
+    # Fuera de la ventana incremental (cursor - OVERLAP)
+    for tabla in fake.DB.values():
+        for record in tabla.values():
+            record["_modified"] = VIEJO
+
+
+def _editar(tabla, record_id, **fields):
+    record = fake.DB[tabla][record_id]
+    record["fields"].update(fields)
+    record["_modified"] = fake._now_iso()
+
+
+def test_normalizar_dni():
+    assert normalizar_dni(20015207.0) == "20015207"
+    assert normalizar_dni("20.015.207") == "20015207"
+    assert normalizar_dni(None) == ""
+
+
+def test_busca_por_dni_desde_memoria(airtable, transporte):
+    fake.insert(TABLAS["CLIENTES"], {"DNI": 20015207, "NOMBRES": "Juan", "CONTRASEÑA PORTAL": "x"})
+    indice = _indice(airtable)
+
+    async def escenario():
+        await indice.refresh()
+        pedidos = transporte.contar()
+        encontrado = await indice.get("20.015.207")
+        ausente = await indice.get("1")
+        return encontrado, ausente, transporte.contar() - pedidos
+
+    encontrado, ausente, pedidos_extra = asyncio.run(escenario())
+    assert encontrado["fields"]["NOMBRES"] == "Juan"
+    # Solo guarda la proyección
+    assert "CONTRASEÑA PORTAL" not in encontrado["fields"]
+    assert ausente is None
+    assert pedidos_extra == 0
+
+
+def test_refresh_incremental_trae_solo_lo_modificado(airtable):
+    a = fake.insert(TABLAS["CLIENTES"], {"DNI": 1, "NOMBRES": "Ana"})
+    fake.insert(TABLAS["CLIENTES"], {"DNI": 2, "NOMBRES": "Beto"})
+    indice = _indice(airtable)
+
+    async def escenario():
+        await indice.refresh()
+        _envejecer()
+        _editar(TABLAS["CLIENTES"], a["id"], NOMBRES="Ana María", DNI=3)
+        await indice.refresh(force_full=False)
+        return await indice.get("1"), await indice.get("3"), await indice.get("2")
+
+    anterior, actual, sin_cambios = asyncio.run(escenario())
+    assert anterior is None  # cambió de DNI: la clave vieja se quita
+    assert actual["fields"]["NOMBRES"] == "Ana María"
+    assert sin_cambios["fields"]["NOMBRES"] == "Beto"
+    assert indice.stats["full_loads"] == 1
+    assert indice.stats["refreshes"] == 1
+
+
+def test_cambio_en_poliza_refresca_la_compilacion_del_cliente(airtable):
+    cliente = fake.insert(TABLAS["CLIENTES"], {"DNI": 1, COMPILACION: ["✅ 🟢 VIGENTE | 🏷️ AAA111"]})
+    poliza = fake.insert(TABLAS["POLIZAS"], {"CLIENTES": [cliente["id"]]})
+    indice = _indice(airtable)
+
+    async def escenario():
+        await indice.refresh()
+        _envejecer()
+        # El lookup cambia en CLIENTES sin mover su LAST_MODIFIED_TIME()
+        fake.DB[TABLAS["CLIENTES"]][cliente["id"]]["fields"][COMPILACION] = ["✅ 🔴 ANULADA | 🏷️ AAA111"]
+        _editar(TABLAS["POLIZAS"], poliza["id"], **{"ESTADO DE LA POLIZA": "ANULADA"})
+        await indice.refresh()
+        return await indice.get("1")
+
+    assert asyncio.run(escenario())["fields"][COMPILACION] == ["✅ 🔴 ANULADA | 🏷️ AAA111"]
+
+
+def test_error_de_airtable_sirve_la_ultima_version(airtable):
+    fake.insert(TABLAS["CLIENTES"], {"DNI": 1, "NOMBRES": "Ana"})
+    indice = _indice(airtable)
+
+    async def escenario():
+        await indice.refresh()
+        indice.repo_provider = lambda: None  # Airtable no disponible
+        indice._synced_at = 1  # índice vencido: get() intenta refrescar
+        return await indice.get("1")
+
+    assert asyncio.run(escenario())["fields"]["NOMBRES"] == "Ana"
+    assert indice.stats["errors"] == 1
@@ -0,0 +1,172 @@
+import asyncio
+import io
+import os
+
+import httpx
+
+import cola_siniestros
+import fake_airtable_server as fake
+from adjuntos import ImgbbUploader
+from cola_siniestros import COMPLETADO, MAX_INTENTOS, PROCESANDO, ColaSiniestros, Trabajo
+
+
+def _cola(tmp_path, procesador=None):
+    async def sin_cambios(trabajo):
+        return {"ok": True}
+
+    return ColaSiniestros(
+        procesador or sin_cambios,
+        db_path=os.path.join(tmp_path, "siniestros.db"),
+        dir_archivos=os.path.join(tmp_path, "adjuntos"),
+        workers=1,
+    )
+
+
+def _estado(cola, ticket):
+    return asyncio.run(cola.estado(ticket))
+
+
+class _Adjunto:
+    def __init__(self, filename):
+        self.filename = filename
+        self.content_type = "image/jpeg"
+        self.file = io.BytesIO(filename.encode())
+
+
+def _fila(cola, ticket):
+    return cola._ejecutar_sync("SELECT * FROM trabajos WHERE ticket=?", (ticket,))[0]
+
+
+def test_trabajo_tomado_no_se_retoma_mientras_dura_el_lease(tmp_path):
+    cola = _cola(str(tmp_path))
+    ticket, nuevo = asyncio.run(cola.encolar({"dni": "1"}, {}))
+    assert nuevo
+
+    row = cola._tomar_sync()
+    assert row["ticket"] == ticket
+    assert cola._tomar_sync() is None
+    assert _estado(cola, ticket)["estado"] == PROCESANDO
+
+
+def test_lease_vencido_devuelve_el_trabajo_a_la_cola(tmp_path, monkeypatch):
+    cola = _cola(str(tmp_path))
+    ticket, _ = asyncio.run(cola.encolar({"dni": "1"}, {}))
+
+    monkeypatch.setattr(cola_siniestros, "LEASE", -1)  # el worker "se cae" sin renovar
+    primero = cola._tomar_sync()
+    segundo = cola._tomar_sync()
+
+    assert segundo["ticket"] == ticket
+    assert (primero["intentos"], segundo["intentos"]) == (1, 2)
+
+
+def test_worker_con_lease_perdido_no_pisa_al_nuevo(tmp_path, monkeypatch):
+    cola = _cola(str(tmp_path))
+    ticket, _ = asyncio.run(cola.encolar({"dni": "1"}, {}))
+
+    monkeypatch.setattr(cola_siniestros, "LEASE", -1)
+    viejo = Trabajo(cola, cola._tomar_sync())
+    monkeypatch.setattr(cola_siniestros, "LEASE", 300)
+    nuevo = Trabajo(cola, cola._tomar_sync())
+
+    asyncio.run(viejo.guardar_progreso("registro_creado", record_id="recVIEJO"))
+    assert not cola._renovar_sync(ticket, viejo.intentos)
+    assert cola._renovar_sync(ticket, nuevo.intentos)
+    assert _estado(cola, ticket)["etapa"] == "recibido"
+
+
+def test_latido_mantiene_el_lease_de_un_procesamiento_lento(tmp_path, monkeypatch):
+    monkeypatch.setattr(cola_siniestros, "LEASE", 0.2)
+    monkeypatch.setattr(cola_siniestros, "LATIDO", 0.05)
+
+    async def escenario():
+        async def lento(trabajo):
+            await asyncio.sleep(0.5)  # más que el lease: solo sigue vigente por el latido
+            return {"ok": True}
+
+        cola = _cola(str(tmp_path), lento)
+        ticket, _ = await cola.encolar({"dni": "1"}, {})
+        procesando = asyncio.ensure_future(
+            cola._procesar(Trabajo(cola, await asyncio.to_thread(cola._tomar_sync)))
+        )
+        await asyncio.sleep(0.35)
+        retomado = await asyncio.to_thread(cola._tomar_sync)
+        await procesando
+        return retomado, await cola.estado(ticket)
+
+    retomado, estado = asyncio.run(escenario())
+    assert retomado is None
+    assert estado["estado"] == COMPLETADO
+    assert estado["intentos"] == 1
+
+
+def test_worker_con_lease_perdido_no_cierra_el_trabajo_ajeno(tmp_path, monkeypatch):
+    cola = _cola(str(tmp_path))
+    ticket, _ = asyncio.run(cola.encolar({"dni": "1"}, {"FOTOS": [_Adjunto("a.jpg")]}))
+
+    monkeypatch.setattr(cola_siniestros, "LEASE", -1)
+    viejo = Trabajo(cola, cola._tomar_sync())
+    monkeypatch.setattr(cola_siniestros, "LEASE", 300)
+    nuevo = Trabajo(cola, cola._tomar_sync())
+
+    asyncio.run(cola._terminar(viejo, COMPLETADO, resultado={"id": "viejo"}))
+    assert _estado(cola, ticket)["estado"] == PROCESANDO
+    # Los adjuntos siguen ahí para el nuevo dueño
+    assert os.path.exists(nuevo.payload["archivos"]["FOTOS"][0]["path"])
+
+    asyncio.run(cola._terminar(nuevo, COMPLETADO, resultado={"id": "nuevo"}))
+    assert _estado(cola, ticket)["estado"] == COMPLETADO
+    assert not os.path.exists(os.path.join(cola.dir_archivos, ticket))
+
+
+def test_reintento_sube_solo_las_imagenes_que_fallaron(tmp_path, monkeypatch, app_main):
+    subidas = []
+
+    class ImgBB(httpx.AsyncBaseTransport):
+        async def handle_async_request(self, request):
+            nombre = "b.jpg" if b'filename="b.jpg"' in await request.aread() else "a.jpg"
+            subidas.append(nombre)
+            if nombre == "b.jpg" and subidas.count("b.jpg") == 1:
+                return httpx.Response(500, text="caído")
+            return httpx.Response(200, json={"success": True, "data": {"url": f"https://i.ibb.co/{nombre}"}})
+
+    monkeypatch.setattr(app_main, "imgbb", ImgbbUploader(transport=ImgBB(), api_key="k"))
+    cola = _cola(str(tmp_path), app_main.procesar_siniestro)
+    payload = {"tabla_destino": "DENUNCIA DE ACCIDENTE", "airtable_payload": {"RELATO": "choque"}}
+    ticket, _ = asyncio.run(cola.encolar(payload, {"FOTOS": [_Adjunto("a.jpg"), _Adjunto("b.jpg")]}))
+    cola._tomar_sync()
+
+    try:
+        asyncio.run(app_main.procesar_siniestro(Trabajo(cola, _fila(cola, ticket))))
+    except RuntimeError as e:
+        assert "b.jpg" in str(e)
+    else:
+        raise AssertionError("con una imagen fallida y reintentos disponibles no se crea la denuncia")
+    assert not fake.DB.get("DENUNCIA DE ACCIDENTE")
+
+    resultado = asyncio.run(app_main.procesar_siniestro(Trabajo(cola, _fila(cola, ticket))))
+
+    assert subidas == ["a.jpg", "b.jpg", "b.jpg"]
+    assert resultado["files_status"] == "ok"
+    (record,) = fake.DB["DENUNCIA DE ACCIDENTE"].values()
+    assert [f["url"] for f in record["fields"]["FOTOS"]] == ["https://i.ibb.co/a.jpg", "https://i.ibb.co/b.jpg"]
+
+
+def test_ultimo_intento_acepta_la_subida_parcial(tmp_path, monkeypatch, app_main):
+    class ImgBB(httpx.AsyncBaseTransport):
+        async def handle_async_request(self, request):
+            return httpx.Response(500, text="caído")
+
+    monkeypatch.setattr(app_main, "imgbb", ImgbbUploader(transport=ImgBB(), api_key="k"))
+    cola = _cola(str(tmp_path), app_main.procesar_siniestro)
+    payload = {"tabla_destino": "DENUNCIA DE ACCIDENTE", "airtable_payload": {"RELATO": "choque"}}
+    ticket, _ = asyncio.run(cola.encolar(payload, {"FOTOS": [_Adjunto("a.jpg")]}))
+    cola._tomar_sync()
+    trabajo = Trabajo(cola, _fila(cola, ticket))
+    trabajo.intentos = MAX_INTENTOS
+    cola._ejecutar_sync("UPDATE trabajos SET intentos=? WHERE ticket=?", (MAX_INTENTOS, ticket))
+
+    resultado = asyncio.run(app_main.procesar_siniestro(trabajo))
+
+    assert resultado["archivos_fallidos"] == ["a.jpg"]
+    assert len(fake.DB["DENUNCIA DE ACCIDENTE"]) == 1
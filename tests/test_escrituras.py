@@ -0,0 +1,120 @@
+import asyncio
+import json
+import os
+
+import httpx
+
+import escrituras
+import fake_airtable_server as fake
+from airtable_gateway import AirtableGateway
+from almacen_local import conectar
+from conftest import TABLAS, TransporteContado
+from escrituras import ENVIADO, ERROR, PENDIENTE, EscriturasDiferidas
+
+
+class TransporteConFallas(TransporteContado):
+    """Rechaza (422) los lotes con un registro MALO y contesta 503 las primeras `caidas` veces."""
+
+    def __init__(self, caidas=0):
+        super().__init__()
+        self.caidas = caidas
+
+    async def handle_async_request(self, request):
+        if request.method == "POST" and "listRecords" not in request.url.path:
+            records = json.loads(await request.aread()).get("records", [])
+            if self.caidas:
+                self.caidas -= 1
+                self.requests.append((request.method, request.url.path))
+                return httpx.Response(503, json={"error": "SERVICE_UNAVAILABLE"})
+            if any("MALO" in r["fields"] for r in records):
+                self.requests.append((request.method, request.url.path))
+                return httpx.Response(422, json={"error": {"type": "INVALID_VALUE_FOR_COLUMN"}})
+        return await super().handle_async_request(request)
+
+
+def _journal(tmp_path, transporte):
+    gateway = AirtableGateway("x", "appTEST", TABLAS, transport=transporte)
+    return EscriturasDiferidas(gateway.repo, db_path=os.path.join(tmp_path, "escrituras.db"))
+
+
+def _vaciar(journal):
+    """Envía todo lo que esté listo (lo que hace el flusher de fondo)."""
+    while True:
+        tabla, rows, _ = journal._tomar_lote_sync()
+        if tabla is None:
+            return
+        asyncio.run(journal._enviar(tabla, rows))
+
+
+def test_agrupa_en_lotes_y_resuelve_el_record_id(tmp_path, monkeypatch):
+    fake.DB.clear()
+    transporte = TransporteContado()
+    journal = _journal(str(tmp_path), transporte)
+    creados = []
+    journal.al_crear("CALIFICACIONES", creados.append)
+    ids = [asyncio.run(journal.encolar("CALIFICACIONES", {"ESTRELLAS": i})) for i in range(12)]
+
+    # 10 salen ya; los 2 restantes esperan a FLUSH_MS
+    tabla, lote, _ = journal._tomar_lote_sync()
+    asyncio.run(journal._enviar(tabla, lote))
+    assert journal._tomar_lote_sync()[0] is None
+    monkeypatch.setattr(escrituras, "FLUSH_MS", 0)
+    _vaciar(journal)
+
+    assert len(lote) == 10
+    assert transporte.contar("POST") == 2
+    estado = asyncio.run(journal.estado(ids[0]))
+    assert estado["estado"] == ENVIADO
+    assert fake.DB["CALIFICACIONES"][estado["recordId"]]["fields"] == {"ESTRELLAS": 0}
+    assert len(creados) == 12
+
+
+def test_lote_rechazado_aisla_el_registro_invalido(tmp_path, monkeypatch):
+    fake.DB.clear()
+    monkeypatch.setattr(escrituras, "FLUSH_MS", 0)
+    journal = _journal(str(tmp_path), TransporteConFallas())
+    bien = asyncio.run(journal.encolar("CALIFICACIONES", {"ESTRELLAS": 5}))
+    malo = asyncio.run(journal.encolar("CALIFICACIONES", {"MALO": True}))
+    otro = asyncio.run(journal.encolar("CALIFICACIONES", {"ESTRELLAS": 4}))
+
+    _vaciar(journal)
+
+    assert [asyncio.run(journal.estado(i))["estado"] for i in (bien, malo, otro)] == [ENVIADO, ERROR, ENVIADO]
+    assert "422" in asyncio.run(journal.estado(malo))["error"]
+    assert len(fake.DB["CALIFICACIONES"]) == 2
+
+
+def test_error_transitorio_se_reintenta(tmp_path, monkeypatch):
+    fake.DB.clear()
+    monkeypatch.setattr(escrituras, "FLUSH_MS", 0)
+    monkeypatch.setattr(escrituras, "BACKOFF_BASE", 0)
+    journal = _journal(str(tmp_path), TransporteConFallas(caidas=1))
+    escritura_id = asyncio.run(journal.encolar("CALIFICACIONES", {"ESTRELLAS": 5}))
+
+    tabla, rows, _ = journal._tomar_lote_sync()
+    asyncio.run(journal._enviar(tabla, rows))
+    pendiente = asyncio.run(journal.estado(escritura_id))
+    _vaciar(journal)
+
+    assert pendiente["estado"] == PENDIENTE
+    assert "503" in pendiente["error"]
+    assert journal.reintentos == 1
+    enviado = asyncio.run(journal.estado(escritura_id))
+    assert (enviado["estado"], enviado["intentos"], enviado["error"]) == (ENVIADO, 2, None)
+
+
+def test_journal_viejo_gana_la_columna_record_id(tmp_path):
+    path = os.path.join(str(tmp_path), "escrituras.db")
+    conn = conectar(path)
+    conn.execute(
+        """CREATE TABLE escrituras (id INTEGER PRIMARY KEY AUTOINCREMENT, tabla TEXT NOT NULL,
+           fields TEXT NOT NULL, estado TEXT NOT NULL, intentos INTEGER NOT NULL DEFAULT 0,
+           individual INTEGER NOT NULL DEFAULT 0, error TEXT, creado REAL NOT NULL,
+           actualizado REAL NOT NULL, disponible_desde REAL NOT NULL, lease_hasta REAL)"""
+    )
+    conn.close()
+
+    journal = EscriturasDiferidas(lambda tabla: None, db_path=path)
+    escritura_id = asyncio.run(journal.encolar("CALIFICACIONES", {"ESTRELLAS": 5}))
+
+    assert asyncio.run(journal.estado(escritura_id))["recordId"] is None
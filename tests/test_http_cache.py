@@ -0,0 +1,59 @@
+import fake_airtable_server as fake
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from http_cache import cached_endpoint
+
+
+def _app():
+    app = FastAPI()
+    llamadas = []
+
+    @app.get("/datos")
+    @cached_endpoint("datos_test", ttl=60, max_age=30)
+    async def datos():
+        llamadas.append(1)
+        return {"faqs": ["¿Cómo denuncio?"]}
+
+    return TestClient(app), llamadas
+
+
+def test_revalidacion_con_etag_responde_304_sin_recargar():
+    client, llamadas = _app()
+
+    primera = client.get("/datos")
+    etag = primera.headers["etag"]
+    revalidada = client.get("/datos", headers={"If-None-Match": etag})
+    cambiada = client.get("/datos", headers={"If-None-Match": '"otro"'})
+
+    assert primera.status_code == 200
+    assert primera.json() == {"faqs": ["¿Cómo denuncio?"]}
+    assert primera.headers["cache-control"] == "public, max-age=30, must-revalidate"
+    assert revalidada.status_code == 304
+    assert revalidada.content == b""
+    assert revalidada.headers["etag"] == etag
+    assert cambiada.status_code == 200
+    assert len(llamadas) == 1
+
+
+def test_if_modified_since_sin_etag():
+    client, _ = _app()
+    last_modified = client.get("/datos").headers["last-modified"]
+
+    respuesta = client.get("/datos", headers={"If-Modified-Since": last_modified})
+
+    assert respuesta.status_code == 304
+
+
+def test_config_formularios_revalida_con_etag(app_main):
+    form = fake.insert("CONFIG_FORMULARIOS", {"CODIGO": "choque", "VISIBILIDAD": True, "TITULO": "Choque"})
+    fake.insert("CONFIG_CAMPOS", {"ID CAMPO": "relato", "FORMULARIO": [form["id"]], "ORDEN": 1})
+    client = TestClient(app_main.app)
+
+    primera = client.get("/api/config-formularios")
+    revalidada = client.get("/api/config-formularios", headers={"If-None-Match": primera.headers["etag"]})
+
+    assert primera.status_code == 200
+    assert "choque" in primera.json()
+    assert revalidada.status_code == 304
+    assert revalidada.content == b""
@@ -0,0 +1,64 @@
+import asyncio
+import io
+import os
+
+from cola_siniestros import ERROR, ColaSiniestros, huella_denuncia
+
+
+class _Adjunto:
+    def __init__(self, filename, contenido):
+        self.filename = filename
+        self.content_type = "image/jpeg"
+        self.file = io.BytesIO(contenido)
+
+
+def _cola(tmp_path):
+    async def sin_cambios(trabajo):
+        return {"ok": True}
+
+    return ColaSiniestros(
+        sin_cambios,
+        db_path=os.path.join(tmp_path, "siniestros.db"),
+        dir_archivos=os.path.join(tmp_path, "adjuntos"),
+        workers=1,
+    )
+
+
+def test_misma_clave_devuelve_el_ticket_existente(tmp_path):
+    cola = _cola(str(tmp_path))
+
+    async def escenario():
+        primero = await cola.encolar({"dni": "1"}, {}, clave="hdr:abc")
+        repetido = await cola.encolar({"dni": "1"}, {"FOTOS": [_Adjunto("a.jpg", b"a")]}, clave="hdr:abc")
+        return primero, repetido, await cola.buscar_clave("hdr:abc")
+
+    (ticket, nuevo), (repetido, repetido_nuevo), buscado = asyncio.run(escenario())
+
+    assert nuevo and not repetido_nuevo
+    assert repetido == buscado == ticket
+    # Los adjuntos del envío repetido no quedan en disco
+    assert os.listdir(cola.dir_archivos) == []
+    assert asyncio.run(cola.metricas()) == {"pendiente": 1}
+
+
+def test_envio_que_termino_en_error_no_bloquea_el_reenvio(tmp_path):
+    cola = _cola(str(tmp_path))
+    ticket, _ = asyncio.run(cola.encolar({"dni": "1"}, {}, clave="hdr:abc"))
+    cola._ejecutar_sync("UPDATE trabajos SET estado=? WHERE ticket=?", (ERROR, ticket))
+
+    nuevo_ticket, nuevo = asyncio.run(cola.encolar({"dni": "1"}, {}, clave="hdr:abc"))
+
+    assert nuevo and nuevo_ticket != ticket
+
+
+def test_huella_depende_del_contenido_y_no_del_orden():
+    campos = {"dni": "1", "relato": "choque"}
+    a, b = _Adjunto("a.jpg", b"foto a"), _Adjunto("b.jpg", b"foto b")
+
+    huella = huella_denuncia(campos, [("foto", a), ("foto", b)])
+
+    assert huella == huella_denuncia(dict(reversed(campos.items())), [("foto", b), ("foto", a)])
+    assert huella != huella_denuncia(campos, [("foto", a), ("foto", _Adjunto("b.jpg", b"otra"))])
+    assert huella != huella_denuncia({**campos, "relato": "robo"}, [("foto", a), ("foto", b)])
+    # Se puede volver a leer el adjunto para guardarlo
+    assert a.file.read() == b"foto a"
@@ -0,0 +1,45 @@
+import asyncio
+import os
+
+from PIL import Image
+
+import imagenes
+from cola_siniestros import ArchivoEnCola
+from imagenes import OptimizadorImagenes
+
+
+def _foto(path, lado):
+    # Ruido: una imagen lisa comprime demasiado bien como para pasar MIN_BYTES
+    Image.frombytes("RGB", (lado, lado), os.urandom(lado * lado * 3)).save(path, format="PNG")
+
+
+def test_optimiza_desde_la_ruta_del_adjunto(tmp_path, monkeypatch):
+    monkeypatch.setattr(imagenes, "MIN_BYTES", 1000)
+    path = str(tmp_path / "foto.png")
+    _foto(path, 800)
+    archivo = ArchivoEnCola(path, "foto.png", "image/png")
+    optimizador = OptimizadorImagenes(max_dim=200, workers=1)
+
+    try:
+        result = asyncio.run(optimizador.optimizar(archivo))
+    finally:
+        optimizador.shutdown()
+        archivo.close()
+
+    assert result["bytes_original"] == os.path.getsize(path)
+    assert result["bytes"] < result["bytes_original"]
+    assert Image.open(result["file"]).size == (200, 200)
+
+
+def test_archivo_chico_se_descarta_sin_leerlo(tmp_path, monkeypatch):
+    path = str(tmp_path / "chica.png")
+    _foto(path, 10)
+    archivo = ArchivoEnCola(path, "chica.png", "image/png")
+    archivo.file.read = lambda *a: (_ for _ in ()).throw(AssertionError("no debe leerse"))
+    optimizador = OptimizadorImagenes()
+
+    try:
+        assert asyncio.run(optimizador.optimizar(archivo)) is None
+    finally:
+        archivo.close()
+    assert optimizador._pool is None
@@ -0,0 +1,66 @@
+import asyncio
+
+import fake_airtable_server as fake
+from conftest import TABLAS
+from polizas import parsear_etiqueta, polizas_de_cliente, resolver_poliza_por_patente
+
+# Lookup a través de CLIENTES: cada póliza del cliente lista TODAS sus patentes
+LOOKUP = "PATENTE DEL VEHICULO (de GESTIÓN GENERAL) (from CLIENTES)"
+
+
+def _poliza(record_id, etiqueta, patentes_cliente):
+    fake.insert(TABLAS["POLIZAS"], {"ETIQUETA_POLIZA": etiqueta, LOOKUP: patentes_cliente}, record_id)
+
+
+def _resolver(airtable, ids, patente):
+    return asyncio.run(resolver_poliza_por_patente(airtable.repo("POLIZAS"), ids, patente))
+
+
+def test_resuelve_la_poliza_de_cada_patente(airtable):
+    _poliza("recPOL1", "✅ 🟢 VIGENTE | 🚗 AUTO | N° POL: 111 | 🏷️ AAA111", ["AAA111", "BBB222"])
+    _poliza("recPOL2", "✅ 🟢 VIGENTE | 🚗 AUTO | N° POL: 222 | 🏷️ BBB222", ["AAA111", "BBB222"])
+    ids = ["recPOL1", "recPOL2"]
+
+    assert _resolver(airtable, ids, "AAA111") == "recPOL1"
+    assert _resolver(airtable, ids, "BBB222") == "recPOL2"
+    assert _resolver(airtable, ids, "bbb-222") == "recPOL2"
+
+
+def test_patente_inexistente_o_sin_datos(airtable):
+    _poliza("recPOL1", "✅ 🟢 VIGENTE | 🚗 AUTO | N° POL: 111 | 🏷️ AAA111", ["AAA111"])
+
+    assert _resolver(airtable, ["recPOL1"], "ZZZ999") is None
+    assert _resolver(airtable, [], "AAA111") is None
+    assert _resolver(airtable, ["recPOL1"], "") is None
+
+
+def test_patente_en_varias_polizas_no_se_adivina(airtable):
+    _poliza("recPOL1", "✅ 🔴 ANULADA | 🚗 AUTO | N° POL: 111 | 🏷️ AAA111", ["AAA111"])
+    _poliza("recPOL2", "✅ 🟢 VIGENTE | 🚗 AUTO | N° POL: 333 | 🏷️ AAA111", ["AAA111"])
+
+    assert _resolver(airtable, ["recPOL1", "recPOL2"], "AAA111") is None
+
+
+def test_vista_de_cliente_busca_por_patente():
+    vista = polizas_de_cliente(
+        {
+            "ETIQUETA_POLIZA Compilación (de POLIZAS)": [
+                "✅ ⏳ VENCE 30D | 🚗 AUTO | N° POL: 33333333 | 🏷️ PDL384",
+                "✅ 🔴 ANULADA | 🚗 CAMIONETA | N° POL: 777742 | 🏷️ POL432",
+            ]
+        }
+    )
+
+    assert vista.buscar("pdl 384").numero == "33333333"
+    assert vista.buscar("POL432").inactiva
+    assert vista.buscar("XXX000") is None
+
+
+def test_inactiva_solo_por_el_estado():
+    vigente, anulada = parsear_etiqueta(
+        "✅ 🟢 VIGENTE | 🚗 AUTO | N° POL: 111 | 🏷️ AAA111 | 📝 Cubre BAJA de granizo"
+        " | ❌ 🔴 ANULADA | 🚗 AUTO | N° POL: 222 | 🏷️ BBB222"
+    )
+
+    assert not vigente.inactiva
+    assert anulada.inactiva
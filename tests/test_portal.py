@@ -0,0 +1,47 @@
+import pytest
+
+from portal import (
+    PORTAL_PAGE_SIZE,
+    PORTAL_PAGE_SIZE_MAX,
+    VISTA_COMPLETA,
+    VISTA_RESUMEN,
+    CursorInvalido,
+    limite_pagina,
+    paginar,
+)
+
+
+def test_paginar_recorre_de_la_mas_nueva_a_la_mas_vieja():
+    ids = ["rec1", "rec2", "rec3", "rec4", "rec5"]
+
+    pagina, cursor = paginar(ids, None, 2)
+    assert pagina == ["rec5", "rec4"]
+    assert cursor == "2"
+
+    pagina, cursor = paginar(ids, cursor, 2)
+    assert pagina == ["rec3", "rec2"]
+
+    pagina, cursor = paginar(ids, cursor, 2)
+    assert pagina == ["rec1"]
+    assert cursor is None
+
+
+def test_paginar_sin_limite_y_sin_ids():
+    assert paginar(["rec1", "rec2"], None, None) == (["rec2", "rec1"], None)
+    assert paginar([], None, 10) == ([], None)
+    assert paginar(None, None, 10) == ([], None)
+    # Página justa: no hay siguiente
+    assert paginar(["rec1", "rec2"], None, 2) == (["rec2", "rec1"], None)
+
+
+@pytest.mark.parametrize("cursor", ["abc", "-1", "1.5"])
+def test_paginar_cursor_invalido(cursor):
+    with pytest.raises(CursorInvalido):
+        paginar(["rec1"], cursor, 10)
+
+
+def test_limite_pagina():
+    assert limite_pagina(None, VISTA_RESUMEN) == PORTAL_PAGE_SIZE
+    assert limite_pagina(None, VISTA_COMPLETA) is None
+    assert limite_pagina(0, VISTA_RESUMEN) == 1
+    assert limite_pagina(10_000, VISTA_COMPLETA) == PORTAL_PAGE_SIZE_MAX
@@ -0,0 +1,99 @@
+import json
+import time
+
+from portal import CAMPO_MODIFICACION, PORTAL_PAGE_SIZE, VISTA_RESUMEN
+from portal_cache import SnapshotsPortal
+
+CLAVE = ("polizas", VISTA_RESUMEN, PORTAL_PAGE_SIZE)
+
+
+def _registros(*ids):
+    return [{"RECORD_ID": rid, CAMPO_MODIFICACION: "2026-01-01T00:00:00.000Z"} for rid in ids]
+
+
+def _tamanio(records, pagina):
+    return len(json.dumps([records, pagina], default=str))
+
+
+def _snapshots(**kwargs):
+    return SnapshotsPortal(portal=None, repo_provider=lambda tabla: None, **kwargs)
+
+
+def test_guardar_cuenta_bytes_e_indexa_vinculados():
+    snaps = _snapshots()
+    records = _registros("recA", "recB")
+
+    snaps._guardar("111", ("v1",), CLAVE, records, None, time.monotonic())
+
+    assert snaps.bytes == _tamanio(records, None)
+    assert snaps._snapshots["111"].partes[CLAVE] == (records, None)
+    assert snaps._dnis_por_id == {"recA": {"111"}, "recB": {"111"}}
+
+    # La misma parte no se cuenta dos veces
+    snaps._guardar("111", ("v1",), CLAVE, records, None, time.monotonic())
+    assert snaps.bytes == _tamanio(records, None)
+
+
+def test_guardar_con_version_nueva_reemplaza_el_snapshot():
+    snaps = _snapshots()
+    snaps._guardar("111", ("v1",), CLAVE, _registros("recA"), None, time.monotonic())
+    nuevos = _registros("recB")
+
+    snaps._guardar("111", ("v2",), CLAVE, nuevos, None, time.monotonic())
+
+    assert snaps._snapshots["111"].version == ("v2",)
+    assert snaps.bytes == _tamanio(nuevos, None)
+    assert snaps._dnis_por_id == {"recB": {"111"}}
+
+
+def test_invalidar_libera_bytes_y_vinculados():
+    snaps = _snapshots()
+    snaps._guardar("111", ("v1",), CLAVE, _registros("recA"), None, time.monotonic())
+    snaps._guardar("222", ("v1",), CLAVE, _registros("recA"), None, time.monotonic())
+
+    snaps.invalidar("111")
+
+    assert "111" not in snaps._snapshots
+    assert snaps._dnis_por_id == {"recA": {"222"}}
+    assert snaps.bytes == _tamanio(_registros("recA"), None)
+    assert snaps.stats["invalidaciones"] == 1
+
+
+def test_invalidacion_durante_el_armado_descarta_lo_armado():
+    snaps = _snapshots()
+    desde = time.monotonic()
+    snaps.invalidar("111")  # llega un cambio mientras se pedían las secciones
+
+    snaps._guardar("111", ("v1",), CLAVE, _registros("recA"), None, desde)
+
+    assert "111" not in snaps._snapshots
+    assert snaps.bytes == 0
+
+    # Un armado que empezó después de la invalidación sí se guarda
+    snaps._guardar("111", ("v1",), CLAVE, _registros("recA"), None, time.monotonic())
+    assert "111" in snaps._snapshots
+
+
+def test_lru_por_cantidad_de_clientes():
+    snaps = _snapshots(max_clientes=2)
+    for dni in ("111", "222"):
+        snaps._guardar(dni, ("v1",), CLAVE, _registros(f"rec{dni}"), None, time.monotonic())
+    # Uso reciente de 111: el menos usado pasa a ser 222
+    assert snaps._vigente("111", ("v1",)) is not None
+
+    snaps._guardar("333", ("v1",), CLAVE, _registros("rec333"), None, time.monotonic())
+
+    assert list(snaps._snapshots) == ["111", "333"]
+    assert "rec222" not in snaps._dnis_por_id
+    assert snaps.stats["desalojos"] == 1
+
+
+def test_lru_por_bytes():
+    records = _registros("recA")
+    snaps = _snapshots(max_bytes=2 * _tamanio(records, None))
+    for dni in ("111", "222", "333"):
+        snaps._guardar(dni, ("v1",), CLAVE, _registros("recA"), None, time.monotonic())
+
+    assert list(snaps._snapshots) == ["222", "333"]
+    assert snaps.bytes <= snaps.max_bytes
+    assert snaps._dnis_por_id == {"recA": {"222", "333"}}